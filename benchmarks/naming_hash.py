@@ -0,0 +1,58 @@
+"""
+Benchmarks for hashing a grid of experiment configurations in bulk with
+:func:`~pyrolite_meltsutil.automation.naming.exp_hashes`, either as a table or a
+list of configurations (as for :class:`~pyrolite_meltsutil.automation.MeltsBatch`),
+comparing it with hashing
+the configuration for each row with
+:func:`~pyrolite_meltsutil.automation.naming.exp_hash`. The grid combines the
+compositions from the bundled Monte Carlo example with a range of pressures,
+temperatures and oxygen fugacities.
+
+Run from the repository root with :code:`python benchmarks/naming_hash.py`.
+"""
+import timeit
+import itertools
+import pandas as pd
+from pyrolite_meltsutil.automation.naming import exp_hash, exp_hashes
+from pyrolite_meltsutil.tables.load import import_batch_config
+from pyrolite_meltsutil.util.general import get_data_example
+
+
+def best_of(func, number=1, repeat=3):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+if __name__ == "__main__":
+    compositions = [
+        c for (_, c, _) in import_batch_config(get_data_example("montecarlo")).values()
+    ]
+    grid = itertools.product(
+        compositions,
+        range(3000, 10000, 100),  # pressure
+        range(1200, 1400, 10),  # temperature
+        [-2.0, -1.0, 0.0, 1.0],  # fO2 offset
+    )
+    df = pd.DataFrame(
+        [
+            {
+                **c,
+                "Initial Pressure": p,
+                "Initial Temperature": t,
+                "Log fO2 Delta": fo2,
+            }
+            for c, p, t, fo2 in grid
+        ]
+    )
+    records = df.to_dict("records")
+    times = [
+        best_of(lambda: [exp_hash(r) for r in records]),
+        best_of(lambda: exp_hashes(df)),
+        best_of(lambda: exp_hashes(records)),
+    ]
+    times = [t / len(df) * 1e6 for t in times]  # us per configuration
+    print("{:<34}{:>10d}".format("configurations", len(df)))
+    print("{:<34}{:>10.2f}us".format("exp_hash (each row)", times[0]))
+    print("{:<34}{:>10.2f}us".format("exp_hashes (table)", times[1]))
+    print("{:<34}{:>10.2f}us".format("exp_hashes (records)", times[2]))
+    print("{:<34}{:>9.1f}x".format("speedup (table)", times[0] / times[1]))
+    print("{:<34}{:>9.1f}x".format("speedup (records)", times[0] / times[2]))
@@ -0,0 +1,52 @@
+"""
+Scaling benchmark for :func:`~pyrolite_meltsutil.tables.load.aggregate_tables`,
+aggregating increasing numbers of experiments (replicated from the bundled Monte
+Carlo example) to single system and phase tables. For comparison, a baseline which
+incrementally appends each experiment to the aggregate table is also timed; this
+scales quadratically with the number of experiments.
+
+Run from the repository root with :code:`python benchmarks/tables_aggregate.py`.
+"""
+import time
+import tracemalloc
+import pandas as pd
+from pathlib import Path
+from pyrolite_meltsutil.tables.load import import_tables, aggregate_tables
+from pyrolite_meltsutil.util.general import get_data_example
+
+SIZES = [250, 500, 1000, 2000, 5000]
+
+
+def append_baseline(lst):
+    system, phases = pd.DataFrame(), pd.DataFrame()
+    for ix, (S, P) in enumerate(lst):
+        S["experiment"], P["experiment"] = ix, ix
+        system = pd.concat([system, S], sort=False)
+        phases = pd.concat([phases, P], sort=False)
+    return system, phases
+
+
+def profile(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(*args)
+    duration = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duration, peak / 2**20
+
+
+if __name__ == "__main__":
+    folders = [p for p in Path(get_data_example("montecarlo")).iterdir() if p.is_dir()]
+    tables = [import_tables(f) for f in folders]
+    print(
+        "{:>8}{:>14}{:>14}{:>14}{:>14}".format(
+            "n", "concat (s)", "peak (MB)", "append (s)", "peak (MB)"
+        )
+    )
+    for n in SIZES:
+        lst = [(S.copy(), P.copy()) for S, P in (tables * (n // len(tables) + 1))[:n]]
+        concat = profile(aggregate_tables, lst)
+        # the appending baseline is only run for smaller sizes
+        append = profile(append_baseline, lst) if n <= 1000 else (float("nan"),) * 2
+        print("{:>8d}{:>14.2f}{:>14.1f}{:>14.2f}{:>14.1f}".format(n, *concat, *append))
@@ -0,0 +1,76 @@
+"""
+Benchmarks for reading alphaMELTS tables with
+:func:`~pyrolite_meltsutil.tables.load.read_melts_tablefile`, comparing the fast
+(array-based) parser with the :func:`pandas.read_csv` based fallback over the
+tables in the bundled Monte Carlo example. Timings are given both for parsing the
+table values alone, and for reading the table including post-processing
+(e.g. adding Mg#).
+
+Run from the repository root with :code:`python benchmarks/tables_load.py`.
+"""
+import timeit
+from pathlib import Path
+from pyrolite_meltsutil.tables.load import (
+    read_melts_tablefile,
+    _read_numeric_block,
+    _read_delimited_block,
+)
+from pyrolite_meltsutil.util.general import get_data_example
+
+TABLES = [
+    "System_main_tbl.txt",
+    "Bulk_comp_tbl.txt",
+    "Liquid_comp_tbl.txt",
+    "Phase_mass_tbl.txt",
+    "Phase_vol_tbl.txt",
+    "Solid_comp_tbl.txt",  # ragged, falls back to read_csv
+]
+
+
+def best_of(func, number=5, repeat=3):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def parse_fast(block, headers):
+    try:
+        return _read_numeric_block(block, headers)
+    except ValueError:
+        return _read_delimited_block(block, headers)
+
+
+def split_table(path, skiprows=3):
+    with open(str(path)) as f:
+        *_, header, block = f.read().split("\n", skiprows + 1)
+    return block, header.split()
+
+
+if __name__ == "__main__":
+    folders = [p for p in Path(get_data_example("montecarlo")).iterdir() if p.is_dir()]
+    row = "{:<22}{:>12}{:>12}{:>10}{:>12}{:>12}{:>10}"
+    print(row.format("", "parse", "", "", "read", "", ""))
+    print(
+        row.format(
+            "table", "read_csv", "fast", "speedup", "read_csv", "fast", "speedup"
+        )
+    )
+    for table in TABLES:
+        paths = [f / table for f in folders]
+        blocks = [split_table(p) for p in paths]
+        times = [
+            best_of(lambda: [_read_delimited_block(*b) for b in blocks]),
+            best_of(lambda: [parse_fast(*b) for b in blocks]),
+            best_of(lambda: [read_melts_tablefile(p, fast=False) for p in paths]),
+            best_of(lambda: [read_melts_tablefile(p, fast=True) for p in paths]),
+        ]
+        times = [t / len(paths) * 1e3 for t in times]  # ms per table
+        print(
+            "{:<22}{:>10.2f}ms{:>10.2f}ms{:>9.1f}x{:>10.2f}ms{:>10.2f}ms{:>9.1f}x".format(
+                table,
+                times[0],
+                times[1],
+                times[0] / times[1],
+                times[2],
+                times[3],
+                times[2] / times[3],
+            )
+        )
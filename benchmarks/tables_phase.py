@@ -0,0 +1,62 @@
+"""
+Benchmarks for reading the phase tables from :code:`alphaMELTS_tbl.txt` with the
+single-pass :func:`~pyrolite_meltsutil.tables.load.read_phase_tables`, comparing it
+with splitting the file into its phase tables and parsing each of these with
+:func:`~pyrolite_meltsutil.tables.load.read_phase_table` over the tables in the
+bundled Monte Carlo example. Timings are given both for parsing the phase tables
+alone, and for reading the file including post-processing with
+:func:`~pyrolite_meltsutil.tables.load.phasetable_from_alphameltstxt`.
+
+Run from the repository root with :code:`python benchmarks/tables_phase.py`.
+"""
+import re
+import timeit
+from pathlib import Path
+import pandas as pd
+from pyrolite_meltsutil.tables.load import (
+    NON_NUMERIC,
+    read_phase_table,
+    read_phase_tables,
+    concat_tables,
+    phasetable_from_alphameltstxt,
+)
+from pyrolite_meltsutil.util.general import get_data_example
+
+
+def best_of(func, number=5, repeat=3):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def parse_split(text):
+    """
+    Parse the phase tables by splitting the file into sections and phase tables,
+    and reading each table individually.
+    """
+    data = text.strip()
+    tables = [t for t in re.split(r"Title: .*[\n\r][\n\r]+", data, re.DOTALL) if t]
+    phasetbl = [t for t in tables if t[0] == t[0].lower()][0]
+    df = concat_tables(
+        [read_phase_table(t) for t in re.split(r"[\n\r][\n\r]+", phasetbl.strip())]
+    )
+    num = [i for i in df.columns if i not in NON_NUMERIC]
+    df[num] = df[num].apply(pd.to_numeric, errors="coerce")
+    return df
+
+
+if __name__ == "__main__":
+    paths = [
+        p / "alphaMELTS_tbl.txt"
+        for p in Path(get_data_example("montecarlo")).iterdir()
+        if p.is_dir()
+    ]
+    texts = [p.read_text() for p in paths]
+    times = [
+        best_of(lambda: [parse_split(t) for t in texts]),
+        best_of(lambda: [read_phase_tables(t) for t in texts]),
+        best_of(lambda: [phasetable_from_alphameltstxt(p) for p in paths]),
+    ]
+    times = [t / len(paths) * 1e3 for t in times]  # ms per file
+    print("{:<34}{:>10.2f}ms".format("parse (split, read_phase_table)", times[0]))
+    print("{:<34}{:>10.2f}ms".format("parse (read_phase_tables)", times[1]))
+    print("{:<34}{:>9.1f}x".format("speedup", times[0] / times[1]))
+    print("{:<34}{:>10.2f}ms".format("phasetable_from_alphameltstxt", times[2]))
@@ -7,9 +7,12 @@ Issues
     * names are truncated for modifychem melts files?
     * need a timeout so processes can keep going, add unfinished experiments to failed list
 """
+import os
+import asyncio
 import itertools
 from pathlib import Path
 import time, datetime
+import concurrent.futures
 import numpy as np
 import json
 from tqdm import tqdm
@@ -18,15 +21,29 @@ from pyrolite.geochem.ind import common_elements, common_oxides
 from pyrolite.comp.codata import renormalise
 from pyrolite.util.meta import ToLogger
 from pyrolite.util.multip import combine_choices
+from pyrolite.util.text import remove_prefix
 
 from ..parse import read_envfile, read_meltsfile
 from ..env import MELTS_Env
 from ..meltsfile import dict_to_meltsfile
 
-from .naming import exp_name, exp_hash
-from .org import make_meltsfolder
+from .naming import exp_name, exp_hash, exp_hashes, canonical_value
+from .org import (
+    make_meltsfolder,
+    commit_meltsfolder,
+    build_table_cache,
+    remove_stale_scratch,
+)
 from .process import MeltsProcess
-from .timing import estimate_experiment_duration
+from .aio import AsyncMeltsProcess, arun_experiment
+from .session import MeltsSession, run_in_session, close_sessions
+from .ledger import RunLedger
+from .telemetry import MetricsLog
+from .timing import DurationEstimator
+from .schedule import schedule_experiments, SCHEDULE_WINDOW
+from .results import ResultStore
+from ..tables.store import BatchStore
+from ..tables.archive import pack_folder, packed_experiments
 
 import logging
 from ..util.log import Handle
@@ -58,12 +75,16 @@ class MeltsExperiment(object):
         meltsfile=None,
         env=None,
         timeout=None,
+        cpu_timeout=None,
+        staging=None,
     ):
         self.name = name  # folder name
         self.title = title  # meltsfile title
         self.fromdir = fromdir  # create an experiment directory here
         self.log = []
         self.timeout = timeout
+        self.cpu_timeout = cpu_timeout
+        self.staging = staging
 
         if meltsfile is not None:
             self.set_meltsfile(meltsfile)
@@ -108,27 +129,144 @@ class MeltsExperiment(object):
             meltsfile=self.meltsfile,
             indir=self.fromdir,
             env=self.envfile,
+            staging=self.staging,
         )
         self.meltsfilepath = self.folder / (self.title + ".melts")
         self.envfilepath = self.folder / "environment.txt"
 
-    def run(self, log=False, superliquidus_start=True):
+    def run(self, log=False, superliquidus_start=True, cache_tables=False):
         """
         Call 'run_alphamelts.command'.
+
+        Parameters
+        -----------
+        log : :class:`bool`
+            Whether to log output from alphaMELTS.
+        superliquidus_start : :class:`bool`
+            Whether to start the calculation from the liquidus.
+        cache_tables : :class:`bool`
+            Whether to import the output tables and build the table cache (see
+            :mod:`pyrolite_meltsutil.tables.cache`) once the run is complete.
+
+        Notes
+        ------
+            * Where the experiment is staged, its folder is committed to the
+              experiment directory once the run is complete (see :meth:`commit`),
+              including where it fails.
         """
-        self.mp = MeltsProcess(
-            meltsfile=str(self.title) + ".melts",
-            env="environment.txt",
-            fromdir=str(self.folder),
-            timeout=self.timeout,
-        )
-        self.mp.write([3, [0, 1][superliquidus_start], 4], wait=True, log=log)
-        self.mp.terminate()
+        try:
+            self.mp = MeltsProcess(
+                meltsfile=str(self.title) + ".melts",
+                env="environment.txt",
+                fromdir=str(self.folder),
+                timeout=self.timeout,
+                cpu_timeout=self.cpu_timeout,
+            )
+            self.mp.write([3, [0, 1][superliquidus_start], 4], wait=True, log=log)
+            self.mp.terminate()
+            if cache_tables:
+                build_table_cache(self.folder)
+        finally:
+            if self.staging:
+                self.commit()
+
+    def commit(self):
+        """
+        Move a staged experiment folder into the experiment directory (see
+        :func:`~pyrolite_meltsutil.automation.org.commit_meltsfolder`).
+        """
+        self.folder = commit_meltsfolder(self.folder, Path(self.fromdir) / self.name)
+        self.meltsfilepath = self.folder / (self.title + ".melts")
+        self.envfilepath = self.folder / "environment.txt"
 
     def cleanup(self):
         pass
 
 
+def run_experiment(
+    name,
+    title,
+    meltsfile,
+    env,
+    fromdir,
+    timeout=None,
+    superliquidus_start=True,
+    cache_tables=False,
+    cpu_timeout=None,
+    staging=None,
+):
+    """
+    Create and run a single :class:`MeltsExperiment`. This is the unit of work
+    dispatched by :meth:`MeltsBatch.run`, and only takes picklable arguments such that
+    it can be submitted to a worker process.
+
+    Parameters
+    -----------
+    name : :class:`str`
+        Name of the experiment folder (typically the experiment hash).
+    title : :class:`str`
+        Title of the experiment.
+    meltsfile : :class:`str`
+        Multiline string representation of the meltsfile.
+    env : :class:`str`
+        Multiline string representation of the environment file.
+    fromdir : :class:`str` | :class:`pathlib.Path`
+        Directory in which to create the experiment folder.
+    timeout : :class:`float`
+        Timeout for the experiment, in seconds.
+    superliquidus_start : :class:`bool`
+        Whether to start the calculation from the liquidus.
+    cache_tables : :class:`bool`
+        Whether to build the table cache for the experiment once it's complete.
+    cpu_timeout : :class:`float`
+        Maximum CPU time for the experiment, in seconds.
+    staging : :class:`bool` | :class:`str` | :class:`pathlib.Path`
+        Scratch directory in which to run the experiment before its folder is moved
+        into :code:`fromdir` (see
+        :func:`~pyrolite_meltsutil.automation.org.get_staging_dir`).
+
+    Returns
+    --------
+    :class:`dict`
+        Summary of the run, including the experiment name and title, its status
+        (:code:`'done'`, :code:`'failed'` or :code:`'timed-out'`), duration (in seconds), a message
+        for failed runs and metrics for the alphaMELTS process (see
+        :data:`~pyrolite_meltsutil.automation.telemetry.METRICS`).
+    """
+    started = time.time()
+    result = dict(name=name, title=title, status="done", message=None)
+    M = MeltsExperiment(
+        name=name,
+        title=title,
+        meltsfile=meltsfile,
+        env=env,
+        fromdir=fromdir,
+        timeout=timeout,
+        cpu_timeout=cpu_timeout,
+        staging=staging,
+    )
+    error = None
+    try:
+        M.run(superliquidus_start=superliquidus_start, cache_tables=cache_tables)
+    except OSError as e:  # e.g. writing to a process killed by the watchdog
+        error = e
+    mp = getattr(M, "mp", None)
+    if mp is not None and mp.exit_reason == "timed-out":
+        result["status"] = "timed-out"
+        result["message"] = "Timed out after {:.1f} s ({} limit)".format(
+            time.time() - started, mp.timeout_limit
+        )
+    elif error is not None:
+        result["status"] = "failed"
+        result["message"] = mp.callstring if mp is not None else str(error)
+    elif not (M.folder / "System_main_tbl.txt").exists():
+        result["status"] = "failed"
+        result["message"] = "No output tables @ {}".format(mp.callstring)
+    result["duration"] = time.time() - started
+    result["metrics"] = mp.metrics if mp is not None else {}  # alphaMELTS process
+    return result
+
+
 def process_modifications(cfg):
     """
     Process modifications to an configuration composition.
@@ -158,6 +296,57 @@ def process_modifications(cfg):
     return cfg
 
 
+def _config_key(cfg, decimals=None):
+    """
+    Get a hashable key for a configuration, such that configurations which compare
+    equal (e.g. with values of :code:`5000` and :code:`5000.0`) have the same key.
+    """
+
+    def key(value):
+        if isinstance(value, dict):
+            return frozenset((k, key(v)) for k, v in value.items())
+        if isinstance(value, list):
+            return tuple(key(v) for v in value)
+        return value
+
+    return key(canonical_value(cfg, decimals=decimals))
+
+
+def iter_choices(choices):
+    """
+    Lazily explode a set of choices into unique combinations, in the same order as
+    :func:`pyrolite.util.multip.combine_choices`.
+
+    Parameters
+    ------------
+    choices : :class:`dict`
+        Dictionary where keys are names, and values are list of potential
+        choices.
+
+    Yields
+    -------
+    :class:`dict`
+        Dictionary containing a set of choice combinations. Choices which are set to
+        :code:`None` are omitted.
+    """
+    keys = list(choices.keys())
+    order = list(range(len(keys)))
+    if len(keys) > 1:  # the last key varies slowest, and the second fastest
+        order = order[2:][::-1] + [0, 1]
+    seen = set()
+    for ix in itertools.product(*[range(len(choices[keys[o]])) for o in order]):
+        ix = dict(zip(order, ix))
+        comb = {
+            k: choices[k][ix[i]]
+            for i, k in enumerate(keys)
+            if choices[k][ix[i]] is not None
+        }
+        key = _config_key(comb)
+        if key not in seen:  # don't duplicate configs
+            seen.add(key)
+            yield comb
+
+
 class MeltsBatch(object):
     """
     Batch of :class:`MeltsExperiment`, which may represent evaluation over a grid of
@@ -170,7 +359,24 @@ class MeltsBatch(object):
     default_config : :class:`dict`
         Dictionary of default parameters.
     config_grid : class:`dict`
-        Dictionary of parameters to systematically vary.
+        Dictionary of parameters to systematically vary. These can include
+        environment variables (e.g. :code:`VERSION`, :code:`DELTAT`, with or without
+        the :code:`ALPHAMELTS_` prefix), which are set for each experiment
+        individually (see :meth:`experiment_env`).
+    env : :class:`~pyrolite_meltsutil.env.MELTS_Env`
+        Environment for the experiments, on which any environment variables from the
+        configuration are set.
+    lazy : :class:`bool`
+        Whether to generate experiments as they're needed, rather than on
+        construction of the batch. This is useful for large grids, where
+        materialising every experiment configuration is slow and memory-intensive.
+    hash_decimals : :class:`int`
+        Number of decimal places to which floats are rounded when hashing
+        configurations (see :func:`~pyrolite_meltsutil.automation.naming.exp_hash`),
+        such that experiments which differ only by floating point errors (e.g.
+        from renormalised compositions) are only run once. By default, floats
+        aren't rounded, and the hashes of configurations which could be hashed by
+        previous versions (including :code:`NaN` and negative zeros) are unchanged.
 
     Attributes
     -----------
@@ -179,20 +385,21 @@ class MeltsBatch(object):
         Compositions to use for
 
     configs : :class:`list` of :class:`dict`
+        Unique configurations from the grid. This is :code:`None` for lazy batches.
+
+    experiments : :class:`dict`
+        Experiments indexed by hash. This is :code:`None` for lazy batches (see
+        :meth:`iter_experiments`).
 
-    experiments : :class:`list` of :class:`dict`
+    estimator : :class:`~pyrolite_meltsutil.automation.timing.DurationEstimator`
+        Estimator for the duration of experiments, calibrated from the durations of
+        any experiments previously run within the batch directory.
 
     Todo
     ------
         * Can start with a single composition or multiple compositions in a dataframe
         * Enable grid search for individual parameters
         * Improved output logging/reporting
-        * Calculate relative number of calculations to be performed for the est duration
-
-            This is currently about correct for an isobaric calcuation at 10 degree
-            temperature steps over few hundred degrees - but won't work for different
-            T steps.
-
         * Does number precision make a difference?
     """
 
@@ -205,6 +412,8 @@ class MeltsBatch(object):
         env=None,
         logger=logger,
         timeout=None,
+        lazy=False,
+        hash_decimals=None,
     ):
         self.timeout = timeout
         self.logger = logger
@@ -219,33 +428,211 @@ class MeltsBatch(object):
         self.logger.addHandler(fh)
 
         self.default = default_config
+        self.config_grid = config_grid
         self.env = env or MELTS_Env()
-        # let's establish the grid of configurations
-        self.configs = []
-        grid = combine_choices(config_grid)
-        for i in grid:  # unique configurations
-            _cfg = {**self.default, **i}
-            if _cfg not in self.configs:
-                self.configs.append(_cfg)
+        self._envs, self._env_settings = {}, {}  # environments for experiments
+        self.lazy = lazy
+        self.hash_decimals = hash_decimals
         self.compositions = comp_df.fillna(0).to_dict("records")
-        # combine these to create full experiment configs
-        exprs = [
-            {**cfg, **cmp}
-            for (cfg, cmp) in itertools.product(self.configs, self.compositions)
-        ]
-        exprs = [process_modifications(cfg) for cfg in exprs]
-        exphashes = np.array([exp_hash(i) for i in exprs])
-        _, cnts = np.unique(exphashes, return_counts=True)
-        if (cnts > 1).any():
-            self.logger.debug("Duplicate experiments detected.")
-        self.experiments = {
-            hsh: (exp_name(expr), expr, self.env) for hsh, expr in zip(exphashes, exprs)
-        }  # this ensures that no duplicates are preserved
+        self.configs, self.experiments = None, None
+        if not self.lazy:
+            # let's establish the grid of configurations
+            self.configs = list(self.iter_configs())
+            # combine these with the compositions to create full experiment configs
+            self.experiments = dict(self.iter_experiments())
 
+        # calibrated from any experiments which have previously been run
+        self.estimator = DurationEstimator().fit_batch(self.fromdir)
         self.est_duration = str(
-            datetime.timedelta(seconds=len(self.experiments) * 15)
-        )  # 6s/run
+            datetime.timedelta(seconds=round(self.estimate_duration()))
+        )
         self.logger.info("Estimated Calculation Time: {}".format(self.est_duration))
+        self.telemetry = MetricsLog(self.fromdir)
+
+    def __len__(self):
+        """
+        Number of experiments in the batch. For lazy batches, this is the size of the
+        grid, which is an upper bound where configurations or compositions coincide.
+        """
+        if self.experiments is not None:
+            return len(self.experiments)
+        size = 1
+        for values in self.config_grid.values():  # unique values for each parameter
+            size *= len(
+                set(
+                    exp_hash(dict(value=v), decimals=self.hash_decimals) for v in values
+                )
+            )
+        return size * len(self.compositions)
+
+    def estimate_duration(self, workers=1, sample=1000):
+        """
+        Estimate the duration of the batch from the number of calculation steps
+        within each experiment (see
+        :class:`~pyrolite_meltsutil.automation.timing.DurationEstimator`).
+
+        Parameters
+        -----------
+        workers : :class:`int`
+            Number of experiments run concurrently.
+        sample : :class:`int`
+            Number of experiments from which the duration of lazy batches is
+            extrapolated.
+
+        Returns
+        --------
+        :class:`float`
+            Estimated duration in seconds.
+        """
+        if self.experiments is not None:
+            return self.estimator.total(self.experiments.values(), workers=workers)
+        experiments = [e for _, e in itertools.islice(self.iter_experiments(), sample)]
+        if not experiments:
+            return 0.0
+        mean = np.mean([self.estimator.predict(e) for e in experiments])
+        return mean * len(self) / max(workers or 1, 1)
+
+    @property
+    def metrics(self):
+        """
+        Metrics for each attempt at experiments within the batch, as recorded in
+        :code:`meltsBatchMetrics.jsonl` (see
+        :class:`~pyrolite_meltsutil.automation.telemetry.MetricsLog`).
+
+        Returns
+        --------
+        :class:`pandas.DataFrame`
+            Table of metrics, indexed by experiment hash.
+        """
+        return self.telemetry.to_frame()
+
+    def iter_configs(self):
+        """
+        Iterate over the unique configurations from the grid.
+
+        Yields
+        -------
+        :class:`dict`
+            Configuration, including default parameters.
+        """
+        if self.configs is not None:
+            yield from self.configs
+            return
+        seen = set()
+        for i in iter_choices(self.config_grid):  # unique configurations
+            _cfg = {**self.default, **i}
+            key = _config_key(_cfg, decimals=self.hash_decimals)
+            if key not in seen:
+                seen.add(key)
+                yield _cfg
+
+    def split_env(self, cfg):
+        """
+        Split a configuration into meltsfile parameters and environment variables.
+
+        Parameters
+        -----------
+        cfg : :class:`dict`
+            Configuration dictionary.
+
+        Returns
+        --------
+        :class:`tuple` of :class:`dict`
+            Meltsfile parameters and environment variables (without prefix).
+        """
+        params, variables = {}, {}
+        for k, v in cfg.items():
+            name = remove_prefix(k, self.env.prefix)
+            if name in self.env.spec:
+                variables[name] = v
+            else:
+                params[k] = v
+        return params, variables
+
+    def experiment_env(self, variables):
+        """
+        Get the environment for an experiment, setting variables on a copy of the
+        batch environment. Environments are shared between experiments with the
+        same settings, such that each is only rendered once.
+
+        Parameters
+        -----------
+        variables : :class:`dict`
+            Environment variables to set for the experiment.
+
+        Returns
+        --------
+        env : :class:`~pyrolite_meltsutil.env.MELTS_Env`
+            Environment for the experiment.
+        settings : :class:`dict`
+            Variables which differ from those of the batch environment, with
+            :code:`None` for those which are unset.
+        """
+        key = exp_hash(variables)
+        if key not in self._envs:
+            env = self.env.copy()
+            for k, v in variables.items():
+                setattr(env, k, v)
+            base, dump = self.env.dump(), env.dump()
+            settings = {k: v for k, v in dump.items() if v != base.get(k)}
+            if not settings:
+                env = self.env
+            self._envs[key] = self._env_settings.setdefault(
+                exp_hash(settings), (env, settings)
+            )
+        return self._envs[key]
+
+    def iter_experiments(self):
+        """
+        Iterate over the unique experiments in the batch, generating them from the
+        configurations and compositions where the batch is lazy.
+
+        Yields
+        -------
+        :class:`tuple`
+            Experiment hash and a tuple of the experiment title, configuration and
+            environment.
+
+        Notes
+        ------
+            * Where an experiment's environment differs from that of the batch, its
+              hash also covers the differing environment variables.
+            * Experiments of batches which aren't lazy are hashed in bulk (see
+              :func:`~pyrolite_meltsutil.automation.naming.exp_hashes`).
+        """
+        if self.experiments is not None:
+            yield from self.experiments.items()
+            return
+
+        def iter_grid():
+            for cfg in self.iter_configs():
+                cfg, variables = self.split_env(cfg)
+                env, settings = self.experiment_env(variables)
+                for cmp in self.compositions:
+                    expr = process_modifications({**cfg, **cmp})
+                    # the hash covers the environment where it differs
+                    yield expr, env, settings, (
+                        {**expr, "env": settings} if settings else expr
+                    )
+
+        grid = iter_grid()
+        if self.lazy:
+            grid = ((*e, exp_hash(e[-1], decimals=self.hash_decimals)) for e in grid)
+        else:  # the grid is hashed in bulk
+            grid = list(grid)
+            hashes = exp_hashes([e[-1] for e in grid], decimals=self.hash_decimals)
+            grid = [(*e, hsh) for e, hsh in zip(grid, hashes)]
+        seen, duplicates = set(), 0
+        for expr, env, settings, _, hsh in grid:
+            if hsh in seen:  # this ensures that no duplicates are preserved
+                duplicates += 1
+                continue
+            seen.add(hsh)
+            # the name includes the hash of the configuration alone
+            name = exp_name(expr, hsh=None if settings else hsh)
+            yield hsh, (name, expr, env)
+        if duplicates:
+            self.logger.debug("Duplicate experiments detected.")
 
     def dump(self, experiments=None, to_dir=None):
         """
@@ -254,76 +641,718 @@ class MeltsBatch(object):
         Parameters
         -----------
         experiments : :class:`dict`
-            Dictionary of experiments to be serialized.
+            Dictionary of experiments to be serialized. By default all experiments in
+            the batch are serialized.
         to_dir : :class:`str` | :class:`pathlib.Path`
             Directory to export file to.
+
+        Notes
+        ------
+            * Experiments are written one at a time, such that lazy batches needn't
+              be materialised.
         """
         to_dir = to_dir or self.fromdir
-        experiments = experiments or self.experiments
-        data = json.dumps(
-            {
-                h: (t, exp, env.dump(unset_variables=False))
-                for (h, (t, exp, env)) in experiments.items()
-            },
-            sort_keys=False,
-            ensure_ascii=False,
-        ).encode("utf8")
+        if experiments is None:
+            experiments = self.iter_experiments()
+        else:
+            experiments = experiments.items()
 
         target = Path(to_dir) / "meltsBatchConfig.json"
         target.parent.mkdir(parents=True, exist_ok=True)  # may not exist yet?
         # consider reading old data and leaving updated version here
         target.touch(exist_ok=True)
         with open(target, "wb") as f:
-            f.write(data)
+            f.write(b"{")
+            for ix, (h, (t, exp, env)) in enumerate(experiments):
+                entry = "{}{}: {}".format(
+                    ["", ", "][ix > 0],
+                    json.dumps(h),
+                    json.dumps(
+                        (t, exp, env.dump(unset_variables=False)), ensure_ascii=False
+                    ),
+                )
+                f.write(entry.encode("utf8"))
+            f.write(b"}")
 
-    def run(self, overwrite=False, exclude=[], superliquidus_start=True, timeout=None):
-        self.dump()  # Serialize the config first
+    def run(
+        self,
+        overwrite=False,
+        exclude=[],
+        superliquidus_start=True,
+        timeout=None,
+        workers=None,
+        executor=None,
+        sessions=False,
+        session_runs=None,
+        max_attempts=1,
+        cache_tables=False,
+        store=None,
+        keep_folders=True,
+        pack=False,
+        schedule="longest",
+        priority=None,
+        cpu_timeout=None,
+        staging=None,
+        result_store=None,
+    ):
+        """
+        Run the batch of experiments.
+
+        Parameters
+        -----------
+        overwrite : :class:`bool`
+            Whether to re-run experiments which have already been run. Otherwise,
+            only experiments which remain to be run according to the batch ledger
+            (see :class:`~pyrolite_meltsutil.automation.ledger.RunLedger`) are run.
+        exclude : :class:`list`
+            Phases to exclude from all experiments.
+        superliquidus_start : :class:`bool`
+            Whether to start the calculations from the liquidus.
+        timeout : :class:`float`
+            Timeout for individual experiments, in seconds.
+        workers : :class:`int`
+            Number of worker processes to use. Where this is greater than one and no
+            executor is given, experiments are run concurrently in a
+            :class:`concurrent.futures.ProcessPoolExecutor`.
+        executor : :class:`concurrent.futures.Executor`
+            Executor to which experiments are submitted. This takes precedence over
+            :code:`workers`, and is not shut down after the batch is run.
+        sessions : :class:`bool`
+            Whether to run experiments using persistent alphaMELTS sessions (see
+            :class:`~pyrolite_meltsutil.automation.session.MeltsSession`), with one
+            session per worker process or thread. Sessions within this process are
+            terminated once the experiments have been run, and those within the
+            worker processes of an executor as these exit.
+        session_runs : :class:`int`
+            Number of runs after which sessions are restarted.
+        max_attempts : :class:`int` | :class:`dict`
+            Maximum number of attempts for experiments which fail or time out, both
+            within this run and across restarts of the batch. A dictionary can be
+            used to specify these individually (e.g.
+            :code:`{'failed': 2, 'timed-out': 1}`).
+        cache_tables : :class:`bool`
+            Whether to build the table cache for each experiment once it's
+            complete, such that the outputs can be aggregated without parsing the
+            tables (see :mod:`pyrolite_meltsutil.tables.cache`).
+        store : :class:`bool` | :class:`str` | :class:`pathlib.Path` | :class:`~pyrolite_meltsutil.tables.store.BatchStore`
+            Store to which the tables of completed experiments are added (see
+            :class:`~pyrolite_meltsutil.tables.store.BatchStore`). Where this is
+            :code:`True`, the store will be :code:`meltsBatchStore.sqlite` within the
+            batch directory.
+        keep_folders : :class:`bool`
+            Whether to keep experiment folders once their tables have been added to
+            the store.
+        pack : :class:`bool` | :class:`str`
+            Whether to pack the folders of completed experiments into archives
+            within the batch directory (see
+            :func:`~pyrolite_meltsutil.tables.archive.pack_folder`), which can be
+            read directly by :func:`~pyrolite_meltsutil.tables.load.aggregate_tables`.
+            This can also be an archive format (e.g. :code:`'gztar'`), and
+            defaults to :code:`'zip'` where :code:`True`.
+        schedule : :class:`str`
+            Order in which experiments are run, based on their estimated duration;
+            one of :code:`'longest'`, :code:`'shortest'` or :code:`'interleave'`
+            (see :func:`~pyrolite_meltsutil.automation.schedule.schedule_experiments`).
+            Where this is :code:`None`, experiments are run in the order of the
+            batch.
+        priority : :class:`callable` | :class:`dict`
+            Priority classes for experiments, which are run in ascending order of
+            class. This can be either a function accepting an experiment hash and
+            experiment, or a dictionary indexed by experiment hash.
+        cpu_timeout : :class:`float`
+            Maximum CPU time for individual experiments, in seconds.
+        staging : :class:`bool` | :class:`str` | :class:`pathlib.Path`
+            Local scratch directory in which to run experiments, which are moved
+            into the batch directory once complete (see
+            :func:`~pyrolite_meltsutil.automation.org.get_staging_dir`). Where
+            this is :code:`True`, :code:`/dev/shm` is used where available and
+            otherwise the temporary directory. This avoids many small writes to
+            the batch directory (e.g. on a network filesystem), and partially
+            written experiment folders are never visible within it.
+        result_store : :class:`str` | :class:`pathlib.Path` | :class:`~pyrolite_meltsutil.automation.results.ResultStore`
+            Content-addressed store of results shared between batches (see
+            :class:`~pyrolite_meltsutil.automation.results.ResultStore`).
+            Experiments with results in the store are linked or copied from it
+            rather than run, and completed experiments are added to it.
+
+        Notes
+        ------
+            * Experiments are dispatched with their meltsfile and environment
+              rendered as strings, such that each worker process has an isolated
+              configuration.
+            * Results for individual experiments are accumulated in
+              :attr:`MeltsBatch.results`, indexed by experiment hash.
+            * The state of each experiment is recorded in the batch ledger
+              (:code:`meltsBatchLedger.jsonl`), such that an interrupted batch can be
+              resumed by running it again. Experiments which have a folder or
+              archive (see :func:`~pyrolite_meltsutil.tables.archive.pack_batch`)
+              but no ledger record (e.g. from previous versions) are considered
+              complete.
+              Scratch directories left within the batch directory by commits of an
+              interrupted batch are removed (see
+              :func:`~pyrolite_meltsutil.automation.org.remove_stale_scratch`).
+            * Metrics for each experiment, including the time spent starting,
+              waiting on and terminating alphaMELTS and its memory and CPU usage,
+              are recorded in :code:`meltsBatchMetrics.jsonl` (see
+              :attr:`MeltsBatch.metrics`).
+            * Running the longest experiments first avoids workers idling at the end
+              of a batch. For lazy batches, experiments are scheduled in windows of
+              :data:`~pyrolite_meltsutil.automation.schedule.SCHEDULE_WINDOW`.
+            * Where a result store is used, the proportion of experiments found in
+              the store is logged once the batch is complete (see
+              :meth:`~pyrolite_meltsutil.automation.results.ResultStore.report`).
+        """
         timeout = self.timeout or timeout
-        self.started = time.time()
-        experiments = self.experiments
-        if not overwrite:
-            experiments = {
-                h: (t, exp, env)
-                for h, (t, exp, env) in experiments.items()
-                if not (self.fromdir / h).exists()
-            }
-
-        self.logger.info("Starting {} Calculations.".format(len(experiments)))
-        paths = []
-        failed = []
-        for hsh, (title, exp, env) in tqdm(
-            experiments.items(), file=ToLogger(self.logger), mininterval=2
-        ):
-            exp_exclude = exclude
-            if "exclude" in exp:
-                exp_exclude += exp.pop("exclude")  # remove exclude
+        remaining, total = self._prepare(
+            overwrite=overwrite,
+            max_attempts=max_attempts,
+            store=store,
+            keep_folders=keep_folders,
+            pack=pack,
+            schedule=schedule,
+            priority=priority,
+            result_store=result_store,
+        )
+        queue = self._iter_tasks(
+            remaining,
+            exclude=exclude,
+            fromdir=self.fromdir,
+            timeout=timeout,
+            cpu_timeout=cpu_timeout,
+            superliquidus_start=superliquidus_start,
+            cache_tables=cache_tables,
+            staging=staging,
+            **[{}, dict(max_runs=session_runs)][sessions]
+        )
+        func = [run_experiment, run_in_session][sessions]
+        self.results = {}
+        while queue:
+            progress = dict(file=ToLogger(self.logger), mininterval=2, total=total)
+            errored = []
+            if executor is None and (workers or 1) > 1:
+                with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as ex:
+                    completed = self._run_with_executor(
+                        ex, queue, progress, func=func, max_pending=2 * workers
+                    )
+                    errored += self._record_all(completed)
+            elif executor is not None:
+                completed = self._run_with_executor(
+                    executor, queue, progress, func=func
+                )
+                errored += self._record_all(completed)
+            else:
+                errored += self._record_all(
+                    self._run_serial(queue, progress, func=func)
+                )
+            if sessions:  # including those of threads within an executor
+                close_sessions()
+            # retry experiments which failed or timed out, where allowed
+            retry = self.ledger.pending([i[0] for i in errored], max_attempts)
+            queue = [i for i in errored if i[0] in retry]
+            total = len(queue)
+            if queue:
+                self.logger.info("Retrying {} Calculations.".format(len(queue)))
 
-            self.logger.debug("Start {}.".format(title))
-            meltsfile = dict_to_meltsfile(exp, modes=exp["modes"], exclude=exp_exclude)
-            M = MeltsExperiment(
-                name=hsh,
-                title=title,
-                meltsfile=meltsfile,
-                env=env,
-                fromdir=self.fromdir,
-                timeout=timeout,
+        self._finish()
+
+    async def arun(
+        self,
+        overwrite=False,
+        exclude=[],
+        superliquidus_start=True,
+        timeout=None,
+        concurrency=None,
+        max_attempts=1,
+        cache_tables=False,
+        store=None,
+        keep_folders=True,
+        pack=False,
+        schedule="longest",
+        priority=None,
+        cpu_timeout=None,
+        staging=None,
+        result_store=None,
+    ):
+        """
+        Run the batch of experiments concurrently from an asyncio event loop, with
+        each experiment driven by an
+        :class:`~pyrolite_meltsutil.automation.aio.AsyncMeltsProcess`. Parameters
+        are as for :meth:`run`, except for :code:`concurrency`.
+
+        Parameters
+        -----------
+        concurrency : :class:`int`
+            Maximum number of experiments run at once. Defaults to the number of
+            CPUs.
+
+        Notes
+        ------
+            * Within an event loop use :code:`await batch.arun()`, and otherwise
+              :code:`asyncio.run(batch.arun())`.
+            * Rendering meltsfiles and recording results happens within the event
+              loop, and hence these don't run concurrently.
+        """
+        timeout = self.timeout or timeout
+        remaining, total = self._prepare(
+            overwrite=overwrite,
+            max_attempts=max_attempts,
+            store=store,
+            keep_folders=keep_folders,
+            pack=pack,
+            schedule=schedule,
+            priority=priority,
+            result_store=result_store,
+        )
+        queue = self._iter_tasks(
+            remaining,
+            exclude=exclude,
+            fromdir=self.fromdir,
+            timeout=timeout,
+            cpu_timeout=cpu_timeout,
+            superliquidus_start=superliquidus_start,
+            cache_tables=cache_tables,
+            staging=staging,
+        )
+        concurrency = concurrency or os.cpu_count() or 1
+        self.results = {}
+        while queue:
+            progress = dict(file=ToLogger(self.logger), mininterval=2, total=total)
+            errored = []
+            queue = iter(queue)  # shared between workers
+
+            async def worker(bar):
+                for item in queue:
+                    self.logger.debug("Start {}.".format(item[1][0]))
+                    self.ledger.update(item[0], "running")
+                    try:
+                        result = await arun_experiment(**item[2])
+                    except Exception as e:  # errors raised outside of the melts process
+                        result = self._failed_result(item, e)
+                    self._record(result, experiment=item[1])
+                    if result["status"] != "done":
+                        errored.append(item)
+                    bar.update()
+
+            with tqdm(**progress) as bar:
+                await asyncio.gather(*[worker(bar) for _ in range(concurrency)])
+            # retry experiments which failed or timed out, where allowed
+            retry = self.ledger.pending([i[0] for i in errored], max_attempts)
+            queue = [i for i in errored if i[0] in retry]
+            total = len(queue)
+            if queue:
+                self.logger.info("Retrying {} Calculations.".format(len(queue)))
+        self._finish()
+
+    def _prepare(
+        self,
+        overwrite=False,
+        max_attempts=1,
+        store=None,
+        keep_folders=True,
+        pack=False,
+        schedule="longest",
+        priority=None,
+        result_store=None,
+    ):
+        """
+        Prepare to run the batch, serializing the configuration, opening the ledger
+        and store and scheduling the experiments which remain to be run. Parameters
+        are as for :meth:`run`.
+
+        Returns
+        --------
+        remaining : :class:`list` | :class:`~collections.abc.Iterator`
+            Experiment hashes and tuples of the experiment title, configuration and
+            environment, in the order in which they're to be run.
+        total : :class:`int`
+            Number of experiments to run, or :code:`None` for lazy batches.
+        """
+        self.dump()  # Serialize the config first
+        self.started = time.time()
+        self.ledger = RunLedger(self.fromdir)
+        remove_stale_scratch(self.fromdir)  # from commits of interrupted runs
+        self.store, self.keep_folders = None, keep_folders
+        self.pack = [pack, "zip"][pack is True]
+        if isinstance(store, BatchStore):
+            self.store = store
+        elif store:
+            self.store = BatchStore(self.fromdir if store is True else store)
+        self.result_store, self._result_keys = None, {}
+        if isinstance(result_store, ResultStore):
+            self.result_store = result_store
+        elif result_store:
+            self.result_store = ResultStore(result_store)
+        remaining = self._iter_remaining(overwrite=overwrite, max_attempts=max_attempts)
+        if schedule is not None or priority is not None:
+            remaining = schedule_experiments(
+                remaining,
+                estimator=self.estimator,
+                strategy=schedule,
+                priority=priority,
+                window=[None, SCHEDULE_WINDOW][self.lazy],
             )
-            try:
-                M.run(superliquidus_start=superliquidus_start)
-                self.logger.debug("Finished {}.".format(title))
-            except OSError:
-                try:
-                    self.logger.warning("Errored @ {}.".format(M.mp.callstring))
-                except:
-                    pass
-                failed.append(title)
-        # should check if it actually ran here (e.g. timeouts)
+        if self.lazy:  # experiments are generated as they're submitted
+            total = None
+            self.logger.info("Starting up to {} Calculations.".format(len(self)))
+        else:
+            remaining = list(remaining)
+            total = len(remaining)
+            self.logger.info("Starting {} Calculations.".format(total))
+        return remaining, total
+
+    def _finish(self):
+        """
+        Log the duration of the batch and any experiments which errored.
+        """
+        failed = [r["title"] for r in self.results.values() if r["status"] != "done"]
         self.duration = datetime.timedelta(seconds=time.time() - self.started)
         self.logger.info("Calculations Complete after {}".format(self.duration))
         if failed:
             self.logger.warning("Some calculations errored:")
             for f in failed:
                 self.logger.warning(f)
+        if self.result_store is not None:
+            report = self.result_store.report()
+            if report["hit_rate"] is not None:
+                self.logger.info(
+                    "Found {} of {} Calculations in the result store ({:.0%}).".format(
+                        report["hits"],
+                        report["hits"] + report["misses"],
+                        report["hit_rate"],
+                    )
+                )
+
+    def _iter_remaining(self, overwrite=False, max_attempts=1):
+        """
+        Iterate over the experiments which remain to be run, adding new experiments
+        to the batch ledger.
+
+        Parameters
+        -----------
+        overwrite : :class:`bool`
+            Whether to include experiments which have already been run.
+        max_attempts : :class:`int` | :class:`dict`
+            Maximum number of attempts for experiments which fail or time out.
+
+        Yields
+        -------
+        :class:`tuple`
+            Experiment hash and a tuple of the experiment title, configuration and
+            environment.
+        """
+        packed = None  # experiments packed into archives, listed where needed
+        for hsh, experiment in self.iter_experiments():
+            if not overwrite:
+                if not self.ledger.pending([hsh], max_attempts):
+                    continue
+                if hsh not in self.ledger:  # e.g. run by previous versions
+                    if (self.fromdir / hsh).exists():
+                        continue
+                    if packed is None:
+                        packed = packed_experiments(self.fromdir)
+                    if hsh in packed:
+                        continue
+            if hsh not in self.ledger:
+                self.ledger.update(hsh, "pending", title=experiment[0])
+            yield hsh, experiment
+
+    def _iter_tasks(self, experiments, exclude=[], **kwargs):
+        """
+        Iterate over tasks for a number of experiments, rendering the meltsfile and
+        environment for each.
+
+        Parameters
+        -----------
+        experiments : :class:`list`
+            Experiment hashes and tuples of the experiment title, configuration and
+            environment.
+        exclude : :class:`list`
+            Phases to exclude from all experiments.
+
+        Yields
+        -------
+        :class:`tuple`
+            Experiment hash, a tuple of the experiment title, configuration and
+            environment, and keyword arguments for :func:`run_experiment`.
+
+        Notes
+        ------
+            * Experiments found in the result store are checked out and recorded
+              rather than yielded.
+        """
+        for hsh, (title, exp, env) in experiments:
+            cfg = {**exp}  # avoid modifying the stored configuration
+            exp_exclude = [*exclude]
+            if "exclude" in cfg:
+                exp_exclude += cfg.pop("exclude")  # remove exclude
+
+            meltsfile = dict_to_meltsfile(cfg, modes=cfg["modes"], exclude=exp_exclude)
+            envfile, _ = read_envfile(env, unset_variables=False)
+            task = dict(
+                name=hsh, title=title, meltsfile=meltsfile, env=envfile, **kwargs
+            )
+            if getattr(self, "result_store", None) is not None:
+                if self._checkout(task, experiment=(title, exp, env)):
+                    continue
+            yield hsh, (title, exp, env), task
+
+    def _checkout(self, task, experiment=None):
+        """
+        Check out the results of an experiment from the result store, where they
+        exist, and record it as complete.
+
+        Parameters
+        -----------
+        task : :class:`dict`
+            Keyword arguments for :func:`run_experiment`.
+        experiment : :class:`tuple`
+            Experiment title, configuration and environment.
+
+        Returns
+        --------
+        :class:`bool`
+            Whether the results were found.
+        """
+        hsh, title = task["name"], task["title"]
+        key = self.result_store.key(
+            task["meltsfile"],
+            task["env"],
+            superliquidus_start=task.get("superliquidus_start", True),
+        )
+        self._result_keys[hsh] = key
+        try:
+            found = self.result_store.checkout(
+                key,
+                self.fromdir / hsh,
+                files={
+                    "{}.melts".format(title): task["meltsfile"],
+                    "environment.txt": task["env"],
+                },
+            )
+        except OSError as e:  # the experiment is run instead
+            self.logger.warning("Errored checking out {}: {}".format(title, e))
+            return False
+        if found:
+            result = dict(
+                name=hsh, title=title, status="done", message=None, duration=None
+            )
+            self._record(dict(result, shared=True), experiment=experiment)
+        return found
+
+    def _run_serial(self, queue, progress={}, func=run_experiment):
+        """
+        Run experiments one at a time in the current process.
+
+        Parameters
+        -----------
+        queue : :class:`list` | :class:`~collections.abc.Iterator`
+            Experiments to run, as yielded by :meth:`_iter_tasks`.
+        progress : :class:`dict`
+            Keyword arguments for the :class:`tqdm.tqdm` progress bar.
+        func : :class:`callable`
+            Function used to run each experiment.
+
+        Yields
+        -------
+        :class:`tuple`
+            Experiment and result dictionary.
+        """
+        for item in tqdm(queue, **progress):
+            hsh, (title, exp, env), task = item
+            self.logger.debug("Start {}.".format(title))
+            self.ledger.update(hsh, "running")
+            yield item, func(**task)
+
+    def _run_with_executor(
+        self, executor, queue, progress={}, func=run_experiment, max_pending=None
+    ):
+        """
+        Submit experiments to an executor and yield the results as they complete.
+
+        Parameters
+        -----------
+        executor : :class:`concurrent.futures.Executor`
+            Executor to submit experiments to.
+        queue : :class:`list` | :class:`~collections.abc.Iterator`
+            Experiments to run, as yielded by :meth:`_iter_tasks`.
+        progress : :class:`dict`
+            Keyword arguments for the :class:`tqdm.tqdm` progress bar.
+        func : :class:`callable`
+            Function used to run each experiment.
+        max_pending : :class:`int`
+            Maximum number of experiments submitted but not yet complete, such that
+            experiments are generated as they're needed. Defaults to twice the
+            number of CPUs.
+
+        Yields
+        -------
+        :class:`tuple`
+            Experiment and result dictionary.
+        """
+        queue = iter(queue)
+        max_pending = max_pending or 2 * (os.cpu_count() or 1)
+        pending = {}
+
+        def submit(n):
+            for item in itertools.islice(queue, n):
+                # experiments are marked as running once submitted
+                pending[executor.submit(func, **item[2])] = item
+                self.ledger.update(item[0], "running")
+
+        submit(max_pending)
+        with tqdm(**progress) as bar:
+            while pending:
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    item = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:  # errors raised outside of the melts process
+                        result = self._failed_result(item, e)
+                    bar.update()
+                    yield item, result
+                submit(max_pending - len(pending))
+
+    def _failed_result(self, item, error):
+        """
+        Get the result for an experiment which raised an error outside of the
+        alphaMELTS process.
+
+        Parameters
+        -----------
+        item : :class:`tuple`
+            Experiment, as yielded by :meth:`_iter_tasks`.
+        error : :class:`Exception`
+            The error raised.
+
+        Returns
+        --------
+        :class:`dict`
+        """
+        return dict(
+            name=item[0],
+            title=item[1][0],
+            status="failed",
+            message="{}: {}".format(error.__class__.__name__, error),
+            duration=None,
+        )
+
+    def _record_all(self, completed):
+        """
+        Record the results of completed experiments.
+
+        Parameters
+        -----------
+        completed : :class:`~collections.abc.Iterator`
+            Experiments and their result dictionaries.
+
+        Returns
+        --------
+        :class:`list`
+            Experiments which failed or timed out.
+        """
+        errored = []
+        for item, result in completed:
+            self._record(result, experiment=item[1])
+            if result["status"] != "done":
+                errored.append(item)
+        return errored
+
+    def _record(self, result, experiment=None):
+        """
+        Record the result of a single experiment and log its outcome.
+
+        Parameters
+        -----------
+        result : :class:`dict`
+            Result dictionary, as returned from :func:`run_experiment`.
+        experiment : :class:`tuple`
+            Experiment title, configuration and environment.
+        """
+        self.results[result["name"]] = result
+        self.ledger.update(
+            result["name"],
+            result["status"],
+            duration=result["duration"],
+            reason=result["message"] or "completed",
+        )
+        self.telemetry.append(
+            result["name"],
+            title=result["title"],
+            status=result["status"],
+            duration=result["duration"],
+            metrics=result.get("metrics", {}),
+        )
+        if result["status"] == "done":
+            if result.get("shared", False):
+                self.logger.debug(
+                    "Found {} in the result store.".format(result["title"])
+                )
+            else:
+                self.logger.debug(
+                    "Finished {} in {:.1f} s.".format(
+                        result["title"], result["duration"]
+                    )
+                )
+                if result["name"] in getattr(self, "_result_keys", {}):
+                    self._share(result["name"], experiment)
+            if getattr(self, "store", None) is not None:
+                self._store(result["name"], experiment)
+            if getattr(self, "pack", None) and (self.fromdir / result["name"]).is_dir():
+                try:
+                    pack_folder(self.fromdir / result["name"], fmt=self.pack)
+                except OSError as e:  # the experiment folder is kept
+                    self.logger.warning(
+                        "Errored packing {}: {}".format(result["title"], e)
+                    )
+        else:
+            self.logger.warning(
+                "Errored @ {}: {}".format(result["title"], result["message"])
+            )
+
+    def _share(self, hsh, experiment=None):
+        """
+        Add the results of a completed experiment to the result store.
+
+        Parameters
+        -----------
+        hsh : :class:`str`
+            Experiment hash.
+        experiment : :class:`tuple`
+            Experiment title, configuration and environment.
+        """
+        title = (experiment or self.experiments[hsh])[0]
+        try:
+            self.result_store.add(self._result_keys[hsh], self.fromdir / hsh)
+        except OSError as e:  # the experiment is still complete
+            self.logger.warning("Errored sharing {}: {}".format(title, e))
+
+    def _store(self, hsh, experiment=None):
+        """
+        Add the tables of a completed experiment to the batch store, removing the
+        experiment folder where folders aren't kept.
+
+        Parameters
+        -----------
+        hsh : :class:`str`
+            Experiment hash.
+        experiment : :class:`tuple`
+            Experiment title, configuration and environment.
+        """
+        title, exp, env = experiment or self.experiments[hsh]
+        try:
+            self.store.ingest(
+                self.fromdir / hsh,
+                name=hsh,
+                title=title,
+                config=exp,
+                env=env.dump(unset_variables=False),
+                remove=not self.keep_folders,
+            )
+        except Exception as e:  # the experiment folder is kept
+            self.logger.warning("Errored storing {}: {}".format(title, e))
 
     def cleanup(self):
         pass
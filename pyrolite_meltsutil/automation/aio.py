@@ -0,0 +1,450 @@
+"""
+Asyncio driver for alphaMELTS processes, such that a single coordinating process can
+supervise many concurrent alphaMELTS processes without a set of threads for each.
+"""
+import os
+import re
+import time
+import asyncio
+import platform
+import threading
+from pathlib import Path
+from ..util.general import get_local_link
+from .org import make_meltsfolder, commit_meltsfolder, build_table_cache
+from .process import PROMPTS, kill_process_group, _SupervisedProcess
+from .telemetry import ProcessMonitor
+from ..env import process_environ
+from ..util.log import Handle
+
+logger = Handle(__name__)
+
+
+class AsyncMeltsProcess(_SupervisedProcess):
+    """
+    Asyncio equivalent of :class:`~pyrolite_meltsutil.automation.process.MeltsProcess`,
+    built on :func:`asyncio.create_subprocess_exec`. Output is read and time limits
+    are enforced by tasks within the event loop rather than by threads.
+
+    Parameters
+    ----------
+    executable : :class:`str` | :class:`pathlib.Path`
+        Executable to run. Falls back to local installation if no exectuable is
+        specified and a local instllation exists.
+    env : :class:`str` | :class:`pathlib.Path`
+        Environment file to use.
+    meltsfile : :class:`str` | :class:`pathlib.Path`
+        Path to meltsfile to use for calculations.
+    fromdir : :class:`str` | :class:`pathlib.Path`
+        Directory to use as the working directory for the execution.
+    log : :class:`callable`
+        Function for logging output.
+    timeout : :class:`float`
+        Maximum duration of the process, in seconds.
+    cpu_timeout : :class:`float`
+        Maximum CPU time of the process and its children, in seconds.
+    idle_timeout : :class:`float`
+        Duration (in seconds) without any output after which :meth:`wait_for_prompt`
+        returns when a prompt has not been recognised.
+    prompts : :class:`list` of :class:`str`
+        Regular expressions which match prompts for input at the end of the
+        alphaMELTS output.
+    monitor : :class:`bool`
+        Whether to monitor the memory and CPU usage of the process (see
+        :class:`~pyrolite_meltsutil.automation.telemetry.ProcessMonitor`).
+    watchdog_interval : :class:`float`
+        Interval (in seconds) at which the watchdog samples the process and checks
+        whether it has exceeded its time limits.
+
+    Notes
+    ------
+        * The process isn't started on construction; use :meth:`start` or the
+          process as an asynchronous context manager (:code:`async with`).
+        * Resource usage is sampled by the watchdog task rather than by a monitoring
+          thread.
+    """
+
+    def __init__(
+        self,
+        executable=None,
+        env="alphamelts_default_env.txt",
+        meltsfile=None,
+        fromdir=r"./",
+        log=logger.debug,
+        timeout=None,
+        cpu_timeout=None,
+        idle_timeout=1.0,
+        prompts=PROMPTS,
+        monitor=True,
+        watchdog_interval=0.5,
+    ):
+        self.log = log
+        self.timeout = timeout or 60.0  # 1 minute max
+        self.cpu_timeout = cpu_timeout
+        self.idle_timeout = idle_timeout
+        self.watchdog_interval = watchdog_interval
+        self.monitor = monitor or (cpu_timeout is not None)
+        self.exit_reason = None  # set where the process is terminated early
+        self.timeout_limit = None  # the limit which was exceeded, if any
+        self.supervise = True  # whether limits are currently enforced
+        self._lock = threading.Lock()  # e.g. for timeouts from executor threads
+        self.process = None
+        self.env = None
+        self.prompt_pattern = re.compile(
+            r"({})\s*$".format("|".join(prompts)).encode("utf-8")
+        )
+        self.fromdir = None
+        if fromdir is not None:
+            self.fromdir = Path(fromdir)
+            self.fromdir.mkdir(parents=True, exist_ok=True)
+
+        if executable is None:  # check for local install
+            executable = get_local_link(
+                ["run_alphamelts.command", "run_alphamelts.bat"][
+                    platform.system() == "Windows"
+                ]
+            )
+            self.log(
+                "Using local executable: {} @ {}".format(
+                    executable.name, executable.parent
+                )
+            )
+        executable = Path(executable)
+        self.exname = str(executable.name)
+        self.executable = str(executable)
+        self.run = [self.executable]
+        self.init_args = []  # initial arguments to pass to the exec before returning
+        if meltsfile is not None:
+            self.meltsfile = Path(meltsfile)
+            self.run += ["-m", str(self.meltsfile)]
+            self.init_args += ["1", str(self.meltsfile)]  # enter meltsfile
+        if env is not None:
+            self.env = Path(env)
+            self.run += ["-f", str(env)]
+
+    async def __aenter__(self):
+        try:
+            await self.start()
+        except BaseException:  # e.g. a broken pipe or cancellation
+            if self.process is not None:
+                await self.terminate()
+            raise
+        return self
+
+    async def __aexit__(self, *args):
+        await self.terminate()
+
+    @property
+    def callstring(self):
+        """Get the call string such that analyses can be reproduced manually."""
+        return " ".join(["cd", str(self.fromdir), "&&"] + self.run)
+
+    async def start(self):
+        """
+        Start the process, wait for the main menu and pass the initial arguments.
+
+        Returns
+        --------
+        :class:`asyncio.subprocess.Process`
+        """
+        self.started = time.time()
+        self.log(
+            "Starting Melts Process with: " + " ".join([self.exname] + self.run[1:])
+        )
+        config = dict(
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=str(self.fromdir) if self.fromdir is not None else None,
+        )
+        if self.env is not None:  # variables are given only by the environment file
+            config["env"] = process_environ()
+        if os.name == "posix":  # start a new session, and hence process group
+            config["start_new_session"] = True
+        self.process = await asyncio.create_subprocess_exec(*self.run, **config)
+        self._start_metrics()
+        self.monitor = ProcessMonitor(self.process.pid) if self.monitor else None
+        if self.monitor is not None:
+            self.monitor.sample()
+        logger.debug("Process Started with ID {}".format(self.process.pid))
+        self.output, self.errors = [], []
+        self.prompt = asyncio.Event()
+        self.last_output = self.started
+        self._reader = asyncio.ensure_future(self._read_output())
+        self._err_reader = asyncio.ensure_future(self._read_errors())
+        self._watchdog = asyncio.ensure_future(self._watch())
+        await self.wait_for_prompt()  # wait for the main menu
+        self.log("Passing Inital Variables: " + " ".join(self.init_args))
+        await self.write(self.init_args)
+        return self.process
+
+    async def _read_output(self, tail=256):
+        """
+        Read output from the process as it becomes available, signalling when the
+        output ends with a prompt for input.
+        """
+        buffer = b""
+        while True:
+            chunk = await self.process.stdout.read(4096)
+            if not chunk:
+                break
+            self.output.append(chunk)
+            self.last_output = time.time()
+            self.output_stats["bytes"] += len(chunk)
+            if self.output_stats["first"] is None:
+                self.output_stats["first"] = self.last_output
+            buffer = (buffer + chunk)[-tail:]
+            if self.prompt_pattern.search(buffer):
+                self.prompt.set()
+        self.prompt.set()  # the process has exited, nothing left to wait for
+
+    async def _read_errors(self):
+        """
+        Read error output from the process.
+        """
+        while True:
+            line = await self.process.stderr.readline()
+            if not line:
+                break
+            self.errors.append(line)
+
+    def read(self):
+        """
+        Read the output since it was last read.
+
+        Returns
+        ---------
+        :class:`str`
+            Concatenated output.
+        """
+        output, self.output = self.output, []
+        return b"".join(output).decode(errors="replace")
+
+    async def _timeout(self, limit=None):
+        """
+        Log and kill a process which has timed out, saving any output which hasn't
+        been read.
+
+        Parameters
+        -----------
+        limit : :class:`str`
+            The limit which has been exceeded.
+        """
+        if not self._set_timed_out(limit):  # already handled
+            return
+        await self.kill()
+        try:  # collect remaining output
+            await asyncio.wait_for(asyncio.shield(self._reader), timeout=1.0)
+        except asyncio.TimeoutError:
+            pass
+        self._save_output(self.read())
+        self.prompt.set()  # stop waiting for output
+
+    async def _watch(self):
+        """
+        Watch the process, sampling its resource usage and killing it where it
+        exceeds its time limits.
+        """
+        while self.process.returncode is None and self.exit_reason is None:
+            await asyncio.sleep(self.watchdog_interval)
+            if self.monitor is not None:
+                self.monitor.sample()
+            limit = self._exceeded() if self.supervise else None
+            if limit is not None:
+                await self._timeout(limit)
+
+    async def kill(self):
+        """
+        Kill the process, together with its process group and any other processes
+        it has started.
+        """
+        kill_process_group(self.process.pid)
+        try:
+            self.process.kill()  # e.g. where process groups aren't available
+        except ProcessLookupError:
+            pass
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout=1.0)
+        except asyncio.TimeoutError:
+            logger.warning("Process {} could not be killed.".format(self.process.pid))
+
+    async def wait_for_prompt(self, step=1.0, idle_timeout=None):
+        """
+        Wait until the process is ready for further input, or output stops.
+
+        Parameters
+        -----------
+        step : :class:`float`
+            Maximum interval between checks for timeouts, in seconds.
+        idle_timeout : :class:`float`
+            Duration (in seconds) without output after which to stop waiting for a
+            prompt. Defaults to the :code:`idle_timeout` of the process.
+        """
+        waiting = time.time()  # output before this doesn't count towards idling
+        idle_timeout = idle_timeout or self.idle_timeout
+        while not self.prompt.is_set():
+            idle = time.time() - max(self.last_output, waiting)
+            try:
+                await asyncio.wait_for(
+                    self.prompt.wait(), timeout=max(min(step, idle_timeout - idle), 0)
+                )
+            except asyncio.TimeoutError:
+                if self._exceeded():
+                    await self._timeout()
+                    break
+                elif (time.time() - max(self.last_output, waiting)) > idle_timeout:
+                    self._metrics["idle_time"] += idle_timeout
+                    break
+        self._metrics["wait_time"] += time.time() - waiting
+
+    async def write(self, messages, wait=True, log=False):
+        """
+        Send commands to the process.
+
+        Parameters
+        -----------
+        messages
+            Sequence of messages/commands to send.
+        wait : :class:`bool`
+            Whether to wait for a prompt after each message.
+        log : :class:`bool`
+            Whether to log output to the logger.
+        """
+        for message in messages:
+            if self.exit_reason is not None:  # e.g. killed by the watchdog
+                break
+            msg = (str(message).strip() + str(os.linesep)).encode("utf-8")
+            self.prompt.clear()  # wait for the response to this message
+            try:
+                self.process.stdin.write(msg)
+                await self.process.stdin.drain()
+            except OSError:  # e.g. a broken pipe, where killed while writing
+                if self.exit_reason is not None:
+                    break
+                raise
+            if wait:
+                await self.wait_for_prompt()
+            if log:
+                self.log(message)
+                self.log("\n" + self.read())
+
+    async def terminate(self):
+        """
+        Terminate the process, exiting alphaMELTS where possible and otherwise
+        killing its process group.
+        """
+        started = time.time()
+        self.supervise = False
+        self._watchdog.cancel()
+        if self.monitor is not None:
+            self.monitor.sample()  # take a final sample before the process exits
+        if self.process.returncode is None and self.exit_reason is None:
+            try:
+                await self.write("0", wait=False)
+                await asyncio.wait_for(self.process.wait(), timeout=0.5)
+            except asyncio.TimeoutError:
+                pass
+            except (OSError, ValueError):  # e.g. a broken pipe
+                logger.warning("Process terminated unexpectedly.")
+        try:
+            self.process.stdin.close()
+        except (OSError, ValueError):
+            pass
+        await self.kill()
+        await asyncio.gather(
+            self._reader, self._err_reader, self._watchdog, return_exceptions=True
+        )
+        self._metrics["terminate_time"] = time.time() - started
+
+
+async def arun_experiment(
+    name,
+    title,
+    meltsfile,
+    env,
+    fromdir,
+    timeout=None,
+    superliquidus_start=True,
+    cache_tables=False,
+    cpu_timeout=None,
+    staging=None,
+):
+    """
+    Create and run a single experiment with an :class:`AsyncMeltsProcess`. This is
+    the asynchronous equivalent of
+    :func:`~pyrolite_meltsutil.automation.run_experiment`, and takes the same
+    arguments.
+
+    Parameters
+    -----------
+    name : :class:`str`
+        Name of the experiment folder (typically the experiment hash).
+    title : :class:`str`
+        Title of the experiment.
+    meltsfile : :class:`str`
+        Multiline string representation of the meltsfile.
+    env : :class:`str`
+        Multiline string representation of the environment file.
+    fromdir : :class:`str` | :class:`pathlib.Path`
+        Directory in which to create the experiment folder.
+    timeout : :class:`float`
+        Timeout for the experiment, in seconds.
+    superliquidus_start : :class:`bool`
+        Whether to start the calculation from the liquidus.
+    cache_tables : :class:`bool`
+        Whether to build the table cache for the experiment once it's complete.
+    cpu_timeout : :class:`float`
+        Maximum CPU time for the experiment, in seconds.
+    staging : :class:`bool` | :class:`str` | :class:`pathlib.Path`
+        Scratch directory in which to run the experiment before its folder is moved
+        into :code:`fromdir` (see
+        :func:`~pyrolite_meltsutil.automation.org.get_staging_dir`).
+
+    Returns
+    --------
+    :class:`dict`
+        Summary of the run, as for
+        :func:`~pyrolite_meltsutil.automation.run_experiment`.
+    """
+    started = time.time()
+    result = dict(name=name, title=title, status="done", message=None)
+    folder = make_meltsfolder(
+        name=name,
+        title=title,
+        meltsfile=meltsfile,
+        indir=fromdir,
+        env=env,
+        staging=staging,
+    )
+    mp = AsyncMeltsProcess(
+        meltsfile=str(title) + ".melts",
+        env="environment.txt",
+        fromdir=str(folder),
+        timeout=timeout,
+        cpu_timeout=cpu_timeout,
+    )
+    try:
+        async with mp:
+            await mp.write([3, [0, 1][superliquidus_start], 4])
+        if mp.exit_reason == "timed-out":
+            result["status"] = "timed-out"
+            result["message"] = "Timed out after {:.1f} s ({} limit)".format(
+                time.time() - started, mp.timeout_limit
+            )
+        elif not (folder / "System_main_tbl.txt").exists():
+            result["status"] = "failed"
+            result["message"] = "No output tables @ {}".format(mp.callstring)
+        elif cache_tables:  # parsing tables would otherwise block the event loop
+            await asyncio.get_running_loop().run_in_executor(
+                None, build_table_cache, folder
+            )
+    except OSError as e:
+        result["status"] = "failed"
+        result["message"] = "{} @ {}".format(e, mp.callstring)
+    finally:
+        if staging:  # moving the folder may involve copying it
+            await asyncio.get_running_loop().run_in_executor(
+                None, commit_meltsfolder, folder, Path(fromdir) / name
+            )
+    result["duration"] = time.time() - started
+    result["metrics"] = mp.metrics if mp.process is not None else {}
+    return result
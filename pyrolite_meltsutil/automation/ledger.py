@@ -0,0 +1,167 @@
+"""
+Persistent ledgers recording the state of experiments within a batch, such that
+interrupted or failed batches can be resumed.
+"""
+import json
+import datetime
+import pandas as pd
+from pathlib import Path
+from ..util.log import Handle
+
+logger = Handle(__name__)
+
+STATES = ["pending", "running", "done", "failed", "timed-out"]
+
+
+class RunLedger(object):
+    """
+    Append-only ledger of experiment states, stored as JSON lines. Each record
+    includes the experiment hash, its state, the number of completed attempts, and
+    the duration and exit reason of the most recent attempt. On loading, the most
+    recent record for each experiment is taken as its current state.
+
+    Parameters
+    -----------
+    path : :class:`str` | :class:`pathlib.Path`
+        Path to the ledger file. If this is a directory, the ledger will be
+        :code:`meltsBatchLedger.jsonl` within it.
+    """
+
+    def __init__(self, path):
+        path = Path(path)
+        if path.is_dir():
+            path = path / "meltsBatchLedger.jsonl"
+        self.path = path
+        self.records = {}
+        self.load()
+
+    def load(self):
+        """
+        Load records from the ledger file, if it exists.
+        """
+        self.records = {}
+        if self.path.exists():
+            with open(str(self.path), "r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:  # e.g. a partially written line
+                        logger.debug("Skipping malformed ledger record.")
+                        continue
+                    self.records[record["hash"]] = record
+
+    def __contains__(self, hsh):
+        return hsh in self.records
+
+    def __len__(self):
+        return len(self.records)
+
+    def state(self, hsh):
+        """
+        Get the current state of an experiment.
+
+        Parameters
+        -----------
+        hsh : :class:`str`
+            Experiment hash.
+
+        Returns
+        --------
+        :class:`str`
+            State of the experiment, or :code:`None` if it's not in the ledger.
+        """
+        return self.records.get(hsh, {}).get("state", None)
+
+    def attempts(self, hsh):
+        """
+        Get the number of completed attempts for an experiment.
+
+        Parameters
+        -----------
+        hsh : :class:`str`
+            Experiment hash.
+
+        Returns
+        --------
+        :class:`int`
+        """
+        return self.records.get(hsh, {}).get("attempts", 0)
+
+    def update(self, hsh, state, title=None, duration=None, reason=None):
+        """
+        Record the state of an experiment. Attempts are counted where experiments
+        reach a final state (i.e. done, failed or timed-out).
+
+        Parameters
+        -----------
+        hsh : :class:`str`
+            Experiment hash.
+        state : :class:`str`
+            State of the experiment, one of :data:`STATES`.
+        title : :class:`str`
+            Experiment title.
+        duration : :class:`float`
+            Duration of the attempt, in seconds.
+        reason : :class:`str`
+            Exit reason for the attempt.
+        """
+        assert state in STATES, "Unknown state: {}".format(state)
+        previous = self.records.get(hsh, {})
+        record = dict(
+            hash=hsh,
+            title=title or previous.get("title", None),
+            state=state,
+            attempts=self.attempts(hsh) + int(state in ["done", "failed", "timed-out"]),
+            duration=duration,
+            reason=reason,
+            time=datetime.datetime.now().isoformat(),
+        )
+        self.records[hsh] = record
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(str(self.path), "a") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def pending(self, hashes, max_attempts=1):
+        """
+        Get the experiments which remain to be run, including those which haven't
+        been started, were interrupted while running, or have failed or timed out
+        fewer than :code:`max_attempts` times.
+
+        Parameters
+        -----------
+        hashes : :class:`list`
+            Experiment hashes to check.
+        max_attempts : :class:`int` | :class:`dict`
+            Maximum number of attempts for each experiment. A dictionary can be used
+            to specify the maximum attempts for failed and timed-out experiments
+            individually (e.g. :code:`{'failed': 2, 'timed-out': 1}`).
+
+        Returns
+        --------
+        :class:`list`
+            Hashes for the experiments which remain to be run.
+        """
+        if not isinstance(max_attempts, dict):
+            max_attempts = {"failed": max_attempts, "timed-out": max_attempts}
+        remaining = []
+        for hsh in hashes:
+            state = self.state(hsh)
+            if state in [None, "pending", "running"]:
+                remaining.append(hsh)
+            elif state in max_attempts and self.attempts(hsh) < max_attempts[state]:
+                remaining.append(hsh)
+        return remaining
+
+    def to_frame(self):
+        """
+        Get a summary of the current state of the ledger.
+
+        Returns
+        --------
+        :class:`pandas.DataFrame`
+            Table of experiment states, indexed by experiment hash.
+        """
+        columns = ["title", "state", "attempts", "duration", "reason", "time"]
+        return pd.DataFrame.from_dict(
+            self.records, orient="index", columns=["hash"] + columns
+        ).reindex(columns=columns)
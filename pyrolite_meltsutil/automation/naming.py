@@ -1,5 +1,12 @@
 import json
+import math
 import hashlib
+import operator
+import itertools
+import collections
+import numpy as np
+import pandas as pd
+from pandas.api.types import infer_dtype
 from pyrolite.util.text import slugify
 from ..util.log import Handle
 
@@ -7,8 +14,66 @@ logger = Handle(__name__)
 
 __abbrv__ = {"fractionate solids": "frac", "isobaric": "isobar"}
 
+_PLAIN = {str, int, bool}  # types which are already canonical
 
-def exp_hash(d, algorithm="sha1", length=10):
+
+def canonical_value(value, decimals=None):
+    """
+    Get the canonical form of a configuration value for hashing, such that
+    effectively identical configurations have the same hash.
+
+    Parameters
+    ----------
+    value
+        Configuration value, which can be a nested dictionary or sequence.
+    decimals : :class:`int`
+        Number of decimal places to which floats are rounded, with :code:`NaN` as
+        :code:`None` and negative zeros as zero. Where this is :code:`None`, floats
+        are kept as they are, such that hashes are those of previous versions.
+
+    Returns
+    --------
+        Canonical value, with null values (e.g. :code:`pandas.NA`) as :code:`None`,
+        dictionary keys as strings, sets as sorted lists and :mod:`numpy` scalars
+        as their equivalent builtin types.
+    """
+    if type(value) in _PLAIN:  # most values, without further checks
+        return value
+    if isinstance(value, float):
+        if decimals is None:  # as for previous versions (e.g. NaN and -0.0)
+            return value
+        if value != value:  # NaN
+            return None
+        return round(value, decimals) + 0.0  # negative zero as zero
+    if isinstance(value, dict):
+        return {
+            str(k): v if type(v) in _PLAIN else canonical_value(v, decimals)
+            for k, v in value.items()
+        }
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [canonical_value(v, decimals) for v in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted(
+            [canonical_value(v, decimals) for v in value],
+            key=lambda v: json.dumps(v, sort_keys=True),
+        )
+    if isinstance(value, np.generic):
+        return canonical_value(value.item(), decimals)
+    if value is pd.NA or value is pd.NaT:
+        return None
+    return value
+
+
+def _hash(string, algorithm="sha1", length=10):
+    """
+    Get a truncated hexadecimal hash of a string.
+    """
+    hex = hashlib.new(algorithm, string.encode("utf8")).hexdigest()
+    length = length or len(hex) or -0
+    return hex[:length]
+
+
+def exp_hash(d, algorithm="sha1", length=10, decimals=None):
     """
     Get the hash of an experiment configuration dictionary.
 
@@ -20,29 +85,199 @@ def exp_hash(d, algorithm="sha1", length=10):
         Name of hash algorithm to use.
     length : :class:`int`
         Length of the returned index generated from the hash.
+    decimals : :class:`int`
+        Number of decimal places to which floats are rounded before hashing, such
+        that configurations which differ only by floating point errors (e.g. from
+        renormalisation) have the same hash. Where floats are rounded, :code:`NaN`
+        is hashed as :code:`None` and negative zeros as zero. By default, floats
+        aren't rounded, and are hashed as for previous versions.
 
     Returns
     --------
     :class:`str`
         Hash-based index for the configuration.
 
-    Todo
-    -------
+    Notes
+    ------
+        * Configurations are hashed in their canonical form (see
+          :func:`canonical_value`), with keys in sorted order for consistency
+          regardless of insertion order (e.g. default/cfg_grid).
+    """
+    cfg = canonical_value(d, decimals=decimals)
+    return _hash(
+        json.dumps(cfg, sort_keys=True, ensure_ascii=False),
+        algorithm=algorithm,
+        length=length,
+    )
+
+
+_HOMOGENEOUS = {"string", "integer", "floating", "boolean"}  # inferred dtypes
+_MISSING = object()  # placeholder for keys missing from configurations
 
-        * Consider rounding floats to 4-5 decimal places to minimise floating point
-            errors and potential differences across systems
+
+def _encode_column(values, decimals=None, integers=False):
+    """
+    JSON-encode the canonical form of each value in a column, encoding each unique
+    value once. Where :code:`integers` is :code:`True`, floats are encoded as
+    integers.
     """
 
-    hsh = hashlib.new(algorithm)
-    # sort keys for consistency regardless of insertion order (e.g. default/cfg_grid)
-    cfg = {k: d[k] for k in sorted(d.keys())}
-    hsh.update(json.dumps(cfg, sort_keys=True, ensure_ascii=False).encode("utf8"))
-    hex = hsh.hexdigest()
-    length = length or len(hex) or -0
-    return hex[:length]
+    def encode(v):
+        v = canonical_value(v, decimals=decimals)
+        return json.dumps(v, sort_keys=True, ensure_ascii=False)
+
+    if values.dtype.kind in "biuf" or infer_dtype(values) in _HOMOGENEOUS:
+        # values of different types can compare equal (e.g. 1, 1.0 and True), and
+        # hence are only factorized where they're of a single kind
+        codes, uniques = pd.factorize(values)
+        uniques = list(uniques)
+        if integers:
+            encoded = [str(int(v)) for v in uniques]
+        elif values.dtype.kind == "f":  # as for canonical_value, without overheads
+            encoded = [_encode_float(v, decimals) for v in uniques]
+        else:
+            encoded = [encode(v) for v in uniques]
+        encoded = np.array(encoded + ["null"], dtype=object)[codes]  # null: -1
+        # null values (e.g. NaN) and negative zeros are factorized with None and
+        # zero respectively, but aren't necessarily encoded as such
+        nulls = np.flatnonzero(codes == -1)
+        if not integers:
+            zeros = [
+                ix for ix, u in enumerate(uniques) if isinstance(u, float) and not u
+            ]
+            if zeros and decimals is None:
+                nulls = np.union1d(nulls, np.flatnonzero(np.isin(codes, zeros)))
+        for ix in nulls:
+            v = values[ix]
+            encoded[ix] = _encode_float(v, decimals) if type(v) is float else encode(v)
+        return encoded
+    # unhashable values (e.g. lists) are cached by identity for this column
+    encoded, cache = np.empty(len(values), dtype=object), {}
+    for ix, v in enumerate(values):
+        if isinstance(v, (list, dict, set, np.ndarray)):
+            key = id(v)
+        elif isinstance(v, float) and not v:  # distinguishing negative zeros
+            key = (type(v), repr(v))
+        else:
+            key = (type(v), v)
+        if key not in cache:
+            cache[key] = encode(v)
+        encoded[ix] = cache[key]
+    return encoded
+
+
+def _encode_float(value, decimals=None):
+    """
+    JSON-encode a float, as for :func:`canonical_value`.
+    """
+    if decimals is not None:
+        if value != value:  # NaN
+            return "null"
+        value = round(value, decimals) + 0.0
+    value = float(value)
+    return repr(value) if math.isfinite(value) else json.dumps(value)
+
+
+def _config_columns(configs):
+    """
+    Get the columns of a table or list of configurations, with a mask of the entries
+    which are missing from each.
+    """
+    if isinstance(configs, pd.DataFrame):
+        for c in configs.columns:
+            values = configs[c].values
+            yield c, values, pd.isnull(values)
+        return
+    size = len(configs)
+    counts = collections.Counter(itertools.chain.from_iterable(configs))
+    common = [k for k, n in counts.items() if n == size]
+    if common:  # keys within every configuration, taken row-wise
+        rows = map(operator.itemgetter(*common), configs)
+        columns = zip(*rows) if len(common) > 1 else [list(rows)]
+        for k, column in zip(common, columns):
+            values = np.fromiter(column, dtype=object, count=size)
+            yield k, values, np.zeros(size, dtype=bool)
+    for k in [k for k, n in counts.items() if n != size]:
+        values = np.fromiter(
+            (cfg.get(k, _MISSING) for cfg in configs), dtype=object, count=size
+        )
+        missing = np.fromiter((v is _MISSING for v in values), dtype=bool, count=size)
+        yield k, values, missing
+
+
+def exp_hashes(configs, algorithm="sha1", length=10, decimals=None):
+    """
+    Get the hashes of a number of experiment configurations in bulk, equivalent to
+    :func:`exp_hash` for each configuration.
+
+    Parameters
+    ----------
+    configs : :class:`pandas.DataFrame` | :class:`list`
+        Table of configurations with one row for each configuration, or a list of
+        configuration dictionaries.
+    algorithm : :class:`str`
+        Name of hash algorithm to use.
+    length : :class:`int`
+        Length of the returned indexes generated from the hashes.
+    decimals : :class:`int`
+        Number of decimal places to which floats are rounded before hashing (see
+        :func:`exp_hash`).
+
+    Returns
+    --------
+    :class:`pandas.Series`
+        Hash-based indexes for the configurations, with the index of the table.
+
+    Notes
+    ------
+        * Each column is encoded in a single pass over its unique values, and the
+          encoded rows are assembled column-wise, such that only the hash itself
+          is computed for each row.
+        * For tables, null values are taken to be keys which are missing from a
+          configuration (e.g. for a table constructed from configurations with
+          differing keys). Float columns with null values are hashed as integers
+          where each of their values is integral, as pandas converts integer
+          columns with missing values to floats.
+        * Lists of configurations are hashed exactly as for :func:`exp_hash`,
+          including for null values and mixed types.
+    """
+    columns, partial = [], False
+    for c, values, missing in sorted(_config_columns(configs), key=lambda c: str(c[0])):
+        present = ~missing
+        encoded = np.full(len(values), None, dtype=object)
+        if present.any():
+            _values = values[present]
+            integers = (
+                isinstance(configs, pd.DataFrame)
+                and (values.dtype.kind == "f")
+                and missing.any()
+                and bool(np.all(np.mod(_values, 1) == 0))
+            )
+            encoded[present] = (
+                json.dumps(str(c), ensure_ascii=False)
+                + ": "
+                + _encode_column(_values, decimals=decimals, integers=integers)
+            )
+        partial = partial or missing.any()
+        columns.append(encoded)
+    if not columns:
+        rows = ["{}"] * len(configs)
+    elif partial:  # skipping missing entries
+        rows = [
+            "{" + ", ".join([e for e in r if e is not None]) + "}"
+            for r in zip(*columns)
+        ]
+    else:
+        rows = ["{" + ", ".join(r) + "}" for r in zip(*columns)]
+    length = length or None
+    return pd.Series(
+        [hashlib.new(algorithm, r.encode("utf8")).hexdigest()[:length] for r in rows],
+        index=configs.index if isinstance(configs, pd.DataFrame) else None,
+        dtype=object,
+    )
 
 
-def exp_name(exp):
+def exp_name(exp, hsh=None):
     """
     Derive an experiment name from an experiment configuration dictionary.
 
@@ -51,6 +286,9 @@ def exp_name(exp):
     exp : :class:`dict`
         Dictionary of parameters and their specific values to derive an experiment name
         from.
+    hsh : :class:`str`
+        Hash of the configuration (see :func:`exp_hash`), where this has already
+        been computed.
 
     Todo
     ------
@@ -84,7 +322,7 @@ def exp_name(exp):
     )
 
     suppressstr = "-".join(["no_{}".format(v) for v in exp.get("Suppress", {})])
-    hashstr = "{}".format(exp_hash(exp))
+    hashstr = "{}".format(hsh or exp_hash(exp))
 
     return slugify(
         "".join([titlestr, modestr, pstr, tstr, fo2str, chemstr, suppressstr, hashstr])
@@ -1,12 +1,57 @@
+import os
+import time
+import shutil
+import tempfile
 from pathlib import Path
 from ..parse import read_envfile, read_meltsfile
+from ..tables.load import import_tables
 from ..util.log import Handle
 
 logger = Handle(__name__)
 
+# the umask can only be read by setting it, and hence is read once on import
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+
+
+def get_staging_dir(staging=True):
+    """
+    Get a local scratch directory in which to stage experiment folders.
+
+    Parameters
+    -----------
+    staging : :class:`bool` | :class:`str` | :class:`pathlib.Path`
+        Staging directory. Where this is :code:`True`, the shared memory filesystem
+        (:code:`/dev/shm`) is used where it's available, and otherwise the
+        temporary directory (e.g. :code:`$TMPDIR`).
+
+    Returns
+    --------
+    :class:`pathlib.Path`
+
+    Notes
+    ------
+        * Staged folders are moved out of the staging directory once committed,
+          but are left within it where a process is terminated before then. For
+          :code:`/dev/shm`, these take up memory until they're removed.
+    """
+    if staging is True:
+        shm = Path("/dev/shm")
+        if shm.is_dir() and os.access(str(shm), os.W_OK):
+            return shm
+        return Path(tempfile.gettempdir())
+    staging = Path(staging)
+    staging.mkdir(parents=True, exist_ok=True)
+    return staging
+
 
 def make_meltsfolder(
-    name, title=None, meltsfile=None, indir=None, env="./alphamelts_default_env.txt"
+    name,
+    title=None,
+    meltsfile=None,
+    indir=None,
+    env="./alphamelts_default_env.txt",
+    staging=None,
 ):
     """
     Create a folder for a given meltsfile, including the default environment file.
@@ -26,6 +71,11 @@ def make_meltsfolder(
     env : :class:`str` | :class:`pathlib.Path`
         Path to a specific environment file to use as the default environment for the
         experiment.
+    staging : :class:`bool` | :class:`str` | :class:`pathlib.Path`
+        Scratch directory in which to create the folder rather than :code:`indir`
+        (see :func:`get_staging_dir`). Staged folders have a unique name, and are
+        moved to :code:`indir / name` with :func:`commit_meltsfolder` once the
+        experiment is complete.
 
     Returns
     --------
@@ -45,6 +95,10 @@ def make_meltsfolder(
     title = title or name
     title = str(title)  # need to pathify this!
     experiment_folder = indir / name
+    if staging:  # unique, such that experiments can't collide within the scratch
+        experiment_folder = Path(
+            tempfile.mkdtemp(prefix=name + "_", dir=str(get_staging_dir(staging)))
+        )
     if not experiment_folder.exists():
         experiment_folder.mkdir(parents=True)
 
@@ -60,3 +114,129 @@ def make_meltsfolder(
         f.write(env)
 
     return experiment_folder  # return the folder name
+
+
+def commit_meltsfolder(folder, target):
+    """
+    Move a staged experiment folder (see :func:`make_meltsfolder`) to its final
+    location, replacing any existing folder.
+
+    Parameters
+    -----------
+    folder : :class:`str` | :class:`pathlib.Path`
+        Staged experiment folder.
+    target : :class:`str` | :class:`pathlib.Path`
+        Final path of the experiment folder.
+
+    Returns
+    --------
+    :class:`pathlib.Path`
+        Path to the experiment folder.
+
+    Notes
+    ------
+        * Folders are first moved (or copied, across filesystems) to a hidden
+          directory alongside the target and then renamed into place, such that
+          partially written folders are never visible to
+          :func:`~pyrolite_meltsutil.tables.load.aggregate_tables`.
+        * Only commits to a new target are atomic. Where a folder is replaced, the
+          existing folder is first moved aside, such that the target briefly
+          doesn't exist. Where the new folder can't be renamed into place, the
+          existing folder is restored and the new folder is moved back to its
+          original location.
+        * Committed folders have the default permissions of new directories (i.e.
+          according to the umask), rather than those of the staged folder.
+        * Where a process is terminated part-way through a commit, the hidden
+          directory is left alongside the target, and can be removed with
+          :func:`remove_stale_scratch`.
+    """
+    folder, target = Path(folder), Path(target)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    scratch = Path(tempfile.mkdtemp(prefix=".commit", dir=str(target.parent)))
+    try:
+        staged = scratch / "staged"  # not a valid experiment folder name
+        shutil.move(str(folder), str(staged))
+        # staged folders are private to the user, as created by tempfile.mkdtemp
+        os.chmod(str(staged), 0o777 & ~_UMASK)
+        replaced = scratch / "replaced"
+        if target.exists():
+            os.rename(str(target), str(replaced))
+        try:
+            os.rename(str(staged), str(target))
+        except OSError:  # restore the existing folder, and keep the new one
+            if replaced.exists():
+                os.rename(str(replaced), str(target))
+            shutil.move(str(staged), str(folder))
+            raise
+    finally:
+        shutil.rmtree(str(scratch), ignore_errors=True)
+    return target
+
+
+def remove_stale_scratch(directory, age=86400, prefixes=(".commit", ".shared")):
+    """
+    Remove hidden scratch directories left within a directory by commits which
+    weren't completed (see :func:`commit_meltsfolder`), e.g. where the process was
+    terminated.
+
+    Parameters
+    -----------
+    directory : :class:`str` | :class:`pathlib.Path`
+        Directory containing experiment folders.
+    age : :class:`float`
+        Time since a scratch directory was last modified after which it's
+        considered stale, in seconds. This should be well above the time taken
+        to commit a folder, such that commits in progress (e.g. by other
+        processes) are left alone.
+    prefixes : :class:`tuple`
+        Name prefixes of scratch directories.
+
+    Returns
+    --------
+    :class:`list`
+        Paths of the scratch directories removed.
+    """
+    directory, removed = Path(directory), []
+    if not directory.is_dir():
+        return removed
+    cutoff = time.time() - age
+    for entry in os.scandir(str(directory)):
+        if not entry.name.startswith(tuple(prefixes)):
+            continue
+        try:
+            stale = entry.is_dir() and entry.stat().st_mtime < cutoff
+        except OSError:  # e.g. removed by another process
+            continue
+        if stale:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed.append(Path(entry.path))
+    if removed:
+        logger.info("Removed {} stale scratch directories.".format(len(removed)))
+    return removed
+
+
+def build_table_cache(folder):
+    """
+    Import the output tables from an experiment folder and write the table cache
+    (see :mod:`pyrolite_meltsutil.tables.cache`), such that later imports needn't
+    parse the tables.
+
+    Parameters
+    -----------
+    folder : :class:`str` | :class:`pathlib.Path`
+        Experiment folder.
+
+    Returns
+    --------
+    :class:`bool`
+        Whether the cache was built.
+    """
+    folder = Path(folder)
+    if not (folder / "System_main_tbl.txt").exists():
+        return False
+    try:
+        import_tables(folder, cache=True)
+    except Exception as e:  # the run is still valid without a cache
+        logger.warning("Table cache not built for {}: {}".format(folder.name, e))
+        return False
+    return True
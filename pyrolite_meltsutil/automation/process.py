@@ -1,4 +1,6 @@
 import os, sys, platform
+import re
+import signal
 import subprocess
 import threading
 import stat
@@ -6,11 +8,22 @@ import psutil
 import queue
 import time
 from pathlib import Path
-from ..util.general import get_local_link, get_process_tree
+from ..util.general import get_local_link
+from .telemetry import ProcessMonitor
+from ..env import process_environ
 from ..util.log import Handle
 
 logger = Handle(__name__)
 
+# output which indicates alphaMELTS is waiting for input; note that the main menu
+# prompt is also what is returned to at the end of a run
+PROMPTS = [
+    r"Your choice:",  # main menu
+    r"MELTS filename:",  # reading a meltsfile (option 1)
+    r"initial guess \?",  # superliquidus/subsolidus start (option 3)
+    r"\(y or n\)",  # confirmations
+]
+
 
 def enqueue_output(out, queue):
     """
@@ -28,7 +41,184 @@ def enqueue_output(out, queue):
     out.close()
 
 
-class MeltsProcess(object):
+def enqueue_prompted_output(
+    out, queue, prompt, activity, pattern, tail=256, stats=None
+):
+    """
+    Send output to a queue as it becomes available, signalling when the output
+    ends with a prompt for input. Unlike :func:`enqueue_output`, this doesn't wait
+    for complete lines, as prompts aren't terminated by a newline.
+
+    Parameters
+    -----------
+    out
+        Readable output object.
+    queue : :class:`queue.Queue`
+        Queue to send ouptut to.
+    prompt : :class:`threading.Event`
+        Event to set when a prompt is recognised, or the output stream ends.
+    activity : :class:`list`
+        Single-item list which is updated with the time of the most recent output.
+    pattern : :class:`re.Pattern`
+        Compiled bytes pattern matching prompts at the end of the output.
+    tail : :class:`int`
+        Number of trailing bytes to keep for matching prompts split across reads.
+    stats : :class:`dict`
+        Dictionary which is updated with the volume of output (:code:`'bytes'`) and
+        the time of the first output (:code:`'first'`).
+    """
+    buffer = b""
+    for chunk in iter(lambda: out.read1(4096), b""):
+        queue.put(chunk)
+        activity[0] = time.time()
+        if stats is not None:
+            stats["bytes"] += len(chunk)
+            if stats["first"] is None:
+                stats["first"] = activity[0]
+        buffer = (buffer + chunk)[-tail:]
+        if pattern.search(buffer):
+            prompt.set()
+    out.close()
+    prompt.set()  # the process has exited, nothing left to wait for
+
+
+def kill_process_group(pid):
+    """
+    Kill the process group led by a process, together with any other descendants of
+    the process (e.g. those which have left the group). The process itself is
+    killed where it's part of the group, but isn't reaped.
+
+    Parameters
+    -----------
+    pid : :class:`int`
+        ID of the process, which leads its own process group.
+    """
+    try:
+        children = psutil.Process(pid).children(recursive=True)
+    except psutil.Error:
+        children = []
+    if os.name == "posix":
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+    for p in children:
+        try:
+            p.kill()
+        except psutil.Error:
+            pass
+
+
+class _SupervisedProcess(object):
+    """
+    Metrics and time limits for alphaMELTS processes, shared by
+    :class:`MeltsProcess` and
+    :class:`~pyrolite_meltsutil.automation.aio.AsyncMeltsProcess`. Killing the
+    process and collecting its output are left to these.
+    """
+
+    @property
+    def metrics(self):
+        """
+        Metrics for the process since it was started (or since
+        :meth:`MeltsProcess.reset_metrics`), as listed in
+        :data:`~pyrolite_meltsutil.automation.telemetry.METRICS`. Durations are in
+        seconds.
+        """
+        metrics = dict(self._metrics)
+        first = self.output_stats["first"]
+        metrics.update(
+            first_output_time=(first - self.started) if first is not None else None,
+            compute_time=max(metrics.pop("wait_time") - metrics["idle_time"], 0.0),
+            stdout_bytes=self.output_stats["bytes"],
+            exit_reason=self.exit_reason or "completed",
+        )
+        if self.monitor is not None:
+            metrics.update(
+                peak_rss=self.monitor.peak_rss, cpu_time=self.monitor.cpu_time
+            )
+        return metrics
+
+    def _start_metrics(self):
+        """
+        Start collecting metrics for a process which has just been spawned.
+        """
+        self._metrics = dict(
+            spawn_time=time.time() - self.started,
+            wait_time=0.0,
+            idle_time=0.0,
+            terminate_time=None,
+            peak_rss=None,
+            cpu_time=None,
+        )
+        self.output_stats = dict(bytes=0, first=None)
+
+    @property
+    def timed_out(self):
+        return (time.time() - self.started) > self.timeout
+
+    def _exceeded(self):
+        """
+        Check whether the process has exceeded its wall-clock or CPU time limits.
+
+        Returns
+        --------
+        :class:`str`
+            The limit which has been exceeded (:code:`'wall-clock'` or
+            :code:`'cpu-time'`), or :code:`None`.
+        """
+        if self.timed_out:
+            return "wall-clock"
+        elif (
+            self.cpu_timeout is not None
+            and self.monitor is not None
+            and self.monitor.cpu_time > self.cpu_timeout
+        ):
+            return "cpu-time"
+        return None
+
+    def _set_timed_out(self, limit=None):
+        """
+        Record that the process has timed out, where this hasn't already been
+        handled.
+
+        Parameters
+        -----------
+        limit : :class:`str`
+            The limit which has been exceeded.
+
+        Returns
+        --------
+        :class:`bool`
+            Whether the timeout is yet to be handled (i.e. the process killed).
+        """
+        limit = limit or self._exceeded() or "wall-clock"
+        with self._lock:
+            if self.exit_reason is not None:  # already handled
+                return False
+            self.exit_reason = "timed-out"
+            self.timeout_limit = limit
+        self.log(
+            "Process timed out after {:2.1f} s ({} limit)".format(
+                time.time() - self.started, limit
+            )
+        )
+        return True
+
+    def _save_output(self, output):
+        """
+        Save the output of a process which has timed out to
+        :code:`timeout_output.txt` in its working directory.
+        """
+        if output and self.fromdir is not None:
+            try:
+                with open(str(self.fromdir / "timeout_output.txt"), "w") as f:
+                    f.write(output)
+            except OSError:
+                logger.debug("Could not save output for timed out process.")
+
+
+class MeltsProcess(_SupervisedProcess):
     def __init__(
         self,
         executable=None,
@@ -37,6 +227,12 @@ class MeltsProcess(object):
         fromdir=r"./",
         log=logger.debug,
         timeout=None,
+        wait_mode="prompt",
+        idle_timeout=1.0,
+        prompts=PROMPTS,
+        monitor=True,
+        cpu_timeout=None,
+        watchdog_interval=0.5,
     ):
         """
         Parameters
@@ -53,6 +249,30 @@ class MeltsProcess(object):
             Directory to use as the working directory for the execution.
         log : :class:`callable`
             Function for logging output.
+        timeout : :class:`float`
+            Maximum duration of the process, in seconds.
+        wait_mode : :class:`str`
+            Method by which to wait for output after writing to the process. With
+            :code:`'prompt'`, :meth:`wait` returns as soon as alphaMELTS prompts for
+            further input (see :code:`prompts`) or once output has been idle for
+            :code:`idle_timeout` seconds. With :code:`'poll'`, the stdout queue is
+            polled until it stops changing.
+        idle_timeout : :class:`float`
+            Duration (in seconds) without any output after which :meth:`wait` returns
+            when a prompt has not been recognised.
+        prompts : :class:`list` of :class:`str`
+            Regular expressions which match prompts for input at the end of the
+            alphaMELTS output.
+        monitor : :class:`bool`
+            Whether to monitor the memory and CPU usage of the process (see
+            :class:`~pyrolite_meltsutil.automation.telemetry.ProcessMonitor`).
+        cpu_timeout : :class:`float`
+            Maximum CPU time of the process and its children, in seconds. This
+            requires the process to be monitored, and a monitor is used regardless
+            of :code:`monitor` where it is specified.
+        watchdog_interval : :class:`float`
+            Interval (in seconds) at which the watchdog checks whether the process
+            has exceeded its time limits.
 
         Todo
         -----
@@ -66,12 +286,32 @@ class MeltsProcess(object):
         ------
             * Need to specify an exectuable or perform a local installation of alphamelts.
             * Need to get full paths for melts files, directories etc
+            * The process is started in its own process group (or session), such
+              that the alphaMELTS executable and any other processes it starts can
+              be killed together (see :meth:`kill`).
+            * A watchdog thread enforces the wall-clock (:code:`timeout`) and CPU
+              time (:code:`cpu_timeout`) limits independently of :meth:`wait`,
+              killing the process group where either is exceeded. Any output which
+              hasn't been read is saved to :code:`timeout_output.txt` in the
+              working directory.
         """
         self.env = None
         self.meltsfile = None
         self.fromdir = None  # default to None, runs from cwd
         self.log = log
         self.timeout = timeout or 60.0  # 1 minute max
+        self.cpu_timeout = cpu_timeout
+        self.exit_reason = None  # set where the process is terminated early
+        self.timeout_limit = None  # the limit which was exceeded, if any
+        self.supervise = True  # whether limits are currently enforced
+        self.watchdog_interval = watchdog_interval
+        self._lock = threading.Lock()
+        self.wait_mode = wait_mode
+        self.idle_timeout = idle_timeout
+        self.monitor = monitor or (cpu_timeout is not None)
+        self.prompt_pattern = re.compile(
+            r"({})\s*$".format("|".join(prompts)).encode("utf-8")
+        )
         if fromdir is not None:
             self.log("Setting working directory: {}".format(fromdir))
             fromdir = Path(fromdir)
@@ -116,7 +356,10 @@ class MeltsProcess(object):
             self.run += ["-f", str(env)]
 
         self.start()  # could split this out such that processes can be prepared beforehand
-        time.sleep(0.5)
+        if self.wait_mode == "prompt":
+            self.wait()  # wait for the main menu
+        else:
+            time.sleep(0.5)
         self.log("Passing Inital Variables: " + " ".join(self.init_args))
         self.write(self.init_args)
 
@@ -125,6 +368,21 @@ class MeltsProcess(object):
         """Get the call string such that analyses can be reproduced manually."""
         return " ".join(["cd", str(self.fromdir), "&&"] + self.run)
 
+    def reset_metrics(self):
+        """
+        Reset the metrics for the process, such that they can be collected for
+        individual runs within a persistent process.
+        """
+        self.started = time.time()
+        self.supervise = True
+        self.read()  # discard output from previous runs
+        self.output_stats.update(bytes=0, first=None)
+        self._metrics.update(
+            spawn_time=None, wait_time=0.0, idle_time=0.0, terminate_time=None
+        )
+        if self.monitor is not None:
+            self.monitor.reset()
+
     def log_output(self):
         """
         Log output to the configured logger.
@@ -151,13 +409,34 @@ class MeltsProcess(object):
             cwd=str(self.fromdir),
             close_fds=(os.name == "posix"),
         )
+        if self.env is not None:  # variables are given only by the environment file
+            config["env"] = process_environ()
+        if os.name == "posix":  # start a new session, and hence process group
+            config["start_new_session"] = True
+        else:
+            config["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
         self.process = subprocess.Popen(self.run, **config)
+        self._start_metrics()
+        if self.monitor:
+            self.monitor = ProcessMonitor(self.process.pid).start()
+        else:
+            self.monitor = None
         logger.debug("Process Started with ID {}".format(self.process.pid))
         logger.debug("Reproduce using: {}".format(self.callstring))
         # Queues and Logging
         self.q = queue.Queue()
+        self.prompt = threading.Event()
+        self.last_output = [self.started]
         self.T = threading.Thread(
-            target=enqueue_output, args=(self.process.stdout, self.q)
+            target=enqueue_prompted_output,
+            args=(
+                self.process.stdout,
+                self.q,
+                self.prompt,
+                self.last_output,
+                self.prompt_pattern,
+            ),
+            kwargs=dict(stats=self.output_stats),
         )
         self.T.daemon = True  # kill when process dies
         self.T.start()  # start the output thread
@@ -168,6 +447,10 @@ class MeltsProcess(object):
         )
         self.errT.daemon = True  # kill when process dies
         self.errT.start()  # start the err output thread
+
+        self.watchdog = threading.Thread(target=self._watch)
+        self.watchdog.daemon = True
+        self.watchdog.start()
         return self.process
 
     def read(self):
@@ -181,35 +464,90 @@ class MeltsProcess(object):
         """
         lines = []
         while not self.q.empty():
-            lines.append(self.q.get_nowait().decode())
-        return "".join(lines)
+            lines.append(self.q.get_nowait())
+        return b"".join(lines).decode(errors="replace")
 
-    @property
-    def timed_out(self):
-        return (time.time() - self.started) > self.timeout
+    def _timeout(self, limit=None):
+        """
+        Log and kill a process which has timed out, saving any output which hasn't
+        been read.
 
-    def wait(self, step=1.0):
+        Parameters
+        -----------
+        limit : :class:`str`
+            The limit which has been exceeded.
+        """
+        if not self._set_timed_out(limit):  # already handled
+            return
+        self.kill()
+        self.T.join(timeout=1.0)  # collect remaining output
+        self._save_output(self.read())
+        self.prompt.set()  # stop waiting for output
+
+    def _watch(self):
+        """
+        Watch the process, killing it where it exceeds its time limits.
+        """
+        while self.process.poll() is None and self.exit_reason is None:
+            time.sleep(self.watchdog_interval)
+            limit = self._exceeded() if self.supervise else None
+            if limit is not None:
+                self._timeout(limit)
+
+    def kill(self):
+        """
+        Kill the process, together with its process group and any other processes
+        it has started.
+        """
+        kill_process_group(self.process.pid)
+        try:
+            self.process.kill()  # e.g. where process groups aren't available
+        except ProcessLookupError:
+            pass
+        try:
+            self.process.wait(timeout=1.0)
+        except subprocess.TimeoutExpired:
+            logger.warning("Process {} could not be killed.".format(self.process.pid))
+
+    def wait(self, step=1.0, idle_timeout=None):
         """
-        Wait until addtions to process.stdout stop.
+        Wait until the process is ready for further input, or addtions to
+        process.stdout stop.
 
         Parameters
         -----------
         step : :class:`float`
-            Step in seconds at which to check the stdout queue.
-        """
-        while True:
-            size = self.q.qsize()
-            time.sleep(step)
-            if self.timed_out:
-                self.log(
-                    "Process timed out after {:2.1f} s".format(
-                        time.time() - self.started
-                    )
-                )
-                self.terminate()
-                break
-            elif size == self.q.qsize():
-                break
+            Step in seconds at which to check the stdout queue. For the
+            :code:`'prompt'` wait mode, this is the maximum interval between checks
+            for timeouts.
+        idle_timeout : :class:`float`
+            Duration (in seconds) without output after which to stop waiting for a
+            prompt. Defaults to the :code:`idle_timeout` of the process.
+        """
+        waiting = time.time()  # output before this doesn't count towards idling
+        if self.wait_mode == "prompt":
+            idle_timeout = idle_timeout or self.idle_timeout
+            while True:
+                idle = time.time() - max(self.last_output[0], waiting)
+                if self.prompt.wait(timeout=max(min(step, idle_timeout - idle), 0)):
+                    break
+                elif self._exceeded():
+                    self._timeout()
+                    break
+                elif (time.time() - max(self.last_output[0], waiting)) > idle_timeout:
+                    self._metrics["idle_time"] += idle_timeout
+                    break
+        else:
+            while True:
+                size = self.q.qsize()
+                time.sleep(step)
+                if self._exceeded():
+                    self._timeout()
+                    break
+                elif size == self.q.qsize():
+                    self._metrics["idle_time"] += step
+                    break
+        self._metrics["wait_time"] += time.time() - waiting
 
     def write(self, messages, wait=True, log=False):
         """
@@ -225,9 +563,17 @@ class MeltsProcess(object):
             Whether to log output to the logger.
         """
         for message in messages:
+            if self.exit_reason is not None:  # e.g. killed by the watchdog
+                break
             msg = (str(message).strip() + str(os.linesep)).encode("utf-8")
-            self.process.stdin.write(msg)
-            self.process.stdin.flush()
+            self.prompt.clear()  # wait for the response to this message
+            try:
+                self.process.stdin.write(msg)
+                self.process.stdin.flush()
+            except OSError:  # e.g. a broken pipe, where killed while writing
+                if self.exit_reason is not None:
+                    break
+                raise
             if wait:
                 self.wait()
             if log:
@@ -241,26 +587,36 @@ class MeltsProcess(object):
         Notes
         -------
             * Will likely terminate as expected using the command '0' to exit.
-            * Otherwise will attempt to cleanup the process.
+            * Otherwise (and in any case for remaining processes within its process
+              group) the process is killed.
         """
+        started = time.time()
+        self.supervise = False
+        if self.monitor is not None:
+            self.monitor.stop()  # take a final sample before the process exits
         self.alphamelts_ex = []
         try:
-            for p in get_process_tree(self.process.pid):
-                if "alpha" in p.name():
-                    self.alphamelts_ex.append(p)
-            self.write("0")
-            time.sleep(0.5)
-        except (ProcessLookupError, psutil.NoSuchProcess):
-            logger.warning("Process terminated unexpectedly.")
+            self.alphamelts_ex = psutil.Process(self.process.pid).children(
+                recursive=True
+            )
+        except psutil.Error:
+            pass
+        if self.process.poll() is None and self.exit_reason is None:
+            try:
+                self.write("0", wait=False)
+                self.process.wait(timeout=0.5)  # should exit promptly after '0'
+            except subprocess.TimeoutExpired:
+                pass
+            except (OSError, ValueError):  # e.g. a broken pipe
+                logger.warning("Process terminated unexpectedly.")
 
         try:
             self.process.stdin.close()
-            self.process.terminate()
-            self.process.wait(timeout=0.2)
-        except ProcessLookupError:
-            logger.debug("Process terminated successfully.")
-
+        except (OSError, ValueError):
+            pass
+        self.kill()
         self.cleanup()
+        self._metrics["terminate_time"] = time.time() - started
 
     def cleanup(self):
         for p in self.alphamelts_ex:  # kill the children executables
@@ -0,0 +1,305 @@
+"""
+Content-addressed stores of experiment results, which can be shared between batches
+such that experiments which have been run before (e.g. for another project) are
+linked or copied rather than run again.
+"""
+import os
+import json
+import shutil
+import hashlib
+import platform
+import tempfile
+from pathlib import Path
+from ..util.general import get_local_link
+from .org import commit_meltsfolder
+from ..util.log import Handle
+
+logger = Handle(__name__)
+
+
+def alphamelts_version(executable=None):
+    """
+    Identify an alphaMELTS install from the contents of its run script and
+    executable, such that results from different versions aren't mixed.
+
+    Parameters
+    -----------
+    executable : :class:`str` | :class:`pathlib.Path`
+        Path to the run script (e.g. :code:`run_alphamelts.command`), defaulting to
+        that of the local install.
+
+    Returns
+    --------
+    :class:`str`
+        Fingerprint for the install, or :code:`None` where it can't be found.
+    """
+    if executable is None:
+        if platform.system() == "Windows":
+            executable = get_local_link("run_alphamelts.bat")
+        else:
+            executable = get_local_link("run_alphamelts.command")
+    executable = Path(executable)
+    hsh = hashlib.sha1()
+    found = False
+    # the executable is linked alongside the run script as 'alphamelts'
+    for path in [executable, executable.parent / "alphamelts"]:
+        if path.exists() and path.is_file():
+            found = True
+            with open(str(path), "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    hsh.update(chunk)
+    if not found:
+        logger.debug("alphaMELTS install not found at {}.".format(executable))
+        return None
+    return hsh.hexdigest()[:10]
+
+
+def canonical_meltsfile(meltsfile):
+    """
+    Canonical form of a meltsfile for identifying experiments, excluding its title
+    and any blank lines or surrounding whitespace.
+
+    Parameters
+    -----------
+    meltsfile : :class:`str`
+        Multiline string representation of the meltsfile.
+
+    Returns
+    --------
+    :class:`str`
+    """
+    lines = [l.strip() for l in meltsfile.splitlines()]
+    return "\n".join(l for l in lines if l and not l.lower().startswith("title:"))
+
+
+def canonical_envfile(env):
+    """
+    Canonical form of an environment file for identifying experiments, including
+    only the variables which are set, in sorted order.
+
+    Parameters
+    -----------
+    env : :class:`str`
+        Multiline string representation of the environment file.
+
+    Returns
+    --------
+    :class:`str`
+    """
+    lines = [" ".join(l.split()) for l in env.splitlines()]
+    return "\n".join(sorted(l for l in lines if l and not l.startswith("!")))
+
+
+def result_key(meltsfile, env, version=None, **options):
+    """
+    Get the content-addressed key for the results of an experiment.
+
+    Parameters
+    -----------
+    meltsfile : :class:`str`
+        Multiline string representation of the meltsfile.
+    env : :class:`str`
+        Multiline string representation of the environment file.
+    version : :class:`str`
+        Version of alphaMELTS (see :func:`alphamelts_version`).
+    options
+        Other options which change the results (e.g. :code:`superliquidus_start`).
+
+    Returns
+    --------
+    :class:`str`
+        Hexadecimal key.
+    """
+    content = dict(
+        meltsfile=canonical_meltsfile(meltsfile),
+        env=canonical_envfile(env),
+        version=version,
+        options=options,
+    )
+    hsh = hashlib.sha1()
+    hsh.update(json.dumps(content, sort_keys=True, ensure_ascii=False).encode("utf8"))
+    return hsh.hexdigest()
+
+
+def _link(src, dst):
+    """
+    Hard link a file, copying it where it can't be linked (e.g. across
+    filesystems).
+    """
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return dst
+
+
+class ResultStore(object):
+    """
+    Content-addressed store of experiment results, indexed by a key derived from
+    the meltsfile, environment and alphaMELTS version of each experiment (see
+    :func:`result_key`). Results are stored as experiment folders under
+    :code:`<path>/<key[:2]>/<key>`, and can be shared between batches and projects.
+
+    Parameters
+    -----------
+    path : :class:`str` | :class:`pathlib.Path`
+        Directory for the store.
+    version : :class:`str`
+        Version of alphaMELTS used for experiments, defaulting to a fingerprint of
+        the local install (see :func:`alphamelts_version`).
+    link : :class:`bool`
+        Whether to hard link files between the store and experiment folders rather
+        than copying them. Files are copied where they can't be linked.
+
+    Attributes
+    -----------
+    hits : :class:`int`
+        Number of lookups for which results were found.
+    misses : :class:`int`
+        Number of lookups for which results weren't found.
+    added : :class:`int`
+        Number of experiments added to the store.
+
+    Notes
+    ------
+        * Linked files are shared between the store and experiment folders, and
+          hence shouldn't be modified in place.
+        * Meltsfiles are named after the experiment title, and aren't stored.
+    """
+
+    def __init__(self, path, version=None, link=True):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.version = version or alphamelts_version()
+        self.link = link
+        self.hits, self.misses, self.added = 0, 0, 0
+
+    def key(self, meltsfile, env, **options):
+        """
+        Get the key for an experiment (see :func:`result_key`).
+
+        Parameters
+        -----------
+        meltsfile : :class:`str`
+            Multiline string representation of the meltsfile.
+        env : :class:`str`
+            Multiline string representation of the environment file.
+        options
+            Other options which change the results.
+
+        Returns
+        --------
+        :class:`str`
+        """
+        return result_key(meltsfile, env, version=self.version, **options)
+
+    def folder(self, key):
+        """
+        Get the folder for the results of an experiment.
+
+        Parameters
+        -----------
+        key : :class:`str`
+            Experiment key.
+
+        Returns
+        --------
+        :class:`pathlib.Path`
+        """
+        return self.path / key[:2] / key
+
+    def __contains__(self, key):
+        return self.folder(key).is_dir()
+
+    def _copy(self, source, target, files={}):
+        """
+        Link or copy the files of a folder to a hidden directory alongside the
+        target and rename this into place.
+        """
+        target = Path(target)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        scratch = Path(tempfile.mkdtemp(prefix=".shared", dir=str(target.parent)))
+        try:
+            folder = scratch / "folder"
+            shutil.copytree(
+                str(source),
+                str(folder),
+                copy_function=[shutil.copy2, _link][self.link],
+                ignore=shutil.ignore_patterns("*.melts"),
+            )
+            for name, content in files.items():
+                if (folder / name).exists():  # rather than writing to a linked file
+                    (folder / name).unlink()
+                with open(str(folder / name), "w") as f:
+                    f.write(content)
+            commit_meltsfolder(folder, target)
+        finally:
+            shutil.rmtree(str(scratch), ignore_errors=True)
+        return target
+
+    def add(self, key, folder):
+        """
+        Add the results of a completed experiment to the store. Where results
+        already exist for the key, these are kept.
+
+        Parameters
+        -----------
+        key : :class:`str`
+            Experiment key.
+        folder : :class:`str` | :class:`pathlib.Path`
+            Experiment folder.
+
+        Returns
+        --------
+        :class:`bool`
+            Whether the results were added.
+        """
+        if key in self:
+            return False
+        self._copy(folder, self.folder(key))
+        self.added += 1
+        return True
+
+    def checkout(self, key, target, files={}):
+        """
+        Link or copy the results for an experiment into an experiment folder,
+        replacing any existing folder.
+
+        Parameters
+        -----------
+        key : :class:`str`
+            Experiment key.
+        target : :class:`str` | :class:`pathlib.Path`
+            Experiment folder to create.
+        files : :class:`dict`
+            Contents of files to write to the folder, indexed by filename (e.g. the
+            meltsfile for the experiment).
+
+        Returns
+        --------
+        :class:`bool`
+            Whether results were found for the experiment.
+        """
+        if key not in self:
+            self.misses += 1
+            return False
+        self._copy(self.folder(key), target, files=files)
+        self.hits += 1
+        return True
+
+    def report(self):
+        """
+        Summarise the lookups and additions to the store.
+
+        Returns
+        --------
+        :class:`dict`
+            Numbers of hits, misses and experiments added, and the hit rate.
+        """
+        lookups = self.hits + self.misses
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            added=self.added,
+            hit_rate=self.hits / lookups if lookups else None,
+        )
@@ -0,0 +1,188 @@
+"""
+Scheduling of experiments within a batch, based on their estimated duration.
+"""
+import heapq
+import itertools
+from pyrolite.geochem.ind import common_elements, common_oxides
+from .naming import exp_hash
+from .timing import DurationEstimator
+from ..util.log import Handle
+
+logger = Handle(__name__)
+
+STRATEGIES = ["longest", "shortest", "interleave"]
+SCHEDULE_WINDOW = 10000  # number of experiments scheduled at once for lazy batches
+
+_chem = common_elements(as_set=True) | common_oxides(as_set=True)
+
+
+def composition_key(experiment):
+    """
+    Get a key identifying the composition of an experiment, based on the
+    abundances of the components in its configuration.
+
+    Parameters
+    -----------
+    experiment : :class:`tuple`
+        Experiment title, configuration and environment.
+
+    Returns
+    --------
+    :class:`str`
+    """
+    title, exp, env = experiment
+    return exp_hash({k: exp[k] for k in exp if k in _chem})
+
+
+def _priority_class(priority, hsh, experiment):
+    """
+    Get the priority class for an experiment, where priorities are given as either
+    a function or a dictionary indexed by experiment hash.
+    """
+    if priority is None:
+        return 0
+    elif callable(priority):
+        return priority(hsh, experiment)
+    return priority.get(hsh, 0)
+
+
+def _interleave(items, costs, group=composition_key):
+    """
+    Interleave experiments across groups (e.g. compositions), with the experiments
+    in each group ordered longest-first and the groups with the greatest total cost
+    first.
+    """
+    groups = {}
+    for item in items:
+        groups.setdefault(group(item[1]), []).append(item)
+    groups = sorted(
+        groups.values(), key=lambda g: -sum(costs[hsh] for hsh, _ in g)
+    )  # stable, such that ties retain their order
+    groups = [sorted(g, key=lambda i: -costs[i[0]]) for g in groups]
+    for tier in itertools.zip_longest(*groups):
+        yield from [i for i in tier if i is not None]
+
+
+def _schedule(items, estimator, strategy="longest", priority=None, group=None):
+    """
+    Order a list of experiments within priority classes.
+    """
+    costs = {hsh: estimator.predict(experiment) for hsh, experiment in items}
+    classes = {}
+    for item in items:
+        classes.setdefault(_priority_class(priority, *item), []).append(item)
+    for cls in sorted(classes):
+        members = classes[cls]
+        if strategy == "longest":
+            yield from sorted(members, key=lambda i: -costs[i[0]])
+        elif strategy == "shortest":
+            yield from sorted(members, key=lambda i: costs[i[0]])
+        elif strategy == "interleave":
+            yield from _interleave(members, costs, group=group or composition_key)
+        else:  # retain the existing order
+            yield from members
+
+
+def schedule_experiments(
+    experiments,
+    estimator=None,
+    strategy="longest",
+    priority=None,
+    group=None,
+    window=None,
+):
+    """
+    Order experiments by their estimated duration, such that workers are evenly
+    loaded when experiments are run concurrently.
+
+    Parameters
+    -----------
+    experiments : :class:`list` | :class:`~collections.abc.Iterator`
+        Experiment hashes and tuples of the experiment title, configuration and
+        environment.
+    estimator : :class:`~pyrolite_meltsutil.automation.timing.DurationEstimator`
+        Estimator for the duration of experiments.
+    strategy : :class:`str`
+        Order for experiments within each priority class; one of
+        :code:`'longest'` (longest first), :code:`'shortest'` (shortest first) or
+        :code:`'interleave'` (alternating between compositions, each longest-first).
+        Where this is :code:`None`, experiments retain their order.
+    priority : :class:`callable` | :class:`dict`
+        Priority classes for experiments, either as a function accepting an
+        experiment hash and experiment or a dictionary indexed by experiment hash.
+        Classes are run in ascending order, and experiments have class :code:`0`
+        by default.
+    group : :class:`callable`
+        Function to get the group of an experiment for interleaving. Defaults to
+        :func:`composition_key`.
+    window : :class:`int`
+        Number of experiments to schedule at once, such that iterators of
+        experiments needn't be materialised. By default all experiments are
+        scheduled together.
+
+    Returns
+    --------
+    :class:`~collections.abc.Iterator`
+        Experiment hashes and tuples of the experiment title, configuration and
+        environment, in the order in which they're to be run.
+    """
+    if strategy is not None and strategy not in STRATEGIES:
+        raise ValueError("Unknown scheduling strategy: {}".format(strategy))
+    estimator = estimator or DurationEstimator()
+    return _iter_windows(
+        iter(experiments),
+        estimator,
+        strategy=strategy,
+        priority=priority,
+        group=group,
+        window=window,
+    )
+
+
+def _iter_windows(experiments, estimator, window=None, **kwargs):
+    """
+    Schedule experiments from an iterator in successive windows.
+    """
+    while True:
+        items = list(itertools.islice(experiments, window))
+        if not items:
+            break
+        yield from _schedule(items, estimator, **kwargs)
+        if window is None:
+            break
+
+
+def partition_experiments(experiments, n, estimator=None):
+    """
+    Partition experiments into a number of groups with similar total estimated
+    durations (e.g. for separate jobs on a cluster), assigning experiments
+    longest-first to the least-loaded group.
+
+    Parameters
+    -----------
+    experiments : :class:`list` | :class:`dict`
+        Experiment hashes and tuples of the experiment title, configuration and
+        environment, or a dictionary of experiments indexed by hash.
+    n : :class:`int`
+        Number of groups.
+    estimator : :class:`~pyrolite_meltsutil.automation.timing.DurationEstimator`
+        Estimator for the duration of experiments.
+
+    Returns
+    --------
+    groups : :class:`list` of :class:`dict`
+        Experiments for each group, indexed by hash.
+    loads : :class:`list` of :class:`float`
+        Estimated total duration of each group, in seconds.
+    """
+    if isinstance(experiments, dict):
+        experiments = experiments.items()
+    estimator = estimator or DurationEstimator()
+    groups, loads = [{} for _ in range(n)], [0.0] * n
+    heap = [(0.0, ix) for ix in range(n)]
+    for hsh, experiment in schedule_experiments(experiments, estimator=estimator):
+        load, ix = heapq.heappop(heap)
+        groups[ix][hsh] = experiment
+        loads[ix] = load + estimator.predict(experiment)
+        heapq.heappush(heap, (loads[ix], ix))
+    return groups, loads
@@ -0,0 +1,367 @@
+"""
+Persistent alphaMELTS sessions, which keep a single alphaMELTS process alive to run
+a sequence of meltsfiles, avoiding the cost of starting alphaMELTS for each
+experiment.
+"""
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+import multiprocessing.util
+from pathlib import Path
+from ..parse import read_envfile
+from ..env import MELTS_Env
+from .org import make_meltsfolder, commit_meltsfolder, build_table_cache
+from .process import MeltsProcess
+from ..util.log import Handle
+
+logger = Handle(__name__)
+
+
+class MeltsSession(object):
+    """
+    A long-lived alphaMELTS process which is driven through its menu to run a
+    number of meltsfiles in turn. Each run reads a new meltsfile (option 1), executes
+    the calculation and moves the output tables into the experiment folder.
+
+    Parameters
+    ----------
+    env : :class:`~pyrolite_meltsutil.env.MELTS_Env` | :class:`str` | :class:`pathlib.Path`
+        Environment for the session. As alphaMELTS reads its environment on startup,
+        this is shared by all experiments run within the session.
+    executable : :class:`str` | :class:`pathlib.Path`
+        Executable to run, passed to
+        :class:`~pyrolite_meltsutil.automation.process.MeltsProcess`.
+    max_runs : :class:`int`
+        Number of runs after which to restart the alphaMELTS process. Where this is
+        :code:`None`, the process is only restarted after an error.
+    timeout : :class:`float`
+        Timeout for individual runs, in seconds.
+    cpu_timeout : :class:`float`
+        Maximum CPU time for individual runs, in seconds.
+    workdir : :class:`str` | :class:`pathlib.Path`
+        Working directory for the alphaMELTS process. Defaults to a new temporary
+        directory.
+    log : :class:`callable`
+        Function for logging output.
+
+    Notes
+    ------
+        * The session can be used as a context manager, which will terminate the
+          alphaMELTS process on exit.
+    """
+
+    def __init__(
+        self,
+        env=None,
+        executable=None,
+        max_runs=None,
+        timeout=None,
+        cpu_timeout=None,
+        workdir=None,
+        log=logger.debug,
+        **kwargs
+    ):
+        self.envfile, _ = read_envfile(
+            env if env is not None else MELTS_Env(), unset_variables=False
+        )
+        self.executable = executable
+        self.max_runs = max_runs
+        self.timeout = timeout
+        self.cpu_timeout = cpu_timeout
+        self.log = log
+        self.process_kwargs = kwargs
+        self.workdir = Path(workdir or tempfile.mkdtemp(prefix="meltssession"))
+        self.workdir.mkdir(parents=True, exist_ok=True)
+        with open(str(self.workdir / "environment.txt"), "w") as f:
+            f.write(self.envfile)
+        self.mp = None
+        self.runs = 0  # runs since the process was (re)started
+        self.errors = 0
+        self.exit_reason = None  # reason the most recent run ended early
+        self.metrics = {}  # metrics for the most recent run
+        self.timeout_limit = None  # the limit exceeded by the most recent run
+
+    @property
+    def active(self):
+        """Whether the alphaMELTS process is currently running."""
+        return (self.mp is not None) and (self.mp.process.poll() is None)
+
+    def configure(self, **kwargs):
+        """
+        Update the settings of the session (e.g. :code:`max_runs` or
+        :code:`timeout`). Where settings for the alphaMELTS process change, it is
+        restarted for the next run.
+        """
+        restart = False
+        for k, v in kwargs.items():
+            if k == "max_runs":
+                self.max_runs = v
+            elif k in ["executable", "timeout", "cpu_timeout", "log"]:
+                restart = restart or (getattr(self, k) != v)
+                setattr(self, k, v)
+            else:
+                restart = restart or (self.process_kwargs.get(k) != v)
+                self.process_kwargs[k] = v
+        if restart:
+            self.recycle()
+
+    def start(self):
+        """
+        Start the alphaMELTS process.
+        """
+        self.mp = MeltsProcess(
+            executable=self.executable,
+            env="environment.txt",
+            fromdir=str(self.workdir),
+            timeout=self.timeout,
+            cpu_timeout=self.cpu_timeout,
+            log=self.log,
+            **self.process_kwargs
+        )
+        self.runs = 0
+
+    def run(self, folder, title, superliquidus_start=True):
+        """
+        Run the meltsfile within an experiment folder (e.g. as created by
+        :func:`~pyrolite_meltsutil.automation.org.make_meltsfolder`).
+
+        Parameters
+        -----------
+        folder : :class:`str` | :class:`pathlib.Path`
+            Experiment folder containing the meltsfile, to which outputs are moved.
+        title : :class:`str`
+            Title of the experiment (i.e. the name of the meltsfile, without its
+            suffix).
+        superliquidus_start : :class:`bool`
+            Whether to start the calculation from the liquidus.
+
+        Returns
+        --------
+        :class:`bool`
+            Whether the run completed successfully.
+        """
+        folder = Path(folder)
+        meltsfile = "{}.melts".format(title)
+        self.metrics = {}
+        if not self.active:
+            self.start()
+        else:  # timeouts and metrics apply to individual runs
+            self.mp.reset_metrics()
+        shutil.copy(str(folder / meltsfile), str(self.workdir / meltsfile))
+        self.exit_reason = None
+        try:
+            self.mp.write(["1", meltsfile], wait=True)
+            self.mp.write([3, [0, 1][superliquidus_start], 4], wait=True)
+            self.exit_reason = self.mp.exit_reason
+        except (OSError, ValueError):  # the process has closed
+            self.exit_reason = self.mp.exit_reason or "errored"
+        if self.exit_reason is None and not (
+            self.active and (self.workdir / "System_main_tbl.txt").exists()
+        ):
+            self.exit_reason = "errored"
+        success = self.exit_reason is None
+        self.timeout_limit = self.mp.timeout_limit
+        self.mp.supervise = False  # the process is idle until the next run
+        self._collect(folder, exclude=["environment.txt", meltsfile])
+        self.runs += 1
+        mp = self.mp
+        if not success:
+            self.errors += 1
+            self.log("Session run errored for {}, restarting.".format(title))
+            self.recycle()
+        elif self.max_runs is not None and self.runs >= self.max_runs:
+            self.recycle()
+        self.metrics = mp.metrics
+        if self.exit_reason is not None:
+            self.metrics["exit_reason"] = self.exit_reason
+        return success
+
+    def _collect(self, folder, exclude=[]):
+        """
+        Move outputs from the session working directory to an experiment folder.
+
+        Parameters
+        -----------
+        folder : :class:`pathlib.Path`
+            Folder to move outputs into.
+        exclude : :class:`list`
+            Names of files which are part of the session rather than its outputs,
+            and are not moved.
+        """
+        for f in self.workdir.iterdir():
+            if f.is_file() and f.name not in exclude:
+                shutil.move(str(f), str(folder / f.name))
+        for name in exclude:  # remove the copied meltsfile
+            if name != "environment.txt" and (self.workdir / name).exists():
+                (self.workdir / name).unlink()
+
+    def recycle(self):
+        """
+        Terminate the alphaMELTS process, such that it is restarted for the next run.
+        """
+        if self.mp is not None:
+            self.mp.terminate()
+        self.mp = None
+
+    def terminate(self, cleanup=True):
+        """
+        Terminate the session.
+
+        Parameters
+        -----------
+        cleanup : :class:`bool`
+            Whether to remove the session working directory.
+        """
+        self.recycle()
+        if cleanup and self.workdir.exists():
+            shutil.rmtree(str(self.workdir), ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.terminate()
+
+
+_sessions = {}  # sessions for this process, indexed by thread and environment
+_sessions_lock = threading.Lock()
+_finalized = set()  # IDs of processes for which sessions are terminated on exit
+
+
+def get_session(env, **kwargs):
+    """
+    Get a :class:`MeltsSession` for a given environment, creating one if no session
+    is active for this environment within the current thread. Where a session
+    exists, it is updated with the settings given (see
+    :meth:`MeltsSession.configure`).
+
+    Parameters
+    -----------
+    env : :class:`str`
+        Multiline string representation of the environment file.
+
+    Returns
+    --------
+    :class:`MeltsSession`
+
+    Notes
+    ------
+        * Sessions aren't shared between threads, such that experiments run by a
+          thread pool don't interleave their input to a single alphaMELTS process.
+    """
+    key = (threading.get_ident(), hashlib.sha1(env.encode("utf8")).hexdigest())
+    with _sessions_lock:
+        if os.getpid() not in _finalized:
+            # terminate sessions on exit, including within worker processes
+            multiprocessing.util.Finalize(None, close_sessions, exitpriority=10)
+            _finalized.add(os.getpid())
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = MeltsSession(env=env, **kwargs)
+            return session
+    session.configure(**kwargs)
+    return session
+
+
+def close_sessions():
+    """
+    Terminate all sessions active within the current process, including those of
+    other threads.
+    """
+    while True:
+        with _sessions_lock:
+            if not _sessions:
+                break
+            _, session = _sessions.popitem()
+        session.terminate()
+
+
+def run_in_session(
+    name,
+    title,
+    meltsfile,
+    env,
+    fromdir,
+    timeout=None,
+    superliquidus_start=True,
+    max_runs=None,
+    cache_tables=False,
+    cpu_timeout=None,
+    staging=None,
+):
+    """
+    Run a single experiment using a persistent :class:`MeltsSession` for the
+    current process. This is the session-based equivalent of
+    :func:`~pyrolite_meltsutil.automation.run_experiment`, with the same arguments
+    and outputs.
+
+    Parameters
+    -----------
+    name : :class:`str`
+        Name of the experiment folder (typically the experiment hash).
+    title : :class:`str`
+        Title of the experiment.
+    meltsfile : :class:`str`
+        Multiline string representation of the meltsfile.
+    env : :class:`str`
+        Multiline string representation of the environment file.
+    fromdir : :class:`str` | :class:`pathlib.Path`
+        Directory in which to create the experiment folder.
+    timeout : :class:`float`
+        Timeout for the experiment, in seconds.
+    superliquidus_start : :class:`bool`
+        Whether to start the calculation from the liquidus.
+    max_runs : :class:`int`
+        Number of runs after which to restart the session.
+    cache_tables : :class:`bool`
+        Whether to build the table cache for the experiment once it's complete.
+    cpu_timeout : :class:`float`
+        Maximum CPU time for the experiment, in seconds.
+    staging : :class:`bool` | :class:`str` | :class:`pathlib.Path`
+        Scratch directory in which to run the experiment before its folder is moved
+        into :code:`fromdir` (see
+        :func:`~pyrolite_meltsutil.automation.org.get_staging_dir`).
+
+    Returns
+    --------
+    :class:`dict`
+        Summary of the run.
+    """
+    started = time.time()
+    result = dict(name=name, title=title, status="done", message=None)
+    folder = make_meltsfolder(
+        name=name,
+        title=title,
+        meltsfile=meltsfile,
+        indir=fromdir,
+        env=env,
+        staging=staging,
+    )
+    session = get_session(
+        env, timeout=timeout, cpu_timeout=cpu_timeout, max_runs=max_runs
+    )
+    try:
+        if not session.run(folder, title, superliquidus_start=superliquidus_start):
+            if session.exit_reason == "timed-out":
+                result["status"] = "timed-out"
+                result["message"] = "Timed out after {:.1f} s ({} limit)".format(
+                    time.time() - started, session.timeout_limit
+                )
+            else:
+                result["status"] = "failed"
+                result["message"] = "Session run errored in {}".format(session.workdir)
+        elif cache_tables:
+            build_table_cache(folder)
+    except OSError as e:
+        result["status"] = "failed"
+        result["message"] = str(e)
+        session.recycle()
+    finally:
+        if staging:
+            commit_meltsfolder(folder, Path(fromdir) / name)
+    result["duration"] = time.time() - started
+    result["metrics"] = session.metrics
+    return result
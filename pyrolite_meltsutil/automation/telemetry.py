@@ -0,0 +1,195 @@
+"""
+Resource monitoring and metrics for alphaMELTS processes, such that the time and
+resources used by experiments within a batch can be examined.
+"""
+import json
+import datetime
+import threading
+import psutil
+import pandas as pd
+from pathlib import Path
+from ..util.log import Handle
+
+logger = Handle(__name__)
+
+METRICS = [
+    "spawn_time",  # seconds to start the process
+    "first_output_time",  # seconds from starting the process to its first output
+    "compute_time",  # seconds waiting for output, excluding idle time
+    "idle_time",  # seconds waiting without output before continuing
+    "terminate_time",  # seconds to terminate and clean up the process
+    "peak_rss",  # peak resident memory of the process tree, in bytes
+    "cpu_time",  # user and system CPU time of the process tree, in seconds
+    "stdout_bytes",  # volume of output from the process
+    "exit_reason",
+]
+
+
+class ProcessMonitor(object):
+    """
+    Monitor for the memory and CPU usage of a process and its children, which are
+    sampled at regular intervals from a background thread.
+
+    Parameters
+    -----------
+    pid : :class:`int`
+        ID of the process to monitor.
+    interval : :class:`float`
+        Interval between samples, in seconds.
+
+    Notes
+    ------
+        * CPU time for processes which exit between samples is counted up to their
+          most recent sample.
+    """
+
+    def __init__(self, pid, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self.peak_rss = 0
+        self._cpu = {}  # cumulative CPU time for each process, indexed by ID
+        self._baseline = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+
+    @property
+    def cpu_time(self):
+        """CPU time of the process tree since the monitor was started or reset."""
+        with self._lock:
+            return sum(self._cpu.values()) - self._baseline
+
+    def start(self):
+        """
+        Start monitoring the process.
+
+        Returns
+        --------
+        :class:`ProcessMonitor`
+        """
+        self.sample()
+        self.thread.start()
+        return self
+
+    def sample(self):
+        """
+        Sample the memory and CPU usage of the process tree.
+        """
+        try:
+            root = psutil.Process(self.pid)
+            processes = [root, *root.children(recursive=True)]
+        except psutil.Error:  # the process has exited
+            return
+        rss, cpu = 0, {}
+        for p in processes:
+            try:
+                with p.oneshot():
+                    rss += p.memory_info().rss
+                    times = p.cpu_times()
+                    cpu[p.pid] = times.user + times.system
+            except psutil.Error:
+                continue
+        with self._lock:
+            self.peak_rss = max(self.peak_rss, rss)
+            self._cpu.update(cpu)
+
+    def reset(self):
+        """
+        Reset the peak memory usage and CPU time, e.g. between runs within a
+        persistent process.
+        """
+        self.sample()
+        with self._lock:
+            self.peak_rss = 0
+            self._baseline = sum(self._cpu.values())
+
+    def stop(self):
+        """
+        Take a final sample and stop monitoring the process.
+        """
+        self.sample()
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+
+class MetricsLog(object):
+    """
+    Append-only log of metrics for experiments within a batch, stored as JSON
+    lines. Each record includes the experiment hash, title, status and duration,
+    together with the metrics listed in :data:`METRICS`.
+
+    Parameters
+    -----------
+    path : :class:`str` | :class:`pathlib.Path`
+        Path to the log file. If this is a directory, the log will be
+        :code:`meltsBatchMetrics.jsonl` within it.
+    """
+
+    def __init__(self, path):
+        path = Path(path)
+        if path.is_dir():
+            path = path / "meltsBatchMetrics.jsonl"
+        self.path = path
+
+    def append(self, hsh, title=None, status=None, duration=None, metrics={}):
+        """
+        Record the metrics for an attempt at an experiment.
+
+        Parameters
+        -----------
+        hsh : :class:`str`
+            Experiment hash.
+        title : :class:`str`
+            Experiment title.
+        status : :class:`str`
+            Status of the attempt.
+        duration : :class:`float`
+            Duration of the attempt, in seconds.
+        metrics : :class:`dict`
+            Metrics for the attempt.
+        """
+        record = dict(
+            hash=hsh,
+            title=title,
+            status=status,
+            duration=duration,
+            **{k: metrics.get(k, None) for k in METRICS},
+            time=datetime.datetime.now().isoformat(),
+        )
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(str(self.path), "a") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def load(self):
+        """
+        Load records from the log file, if it exists.
+
+        Returns
+        --------
+        :class:`list` of :class:`dict`
+        """
+        records = []
+        if self.path.exists():
+            with open(str(self.path), "r") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:  # e.g. a partially written line
+                        logger.debug("Skipping malformed metrics record.")
+        return records
+
+    def to_frame(self):
+        """
+        Get a table of the recorded metrics, with one row for each attempt.
+
+        Returns
+        --------
+        :class:`pandas.DataFrame`
+            Table of metrics, indexed by experiment hash.
+        """
+        columns = ["hash", "title", "status", "duration"] + METRICS + ["time"]
+        return pd.DataFrame(self.load(), columns=columns).set_index("hash")
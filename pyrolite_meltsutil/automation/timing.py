@@ -1,26 +1,328 @@
+"""
+Estimation of the duration of alphaMELTS experiments, based on the number of
+temperature and pressure steps they include.
+"""
+import numpy as np
+from pathlib import Path
+from .ledger import RunLedger
+from ..tables.load import import_batch_config
 from ..util.log import Handle
 
 logger = Handle(__name__)
 
 TIME_PER_STEP = 0.05  # seconds per iteration, varies
+STARTUP_TIME = 1.0  # seconds per experiment, for starting alphaMELTS and output
+MIN_RECORDS = 3  # minimum number of recorded durations for calibration
 
+# modes which step in temperature and pressure respectively
+T_MODES = ["isobaric", "isochoric"]
+P_MODES = ["isothermal", "isentropic", "isenthalpic"]
+GRID_MODES = ["ptgrid", "tpgrid"]
 
-def get_P_steps(exp):
+
+def _env_values(env=None):
+    """
+    Get a dictionary of environment variable values from an environment, which may
+    be a :class:`~pyrolite_meltsutil.env.MELTS_Env` or a dictionary (e.g. from a
+    batch configuration file).
     """
+    if env is None:
+        return {}
+    elif hasattr(env, "dump"):
+        return env.dump(unset_variables=False)
+    return dict(env)
+
+
+def get_mode(exp, env=None):
+    """
+    Get the calculation mode for an experiment, as specified in the experiment
+    configuration or otherwise the environment.
+
+    Parameters
+    -----------
+    exp : :class:`dict`
+        Experiment configuration.
+    env : :class:`~pyrolite_meltsutil.env.MELTS_Env` | :class:`dict`
+        Experiment environment.
+
+    Returns
+    --------
+    :class:`str`
     """
+    for mode in exp.get("modes", []):
+        if mode.lower() in T_MODES + P_MODES + GRID_MODES + ["geothermal"]:
+            return mode.lower()
+    return str(_env_values(env).get("MODE", None) or "isentropic").lower()
+
+
+def _count_steps(start, final=None, increment=None, lower=None, upper=None):
+    """
+    Count the number of steps from a starting value towards a final value or the
+    relevant bound, in the direction of a signed increment.
+    """
+    if start is None or not increment:
+        return 0
+    bounds = [final, [upper, lower][increment < 0]]
+    bounds = [b for b in bounds if b is not None and (b - start) * increment >= 0]
+    if not bounds:
+        return 0
+    stop = min(bounds, key=lambda b: abs(b - start))
+    return int(np.floor(abs(stop - start) / abs(increment) + 1e-9))
+
+
+def get_T_steps(exp, env=None):
+    """
+    Get the number of temperature steps for an experiment. The temperature
+    increment is taken from the environment (:code:`DELTAT`) or otherwise the
+    experiment configuration, and steps are bounded by the final temperature and
+    the temperature limits of the environment.
+
+    Parameters
+    -----------
+    exp : :class:`dict`
+        Experiment configuration.
+    env : :class:`~pyrolite_meltsutil.env.MELTS_Env` | :class:`dict`
+        Experiment environment.
+
+    Returns
+    --------
+    :class:`int`
+    """
+    env = _env_values(env)
+    return _count_steps(
+        exp.get("Initial Temperature", None),
+        final=exp.get("Final Temperature", None),
+        increment=env.get("DELTAT", None) or exp.get("Increment Temperature", None),
+        lower=env.get("MINT", None),
+        upper=env.get("MAXT", None),
+    )
+
+
+def get_P_steps(exp, env=None):
+    """
+    Get the number of pressure steps for an experiment. The pressure increment is
+    taken from the environment (:code:`DELTAP`) or otherwise the experiment
+    configuration, and steps are bounded by the final pressure and the pressure
+    limits of the environment.
+
+    Parameters
+    -----------
+    exp : :class:`dict`
+        Experiment configuration.
+    env : :class:`~pyrolite_meltsutil.env.MELTS_Env` | :class:`dict`
+        Experiment environment.
+
+    Returns
+    --------
+    :class:`int`
+    """
+    env = _env_values(env)
+    return _count_steps(
+        exp.get("Initial Pressure", None),
+        final=exp.get("Final Pressure", None),
+        increment=env.get("DELTAP", None) or exp.get("Increment Pressure", None),
+        lower=env.get("MINP", None),
+        upper=env.get("MAXP", None),
+    )
+
+
+def count_steps(exp, env=None):
+    """
+    Count the number of calculation steps for an experiment, given its mode.
+
+    Parameters
+    -----------
+    exp : :class:`dict`
+        Experiment configuration.
+    env : :class:`~pyrolite_meltsutil.env.MELTS_Env` | :class:`dict`
+        Experiment environment.
+
+    Returns
+    --------
+    :class:`int`
+
+    Notes
+    ------
+        * Isobaric and isochoric experiments step in temperature, and isothermal,
+          isentropic and isenthalpic experiments step in pressure. Geothermal
+          experiments step in both, and grid modes cover each combination of
+          temperature and pressure.
+        * The starting point counts as a step, such that each experiment has at
+          least one step.
+    """
+    env = _env_values(env)  # such that the environment is only dumped once
+    mode = get_mode(exp, env=env)
+    if mode in T_MODES:
+        return get_T_steps(exp, env=env) + 1
+    elif mode in P_MODES:
+        return get_P_steps(exp, env=env) + 1
+    elif mode in GRID_MODES:
+        return (get_T_steps(exp, env=env) + 1) * (get_P_steps(exp, env=env) + 1)
+    return max(get_T_steps(exp, env=env), get_P_steps(exp, env=env)) + 1
+
+
+def estimate_experiment_duration(
+    experiment, time_per_step=TIME_PER_STEP, startup_time=STARTUP_TIME
+):
+    """
+    Estimate the duration of an experiment from the number of steps it includes.
+
+    Parameters
+    -----------
+    experiment : :class:`tuple`
+        Experiment title, configuration and environment.
+    time_per_step : :class:`float`
+        Time for each calculation step, in seconds.
+    startup_time : :class:`float`
+        Time for each experiment independent of the number of steps, in seconds.
+
+    Returns
+    --------
+    :class:`float`
+        Estimated duration in seconds.
+    """
+    title, exp, env = experiment
+    return startup_time + time_per_step * count_steps(exp, env=env)
+
+
+class DurationEstimator(object):
+    """
+    Estimator for the duration of experiments, which are modelled as a startup time
+    and a time per calculation step. These parameters can be calibrated from the
+    recorded durations of previous experiments.
+
+    Parameters
+    -----------
+    time_per_step : :class:`float`
+        Time for each calculation step, in seconds.
+    startup_time : :class:`float`
+        Time for each experiment independent of the number of steps, in seconds.
+    """
+
+    def __init__(self, time_per_step=TIME_PER_STEP, startup_time=STARTUP_TIME):
+        self.time_per_step = time_per_step
+        self.startup_time = startup_time
+        self.n_records = 0
+
+    def __repr__(self):
+        return "{}(time_per_step={:.3g}, startup_time={:.3g})".format(
+            self.__class__.__name__, self.time_per_step, self.startup_time
+        )
+
+    def predict(self, experiment):
+        """
+        Estimate the duration of an experiment.
+
+        Parameters
+        -----------
+        experiment : :class:`tuple`
+            Experiment title, configuration and environment.
+
+        Returns
+        --------
+        :class:`float`
+            Estimated duration in seconds.
+        """
+        return estimate_experiment_duration(
+            experiment,
+            time_per_step=self.time_per_step,
+            startup_time=self.startup_time,
+        )
+
+    def total(self, experiments, workers=1):
+        """
+        Estimate the total duration of a number of experiments run across a number
+        of workers.
+
+        Parameters
+        -----------
+        experiments : :class:`list`
+            Experiments, each a tuple of title, configuration and environment.
+        workers : :class:`int`
+            Number of experiments run concurrently.
+
+        Returns
+        --------
+        :class:`float`
+            Estimated duration in seconds. This is a lower bound where workers
+            can't be evenly loaded, and is no less than the longest experiment.
+        """
+        durations = [self.predict(e) for e in experiments]
+        if not durations:
+            return 0.0
+        return max(sum(durations) / max(workers or 1, 1), max(durations))
 
-    if "isobaric" in exp.get("modes", []):
-        steps = 0
-    else:
-        steps = 1
+    def fit(self, experiments, durations):
+        """
+        Calibrate the estimator from the durations of a number of experiments.
 
+        Parameters
+        -----------
+        experiments : :class:`list`
+            Experiments, each a tuple of title, configuration and environment.
+        durations : :class:`list`
+            Durations of the experiments, in seconds.
 
-def estimate_experiment_duration(experiment):
-    n, exp, env = experiment
-    # get pressure steps
+        Returns
+        --------
+        :class:`DurationEstimator`
+            The calibrated estimator. Where there are fewer than
+            :data:`MIN_RECORDS` durations, the estimator is not modified.
+        """
+        steps = np.array([count_steps(exp, env=env) for _, exp, env in experiments])
+        durations = np.array(durations, dtype=float)
+        valid = np.isfinite(durations) & (durations > 0)
+        steps, durations = steps[valid], durations[valid]
+        if steps.size < MIN_RECORDS:
+            logger.debug("Too few durations to calibrate estimator.")
+            return self
+        if np.unique(steps).size > 1:
+            slope, intercept = np.polyfit(steps, durations, 1)
+            if slope > 0 and intercept >= 0:
+                self.time_per_step, self.startup_time = slope, intercept
+                self.n_records = steps.size
+                return self
+        # a single step count or a non-physical fit; keep the startup time
+        self.time_per_step = max(
+            np.median((durations - self.startup_time) / steps), 0.0
+        )
+        self.n_records = steps.size
+        return self
 
-    # get temperature steps
+    def fit_batch(self, fromdir):
+        """
+        Calibrate the estimator from the recorded durations of completed experiments
+        within a batch directory, as recorded in the batch ledger (see
+        :class:`~pyrolite_meltsutil.automation.ledger.RunLedger`) and configuration
+        file.
 
-    # check if isobaric or isothermal
+        Parameters
+        -----------
+        fromdir : :class:`str` | :class:`pathlib.Path`
+            Batch directory.
 
-    #
+        Returns
+        --------
+        :class:`DurationEstimator`
+            The calibrated estimator.
+        """
+        fromdir = Path(fromdir)
+        ledger = RunLedger(fromdir)
+        if not (len(ledger) and (fromdir / "meltsBatchConfig.json").exists()):
+            return self
+        try:
+            config = import_batch_config(fromdir)
+        except ValueError:  # e.g. a partially written configuration
+            logger.debug("Unreadable batch configuration at {}.".format(fromdir))
+            return self
+        records = [
+            (config[hsh], record["duration"])
+            for hsh, record in ledger.records.items()
+            if record["state"] == "done"
+            and record.get("duration", None) is not None
+            and hsh in config
+        ]
+        if records:
+            experiments, durations = zip(*records)
+            self.fit(experiments, durations)
+        return self
@@ -3,7 +3,7 @@ alphaMELTS environment managment.
 """
 import os
 import logging
-from pyrolite.util.env import validate_update_envvar
+from pyrolite.util.env import validate_value
 from pyrolite.util.text import remove_prefix
 from textwrap import dedent
 from .data.environment import MELTS_environment_variables
@@ -11,6 +11,9 @@ from .data.environment import MELTS_environment_variables
 logging.getLogger(__name__).addHandler(logging.NullHandler())
 logger = logging.getLogger(__name__)
 
+# default variables for each variable model, keyed by id (with the model itself)
+_DEFAULT_VARIABLES = {}
+
 
 def output_formatter(value):
     """
@@ -32,10 +35,46 @@ def output_formatter(value):
         return ""
 
 
+def process_environ(env=None, prefix="ALPHAMELTS_", base=None):
+    """
+    Get environment variables for a child process, excluding any alphaMELTS
+    environment variables inherited from this process such that the environment is
+    given only by an environment file or :class:`MELTS_Env`.
+
+    Parameters
+    ------------
+    env : :class:`MELTS_Env`
+        Environment to add to the variables.
+    prefix : :class:`str`
+        Prefix for alphaMELTS environment variables.
+    base : :class:`dict`
+        Environment variables to start from, defaulting to those of this process.
+
+    Returns
+    --------
+    :class:`dict`
+        Environment variables for the process.
+    """
+    if env is not None:
+        return env.to_environ(base=base)
+    base = os.environ if base is None else base
+    return {k: v for k, v in base.items() if not k.startswith(prefix)}
+
+
 class MELTS_Env(object):
     """
     Melts environment object.
 
+    Variables are held by each environment rather than set in :code:`os.environ`,
+    such that environments are independent of one another (and of other threads),
+    and are passed to alphaMELTS via an environment file (:meth:`to_envfile`) or
+    the environment of a child process (:meth:`to_environ`).
+
+    Serialised forms of the environment (:meth:`dump`, :meth:`to_envfile`) are
+    cached until a variable is changed, and the default variables for a given
+    variable model are only resolved once, such that setting variables and
+    creating or copying environments (e.g. one per experiment) is cheap.
+
     Todo
     -----
         * Implement use as context manager.
@@ -45,10 +84,20 @@ class MELTS_Env(object):
         self.prefix = prefix
         if variable_model is None:
             variable_model = MELTS_environment_variables
+        self._variables = {}  # formatted values of set variables, by unprefixed name
+        self._cache = {}  # serialised forms, cleared where variables change
         self.spec = variable_model
         self.force_active = False
         self.output_formatter = output_formatter
-        self.export_default_env()
+        defaults = _DEFAULT_VARIABLES.get(id(variable_model))
+        if defaults is not None and defaults[0] is variable_model:
+            self._variables = dict(defaults[1])
+        else:
+            self.export_default_env()
+            _DEFAULT_VARIABLES[id(variable_model)] = (
+                variable_model,
+                dict(self._variables),
+            )
 
     def export_default_env(self):
         """
@@ -60,8 +109,7 @@ class MELTS_Env(object):
 
         for var, template in self.spec.items():
             _spec = template
-            name = self.prefix + var
-            is_already_set = (name in os.environ) or (var in _dump.keys())
+            is_already_set = var in self._variables or _dump.get(var) is not None
             if not is_already_set and _spec["set"]:
                 setting = True  # should be set by default
             elif is_already_set and _spec["set"]:
@@ -74,7 +122,21 @@ class MELTS_Env(object):
             if setting:
                 setattr(self, var, None)
 
-    def dump(self, unset_variables=True, prefix=False, cast=lambda x: x):
+    def copy(self):
+        """
+        Copy the environment, such that variables can be changed independently of
+        the original.
+
+        Returns
+        --------
+        :class:`MELTS_Env`
+        """
+        env = self.__class__.__new__(self.__class__)
+        env.__dict__.update(self.__dict__)
+        env.__dict__.update(_variables=dict(self._variables), _cache={})
+        return env
+
+    def dump(self, unset_variables=True, prefix=False, cast=None):
         r"""
         Export environment configuration to a dictionary.
 
@@ -92,9 +154,19 @@ class MELTS_Env(object):
         :class:`dict`
             Dictionary of environent variables and their values.
         """
+        key = ("dump", unset_variables, prefix)
+        if key not in self._cache:
+            self._cache[key] = self._dump(
+                unset_variables=unset_variables, prefix=prefix
+            )
+        if cast is None:
+            return dict(self._cache[key])
+        return {k: cast(v) for k, v in self._cache[key].items()}
+
+    def _dump(self, unset_variables=True, prefix=False):
         keys = [k for k in self.spec.keys()]
         pkeys = [self.prefix + k for k in keys]
-        values = [os.getenv(p) for p in pkeys]
+        values = [self._variables.get(k) for k in keys]
         types = [
             self.spec[k]["type"] if self.spec[k].get("type", None) is not None else str
             for k in keys
@@ -107,7 +179,7 @@ class MELTS_Env(object):
         ]
         if not unset_variables:
             _env = [e for e in _env if e[1] is not None]
-        return {[k, self.prefix + k][prefix]: cast(v) for k, v in _env}
+        return {[k, self.prefix + k][prefix]: v for k, v in _env}
 
     def to_envfile(self, unset_variables=False):
         """
@@ -124,13 +196,16 @@ class MELTS_Env(object):
         :class:`str`
             String-representation of the environment which can be writen to a file.
         """
+        key = ("envfile", unset_variables)
+        if key in self._cache:
+            return self._cache[key]
         preamble = dedent(
             """
         ! Default values of environment variables (pyrolite export)
         ! Variables preceeded by '!' are 'unset' (i.e. 'false')
         """
         )
-        return preamble + "\n".join(
+        self._cache[key] = preamble + "\n".join(
             [
                 ["", "!"][v is None] + "{} {}".format(k, v)
                 for k, v in self.dump(
@@ -138,28 +213,93 @@ class MELTS_Env(object):
                 ).items()
             ]
         )
+        return self._cache[key]
+
+    def to_environ(self, base=None):
+        """
+        Get the environment variables for a child process using this environment
+        (e.g. for the :code:`env` argument of :class:`subprocess.Popen`).
+
+        Parameters
+        -----------
+        base : :class:`dict`
+            Environment variables to start from, defaulting to those of this
+            process. alphaMELTS variables within these are replaced by those of
+            this environment.
+
+        Returns
+        -------
+        :class:`dict`
+            Environment variables, with values as strings.
+        """
+        base = os.environ if base is None else base
+        environ = {k: v for k, v in base.items() if not k.startswith(self.prefix)}
+        environ.update({self.prefix + k: v for k, v in self._variables.items()})
+        return environ
+
+    def update_variable(self, name, value=None):
+        """
+        Update an environment variable after validation. Where the value is
+        :code:`None`, the variable is set to its default value or otherwise unset.
+
+        Parameters
+        -----------
+        name : :class:`str`
+            Variable name, without prefix.
+        value
+            Value for the variable.
+        """
+        schema = self.spec.get(name, None)
+        if schema is not None:  # some potential validation
+            if value is not None:
+                if schema.get("validator", None) is not None:
+                    valid = validate_value(value, schema["validator"])
+                    assert valid, "Invalid value for parameter {}: {}".format(
+                        name, value
+                    )
+                overriders = schema.get("overridden_by", None) or []
+                if self.force_active and any(
+                    [o in self._variables for o in overriders]
+                ):
+                    # as for pyrolite.util.env.validate_update_envvar, the variable
+                    # is removed, and then set to the new value below
+                    self._variables.pop(name, None)
+                    self._cache.clear()
+            elif schema.get("default", None) is not None:  # try to set to default
+                if schema.get("dependent_on", None) is None:
+                    value = schema["default"]
+                else:
+                    conditions = {
+                        k: self.spec[k]["default"]
+                        for k in schema["dependent_on"]
+                        if self.spec[k]["default"] is not None
+                    }
+                    value = schema["default"](conditions)
+
+        if value is not None:
+            value = self.output_formatter(value)
+            if self._variables.get(name) != value:
+                logger.debug("EnvVar {} set to {}.".format(self.prefix + name, value))
+                self._variables[name] = value
+                self._cache.clear()
+        elif name in self._variables:  # remove the variable if it's set
+            logger.debug("EnvVar {} removed.".format(self.prefix + name))
+            del self._variables[name]
+            self._cache.clear()
 
     def __setattr__(self, name, value):
         """
         Custom setattr to set environment variables.
 
         Setting attributes with or without the specified prefix should set
-        the appropriate prefixed environment variable.
+        the appropriate environment variable.
         """
 
         if hasattr(self, "spec"):
             prefix = getattr(self, "prefix", "")
-            dump = self.dump()
             name = remove_prefix(name, prefix)
             if name in self.spec:
-                validate_update_envvar(
-                    name,
-                    value=value,
-                    prefix=self.prefix,
-                    force_active=self.force_active,
-                    variable_model=self.spec,
-                    formatter=self.output_formatter,
-                )
+                self.update_variable(name, value)
             else:  # other object attributes
                 self.__dict__[name] = value
         else:
@@ -2,6 +2,8 @@
 Parsing utilities for use with alphaMELTS.
 """
 import re
+import functools
+import numpy as np
 import pandas as pd
 from pathlib import Path
 import logging
@@ -13,6 +15,8 @@ from .meltsfile import ser_to_meltsfile
 logging.getLogger(__name__).addHandler(logging.NullHandler())
 logger = logging.getLogger(__name__)
 
+FORMULA_CACHE_SIZE = 4096  # number of parsed composition strings kept for reuse
+
 
 def _file_from_obj(fileobj):
     """
@@ -138,20 +142,64 @@ def from_melts_cstr(composition_str, formula=True):
         * Enable parsing of nested brackets in composition.
     """
     regex = r"""(?P<el>[a-zA-Z']+)(?P<num>[^a-zA-Z()]+)"""
-    sub = r"""[\']+"""
+    if not formula:
+        result = re.findall(regex, composition_str)
+        result = [(_replace_valences(el), float(val)) for el, val in result]
+        return {k: v for k, v in result}
+    else:
+        return _parse_formula(str(composition_str))
+
+
+def _replace_valences(composition_str):
+    """
+    Replace iron valences given by primes (e.g. Fe'') with charges (e.g. Fe{2+}).
+    """
 
     def repl(m):
         return (
             "{" + str(m.group(0).count("""'""")) + "+" + "}"
         )  # replace ' with count(')
 
-    # replace iron valences
-    tfm = lambda s: re.sub(sub, repl, s).replace('[]', '')
-    if not formula:
-        result = re.findall(regex, composition_str)
-        result = [(tfm(el), float(val)) for el, val in result]
-        return {k: v for k, v in result}
-    else:
-        # entries with rounding errors giving negative 0 won't match
-        result = tfm(str(composition_str).replace("nan", "").replace("-0.0", "0.0"))
-        return pt.formula(result)
+    return re.sub(r"""[\']+""", repl, composition_str).replace("[]", "")
+
+
+@functools.lru_cache(maxsize=FORMULA_CACHE_SIZE)
+def _parse_formula(composition_str):
+    """
+    Parse a melts composition string to a :class:`~periodictable.formulas.Formula`.
+    Parsed formulae are cached, as the same compositions are typically repeated
+    across the steps of an experiment and between experiments; the formula
+    returned for a given string is hence shared between calls.
+    """
+    # entries with rounding errors giving negative 0 won't match
+    result = _replace_valences(
+        composition_str.replace("nan", "").replace("-0.0", "0.0")
+    )
+    return pt.formula(result)
+
+
+def from_melts_cstrs(compositions, formula=True):
+    """
+    Parse a sequence of melts composition strings, parsing each unique composition
+    only once.
+
+    Parameters
+    -----------
+    compositions : :class:`pandas.Series` | :class:`list`
+        Compositions to parse. Null entries are parsed as empty compositions, as
+        for :func:`from_melts_cstr`.
+    formula : :class:`bool`
+        Whether to output :class:`periodictable.formula.Formula` objects rather than
+        dictionaries (see :func:`from_melts_cstr`).
+
+    Returns
+    --------
+    :class:`pandas.Series`
+        Series of parsed compositions, with the index of the input where given.
+    """
+    compositions = pd.Series(compositions, dtype=object)
+    codes, uniques = pd.factorize(compositions)
+    parsed = np.empty(len(uniques) + 1, dtype=object)
+    parsed[:-1] = [from_melts_cstr(c, formula=formula) for c in uniques]
+    parsed[-1] = from_melts_cstr("", formula=formula)  # null entries (code -1)
+    return pd.Series(parsed[codes], index=compositions.index, dtype=object)
@@ -12,6 +12,7 @@ from ..meltsfile import df_to_meltsfiles
 from pyrolite.util.pd import zero_to_nan, to_frame, to_ser
 
 from .load import import_tables, aggregate_tables
+from .store import BatchStore
 from ..util.log import Handle
 
 logger = Handle(__name__)
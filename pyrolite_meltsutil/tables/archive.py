@@ -0,0 +1,388 @@
+"""
+Packing of experiment folders into compressed archives, and transparent access to
+the tables within them, such that batches needn't be stored as many small files.
+
+Experiments can be packed individually (:code:`<hash>.zip`, with the tables at the
+root of the archive) or in shards of a batch (with the tables for each experiment
+within a :code:`<hash>/` folder in the archive). Paths within archives are given
+relative to the archive, such that :code:`<hash>.zip/System_main_tbl.txt` and
+:code:`shard.zip/<hash>/System_main_tbl.txt` can be read with :func:`read_text`.
+
+Todo
+-----
+    * Consider Zstandard-compressed tarballs where :mod:`zstandard` is available.
+"""
+import os
+import shutil
+import tarfile
+import zipfile
+import collections
+from pathlib import Path, PurePosixPath
+from ..util.log import Handle
+
+logger = Handle(__name__)
+
+ARCHIVE_FORMATS = {  # as for shutil.make_archive
+    "zip": ".zip",
+    "tar": ".tar",
+    "gztar": ".tar.gz",
+    "bztar": ".tar.bz2",
+    "xztar": ".tar.xz",
+}
+MAX_OPEN_ARCHIVES = 8  # archives kept open for reading members
+SHARD_PREFIX = "meltsBatchShard"  # names of archives of a number of experiments
+
+_open = collections.OrderedDict()  # open archives and members, least recent first
+
+
+def is_archive(path):
+    """
+    Check whether a path has the suffix of a supported archive format.
+
+    Parameters
+    -----------
+    path : :class:`str` | :class:`pathlib.Path`
+
+    Returns
+    --------
+    :class:`bool`
+    """
+    return Path(path).name.endswith(tuple(ARCHIVE_FORMATS.values()))
+
+
+def strip_archive_suffix(path):
+    """
+    Get a path without its archive suffix (e.g. an experiment name from the name of
+    the archive it's packed in).
+
+    Parameters
+    -----------
+    path : :class:`str` | :class:`pathlib.Path`
+
+    Returns
+    --------
+    :class:`pathlib.Path`
+    """
+    path = Path(path)
+    for suffix in sorted(ARCHIVE_FORMATS.values(), key=len, reverse=True):
+        if path.name.endswith(suffix):
+            return path.with_name(path.name[: -len(suffix)])
+    return path
+
+
+def split_archive_path(path):
+    """
+    Split a path within an archive into the path to the archive and the name of the
+    member within it.
+
+    Parameters
+    -----------
+    path : :class:`str` | :class:`pathlib.Path`
+
+    Returns
+    --------
+    archive : :class:`pathlib.Path`
+        Path to the archive, or :code:`None` where the path isn't within an archive.
+    member : :class:`str`
+        Name of the member within the archive, which is empty for the archive
+        itself.
+    """
+    path = Path(path)
+    for parent in [path, *path.parents]:
+        if is_archive(parent) and parent.is_file():
+            member = path.relative_to(parent).as_posix()
+            return parent, "" if member == "." else member
+    return None, ""
+
+
+def _get_archive(archive):
+    """
+    Open an archive for reading, reusing archives which have recently been opened.
+    Returns the archive and the set of the names of the files within it.
+    """
+    archive = Path(archive)
+    # forked worker processes don't share handles, as these share file offsets
+    key = (os.getpid(), str(archive), archive.stat().st_mtime_ns)
+    if key in _open:
+        _open.move_to_end(key)
+        return _open[key]
+    if archive.name.endswith(".zip"):
+        handle = zipfile.ZipFile(str(archive))
+        members = {n for n in handle.namelist() if not n.endswith("/")}
+    else:
+        handle = tarfile.open(str(archive), "r:*")
+        members = {m.name for m in handle.getmembers() if m.isfile()}
+    _open[key] = handle, members
+    while len(_open) > MAX_OPEN_ARCHIVES:
+        _open.popitem(last=False)[1][0].close()
+    return handle, members
+
+
+def close_archives():
+    """
+    Close any archives which have been opened for reading.
+    """
+    while _open:
+        _open.popitem()[1][0].close()
+
+
+def _members(archive):
+    """
+    Get the names of the files within an archive.
+    """
+    return _get_archive(archive)[1]
+
+
+def exists(path):
+    """
+    Check whether a file or folder exists, either on disk or within an archive.
+
+    Parameters
+    -----------
+    path : :class:`str` | :class:`pathlib.Path`
+
+    Returns
+    --------
+    :class:`bool`
+    """
+    path = Path(path)
+    if path.exists():
+        return True
+    archive, member = split_archive_path(path)
+    if archive is None:
+        return False
+    members = _members(archive)
+    if member in members or not member:
+        return True
+    return any(n.startswith(member + "/") for n in members)
+
+
+def listdir(path):
+    """
+    Get the names of the files and folders within a folder, either on disk or
+    within an archive.
+
+    Parameters
+    -----------
+    path : :class:`str` | :class:`pathlib.Path`
+
+    Returns
+    --------
+    :class:`list` of :class:`str`
+    """
+    path = Path(path)
+    if path.is_dir():
+        return sorted(p.name for p in path.iterdir())
+    archive, member = split_archive_path(path)
+    if archive is None:
+        raise FileNotFoundError("No such folder or archive: {}".format(path))
+    prefix = PurePosixPath(member).parts if member else ()
+    names = set()
+    for name in _members(archive):
+        parts = PurePosixPath(name).parts
+        if parts[: len(prefix)] == prefix and len(parts) > len(prefix):
+            names.add(parts[len(prefix)])
+    return sorted(names)
+
+
+def read_text(path):
+    """
+    Read a text file, either from disk or from within an archive.
+
+    Parameters
+    -----------
+    path : :class:`str` | :class:`pathlib.Path`
+
+    Returns
+    --------
+    :class:`str`
+    """
+    path = Path(path)
+    if path.is_file():
+        with open(str(path)) as f:
+            return f.read()
+    archive, member = split_archive_path(path)
+    if archive is None or not member:
+        raise FileNotFoundError("No such file: {}".format(path))
+    handle, _ = _get_archive(archive)
+    try:
+        if isinstance(handle, zipfile.ZipFile):
+            data = handle.read(member)
+        else:
+            data = handle.extractfile(member).read()
+    except KeyError as err:
+        raise FileNotFoundError("No such file: {}".format(path)) from err
+    return data.decode()
+
+
+def iter_experiments(archive):
+    """
+    Iterate over the experiment folders within an archive. Archives of single
+    experiments are themselves experiment folders, and for shards of a batch the
+    experiment folders are those at the root of the archive.
+
+    Parameters
+    -----------
+    archive : :class:`str` | :class:`pathlib.Path`
+
+    Yields
+    -------
+    :class:`pathlib.Path`
+    """
+    archive = Path(archive)
+    members = _members(archive)
+    if any("/" not in n for n in members):  # files at the root of the archive
+        yield archive
+    for name in sorted({n.split("/")[0] for n in members if "/" in n}):
+        yield archive / name
+
+
+def packed_experiments(fromdir):
+    """
+    Get the names of the experiments which have been packed into archives within a
+    batch directory (see :func:`pack_batch`).
+
+    Parameters
+    -----------
+    fromdir : :class:`str` | :class:`pathlib.Path`
+        Batch directory.
+
+    Returns
+    --------
+    :class:`set` of :class:`str`
+
+    Notes
+    ------
+        * Archives of single experiments are named after the experiment, and only
+          shards are opened to list the experiments within them.
+    """
+    names = set()
+    for path in Path(fromdir).iterdir():
+        if not (is_archive(path) and path.is_file()):
+            continue
+        name = strip_archive_suffix(path).name
+        if not name.startswith(SHARD_PREFIX):
+            names.add(name)
+            continue
+        try:
+            names.update(p.name for p in iter_experiments(path) if p != path)
+        except (OSError, zipfile.BadZipFile, tarfile.TarError) as e:
+            logger.warning("Could not read archive {}: {}".format(path.name, e))
+    return names
+
+
+def _suffix(fmt):
+    """
+    Get the suffix for an archive format.
+    """
+    if fmt not in ARCHIVE_FORMATS:
+        raise ValueError("Unknown archive format: {}".format(fmt))
+    return ARCHIVE_FORMATS[fmt]
+
+
+def _write(archive, files, fmt="zip"):
+    """
+    Write files to an archive, given pairs of paths and names within the archive.
+    """
+    if fmt == "zip":
+        with zipfile.ZipFile(str(archive), "w", zipfile.ZIP_DEFLATED) as f:
+            for path, name in files:
+                f.write(str(path), name)
+    else:
+        mode = {"tar": "w", "gztar": "w:gz", "bztar": "w:bz2", "xztar": "w:xz"}[fmt]
+        with tarfile.open(str(archive), mode) as f:
+            for path, name in files:
+                f.add(str(path), name)
+
+
+def _pack(archive, folders, fmt="zip", remove=True):
+    """
+    Pack a number of folders into an archive, given pairs of folders and their
+    prefixes within the archive.
+    """
+    archive = Path(archive)
+    files = [
+        (p, (PurePosixPath(prefix) / p.relative_to(folder).as_posix()).as_posix())
+        for folder, prefix in folders
+        for p in sorted(Path(folder).rglob("*"))
+        if p.is_file()
+    ]
+    partial = archive.with_name("." + archive.name + ".partial")
+    _write(partial, files, fmt=fmt)
+    os.replace(str(partial), str(archive))  # such that partial archives aren't read
+    if remove:
+        for folder, _ in folders:
+            shutil.rmtree(str(folder))
+    return archive
+
+
+def pack_folder(folder, fmt="zip", remove=True):
+    """
+    Pack an experiment folder into an archive alongside it, with the files from the
+    folder at the root of the archive.
+
+    Parameters
+    -----------
+    folder : :class:`str` | :class:`pathlib.Path`
+        Experiment folder.
+    fmt : :class:`str`
+        Archive format; one of :code:`'zip'`, :code:`'tar'`, :code:`'gztar'`,
+        :code:`'bztar'` or :code:`'xztar'`.
+    remove : :class:`bool`
+        Whether to remove the folder once it has been packed.
+
+    Returns
+    --------
+    :class:`pathlib.Path`
+        Path to the archive.
+    """
+    folder = Path(folder)
+    archive = folder.with_name(folder.name + _suffix(fmt))
+    return _pack(archive, [(folder, ".")], fmt=fmt, remove=remove)
+
+
+def pack_batch(
+    fromdir,
+    shard_size=None,
+    fmt="zip",
+    remove=True,
+    validate_path=lambda x: len(x.name) == 10,
+):
+    """
+    Pack the experiment folders within a batch directory into archives, either one
+    per experiment or in shards of a number of experiments.
+
+    Parameters
+    -----------
+    fromdir : :class:`str` | :class:`pathlib.Path`
+        Batch directory.
+    shard_size : :class:`int`
+        Number of experiments per archive. By default each experiment is packed
+        into its own archive (see :func:`pack_folder`). Shards are named
+        :code:`meltsBatchShard<index>`.
+    fmt : :class:`str`
+        Archive format (see :func:`pack_folder`).
+    remove : :class:`bool`
+        Whether to remove experiment folders once they have been packed.
+    validate_path :
+        Function to validate experiment folder names.
+
+    Returns
+    --------
+    :class:`list` of :class:`pathlib.Path`
+        Paths to the archives.
+    """
+    fromdir, suffix = Path(fromdir), _suffix(fmt)
+    folders = sorted(p for p in fromdir.iterdir() if p.is_dir() and validate_path(p))
+    if not shard_size:
+        return [pack_folder(f, fmt=fmt, remove=remove) for f in folders]
+    existing = {strip_archive_suffix(p).name for p in fromdir.iterdir()}
+    index, archives = 0, []
+    for ix in range(0, len(folders), shard_size):
+        while SHARD_PREFIX + "{:04d}".format(index) in existing:
+            index += 1
+        name = SHARD_PREFIX + "{:04d}".format(index) + suffix
+        shard = [(f, f.name) for f in folders[ix : ix + shard_size]]
+        archives.append(_pack(fromdir / name, shard, fmt=fmt, remove=remove))
+        index += 1
+    return archives
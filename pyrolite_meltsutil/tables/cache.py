@@ -0,0 +1,258 @@
+"""
+Columnar on-disk cache of tables imported from alphaMELTS experiment folders, such
+that the text tables need only be parsed once. Phase formulae are cached as the
+melts composition strings, and are parsed on import where required (see
+:func:`~pyrolite_meltsutil.tables.load.import_tables`).
+
+Todo
+-----
+    * Consider Parquet or Feather formats where :mod:`pyarrow` is available.
+"""
+import os
+import json
+import numpy as np
+import pandas as pd
+import periodictable as pt
+from pathlib import Path
+from .. import __version__
+from ..parse import from_melts_cstr
+from ..util.log import Handle
+
+logger = Handle(__name__)
+
+CACHE_NAME = "meltsTablesCache.npz"
+CACHE_FORMAT = 4  # incremented where the cache format or contents change
+SOURCE_TABLES = [
+    "System_main_tbl.txt",
+    "Bulk_comp_tbl.txt",
+    "Solid_comp_tbl.txt",
+    "alphaMELTS_tbl.txt",
+]
+
+
+def cache_key(pth, kelvin=False):
+    """
+    Get the key against which cached tables are validated, based on the
+    modification times and sizes of the source tables, the package version and the
+    cache format.
+
+    Parameters
+    -----------
+    pth : :class:`str` | :class:`pathlib.Path`
+        Path to the experiment folder.
+    kelvin : :class:`bool`
+        Whether temperatures are kept in kelvin.
+
+    Returns
+    --------
+    :class:`dict`
+    """
+    pth = Path(pth)
+    files = {}
+    for name in SOURCE_TABLES:
+        if (pth / name).exists():
+            stat = (pth / name).stat()
+            files[name] = [stat.st_mtime_ns, stat.st_size]
+    return dict(
+        version=__version__, format=CACHE_FORMAT, kelvin=bool(kelvin), files=files
+    )
+
+
+def _column_kind(ser):
+    """
+    Get the kind of a column for storage within the cache.
+    """
+    if ser.dtype != object:
+        return "numeric"
+    elif ser.map(lambda x: isinstance(x, pt.formulas.Formula)).any():
+        return "formula"
+    else:
+        return "str"
+
+
+def _encode_structure(structure):
+    """
+    Encode a formula structure as nested lists of (count, fragment) entries, where
+    fragments are either [element, charge] pairs or nested structures.
+    """
+    encoded = []
+    for count, fragment in structure:
+        if isinstance(fragment, pt.core.Ion):
+            fragment = [fragment.element.symbol, fragment.charge]
+        elif type(fragment) is pt.core.Element:
+            fragment = [fragment.symbol, 0]
+        elif isinstance(fragment, tuple):
+            fragment = _encode_structure(fragment)
+        else:  # e.g. isotopes
+            raise TypeError("Unsupported fragment: {}".format(fragment))
+        encoded.append([count, fragment])
+    return encoded
+
+
+def _decode_structure(encoded):
+    """
+    Decode a formula structure encoded by :func:`_encode_structure`.
+    """
+    structure = []
+    for count, fragment in encoded:
+        if fragment and isinstance(fragment[0], str):
+            symbol, charge = fragment
+            atom = pt.elements.symbol(symbol)
+            fragment = atom.ion[charge] if charge else atom
+        else:
+            fragment = tuple(_decode_structure(fragment))
+        structure.append((count, fragment))
+    return structure
+
+
+def _encode_formula(formula):
+    """
+    Encode a formula as JSON, such that it can be reconstructed without being
+    parsed. Melts composition strings (i.e. formulae which haven't yet been parsed)
+    are parsed first, and formulae which can't be encoded by structure are encoded
+    as strings.
+    """
+    if isinstance(formula, str):
+        formula = from_melts_cstr(formula)
+    try:
+        return json.dumps(_encode_structure(formula.structure))
+    except TypeError:
+        return json.dumps(str(formula))
+
+
+def _decode_formula(value):
+    """
+    Decode a formula encoded by :func:`_encode_formula`.
+    """
+    encoded = json.loads(value)
+    if isinstance(encoded, str):
+        return pt.formula(encoded)
+    return pt.formula(_decode_structure(encoded))
+
+
+def _encode_table(df, prefix):
+    """
+    Encode a table as a dictionary of arrays and a description of its columns.
+    """
+    arrays = {
+        "{}_index".format(prefix): np.array([tuple(i) for i in df.index], dtype=int)
+    }
+    kinds = []
+    for ix, c in enumerate(df.columns):
+        ser = df.iloc[:, ix]
+        kind = _column_kind(ser)
+        values = ser.values
+        if kind != "numeric":
+            null = ser.isnull().values
+            convert = _encode_formula if kind == "formula" else str
+            arrays["{}_{}_null".format(prefix, ix)] = null
+            values = np.array(
+                [convert(v) if not n else "" for v, n in zip(values, null)], dtype=str
+            )
+        arrays["{}_{}".format(prefix, ix)] = values
+        kinds.append(kind)
+    return arrays, dict(columns=[str(c) for c in df.columns], kinds=kinds)
+
+
+def _decode_table(arrays, meta, prefix):
+    """
+    Decode a table from a dictionary of arrays and a description of its columns.
+    """
+    columns = {}
+    for ix, (c, kind) in enumerate(zip(meta["columns"], meta["kinds"])):
+        values = arrays["{}_{}".format(prefix, ix)]
+        if kind != "numeric":
+            null = arrays["{}_{}_null".format(prefix, ix)]
+            convert = _decode_formula if kind == "formula" else str
+            values = [np.nan if n else convert(v) for v, n in zip(values, null)]
+            values = pd.Series(values, dtype=object)
+        columns[ix] = values
+    df = pd.DataFrame(columns)
+    df.columns = meta["columns"]
+    index = arrays["{}_index".format(prefix)].reshape(-1, 2)
+    df.index = pd.DataFrame(index, columns=["pressure", "temperature"]).itertuples(
+        index=False
+    )
+    return df
+
+
+def write_table_cache(pth, system, phases, kelvin=False):
+    """
+    Write imported tables to the cache within an experiment folder.
+
+    Parameters
+    -----------
+    pth : :class:`str` | :class:`pathlib.Path`
+        Path to the experiment folder.
+    system : :class:`pandas.DataFrame`
+        System table.
+    phases : :class:`pandas.DataFrame`
+        Phase table.
+    kelvin : :class:`bool`
+        Whether temperatures are kept in kelvin.
+
+    Returns
+    --------
+    :class:`pathlib.Path`
+        Path to the cache file.
+    """
+    pth = Path(pth)
+    arrays, meta = {}, dict(key=cache_key(pth, kelvin=kelvin))
+    for name, df in [("system", system), ("phases", phases)]:
+        arr, meta[name] = _encode_table(df, name)
+        arrays.update(arr)
+    arrays["meta"] = np.array(json.dumps(meta))
+    target = pth / CACHE_NAME
+    tmp = pth / (CACHE_NAME + ".tmp")
+    with open(str(tmp), "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(str(tmp), str(target))  # such that partial writes aren't read
+    return target
+
+
+def read_table_cache(pth, kelvin=False):
+    """
+    Read imported tables from the cache within an experiment folder, if it exists
+    and is valid for the current source tables.
+
+    Parameters
+    -----------
+    pth : :class:`str` | :class:`pathlib.Path`
+        Path to the experiment folder.
+    kelvin : :class:`bool`
+        Whether temperatures are kept in kelvin.
+
+    Returns
+    --------
+    :class:`tuple` | :code:`None`
+        System and phase tables, or :code:`None` where there is no valid cache.
+    """
+    pth = Path(pth)
+    target = pth / CACHE_NAME
+    if not target.exists():
+        return None
+    try:
+        with np.load(str(target), allow_pickle=False) as arrays:
+            arrays = dict(arrays)
+        meta = json.loads(str(arrays["meta"]))
+        if meta["key"] != cache_key(pth, kelvin=kelvin):
+            logger.debug("Stale table cache at {}.".format(target))
+            return None
+        return tuple(_decode_table(arrays, meta[n], n) for n in ["system", "phases"])
+    except (OSError, ValueError, KeyError) as e:
+        logger.debug("Unreadable table cache at {}: {}".format(target, e))
+        return None
+
+
+def clear_table_cache(pth):
+    """
+    Remove the table cache from an experiment folder, if present.
+
+    Parameters
+    -----------
+    pth : :class:`str` | :class:`pathlib.Path`
+        Path to the experiment folder.
+    """
+    target = Path(pth) / CACHE_NAME
+    if target.exists():
+        target.unlink()
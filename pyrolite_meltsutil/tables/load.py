@@ -10,16 +10,26 @@ Notes
 import re
 import io
 import json
+import warnings
+import concurrent.futures
 import pandas as pd
 import numpy as np
 from pathlib import Path
 from pyrolite.util.pd import zero_to_nan
-from ..parse import from_melts_cstr
+from ..parse import from_melts_cstrs
 from ..util.tables import (
     phasename,
     tuple_reindex,
     integrate_solid_composition,
-    integrate_solid_proportions,
+)
+from .cache import read_table_cache, write_table_cache
+from .archive import (
+    exists,
+    listdir,
+    read_text,
+    is_archive,
+    iter_experiments,
+    strip_archive_suffix,
 )
 from ..util.log import Handle
 
@@ -39,6 +49,43 @@ TABLES = {
 THERMO = {"H": "enthalpy", "S": "entropy", "V": "volume"}
 THERMO.update({c: c.lower() for c in ["Pressure", "Temperature"]})
 
+NON_NUMERIC = ["step", "structure", "phaseID", "phase", "formula"]
+
+# headers expected for phases with inconsistent headers (see PHASE_HEADER_QUIRKS)
+PHASE_HEADERS = [
+    "Pressure",
+    "Temperature",
+    "mass",
+    "S",
+    "H",
+    "V",
+    "Cp",
+    "structure",
+    "formula",
+]
+PHASE_HEADER_QUIRKS = ["nepheline", "kalsilite", "alloy-solid"]
+
+
+def concat_tables(tables):
+    """
+    Concatenate a sequence of tables in a single operation, avoiding repeated
+    copies from incrementally appending to a table.
+
+    Parameters
+    ------------
+    tables : :class:`list` of :class:`pandas.DataFrame`
+        Tables to concatenate.
+
+    Returns
+    -------
+    :class:`pandas.DataFrame`
+        Concatenated table, which will be empty where no tables are given.
+    """
+    tables = [t for t in tables if t is not None]
+    if not tables:
+        return pd.DataFrame()
+    return pd.concat(tables, sort=False)
+
 
 def convert_thermo_names(df):
     """
@@ -59,6 +106,33 @@ def convert_thermo_names(df):
     return df
 
 
+def _phase_table_headers(phaseID, headers, rowlen):
+    """
+    Get the headers for a phase table given the length of its rows, accounting for
+    the known inconsistencies in the headers for nepheline, kalsilite and alloy
+    tables.
+
+    Parameters
+    ------------
+    phaseID : :class:`str`
+        ID for the phase (e.g. 'nepheline_0').
+    headers : :class:`list`
+        Headers for the phase table as listed in the table.
+    rowlen : :class:`int`
+        Number of values in the rows of the table.
+
+    Returns
+    -------
+    :class:`list`
+        Headers for the phase table.
+    """
+    if rowlen == len(headers) + 1 and any(
+        [phase in phaseID for phase in PHASE_HEADER_QUIRKS]
+    ):  # inconsistent headers
+        headers = PHASE_HEADERS + [i for i in headers if i not in PHASE_HEADERS]
+    return headers
+
+
 def read_phase_table(tab):
     """
     Import a phase table to a dataframe.
@@ -79,24 +153,7 @@ def read_phase_table(tab):
     linelen = [len(l.strip().split()) for l in lines[1:]]
     if not all([l == linelen[0] for l in linelen]):
         if linelen[0] == (linelen[1] - 1):  # known errors for neph, kals, alloy
-            if any(
-                [
-                    phase in phaseID
-                    for phase in ["nepheline", "kalsilite", "alloy-solid"]
-                ]
-            ):  # inconsistent headers
-                expect = [
-                    "Pressure",
-                    "Temperature",
-                    "mass",
-                    "S",
-                    "H",
-                    "V",
-                    "Cp",
-                    "structure",
-                    "formula",
-                ]
-                headers = [i for i in expect] + [i for i in headers if i not in expect]
+            headers = _phase_table_headers(phaseID, headers, linelen[1])
         else:
             logger.warning(  # unkonwn line length error
                 "Inconsistent line lengths for {} table: {}".format(
@@ -110,18 +167,194 @@ def read_phase_table(tab):
     return table
 
 
-def read_melts_tablefile(filepath, kelvin=False, skiprows=3, **kwargs):
+def read_phase_tables(lines):
+    """
+    Import the phase tables from an alphaMELTS table file to a single dataframe,
+    reading the file in a single pass. Each line is tokenised once, and the values
+    for all phase tables are accumulated by column such that the dataframe is
+    constructed once, rather than for each phase.
+
+    Parameters
+    ------------
+    lines : :class:`str` | :class:`~collections.abc.Iterable`
+        Text of the alphaMELTS table file (:code:`alphaMELTS_tbl.txt`), or an
+        iterable of its lines (e.g. an open file).
+
+    Returns
+    -------
+    :class:`pandas.DataFrame`
+        DataFrame with phase table information, including the phase ID and phase
+        name for each row. Columns other than
+        :code:`step, structure, phaseID, phase, formula` are numeric.
+
+    Notes
+    ------
+    The file consists of a number of sections, each starting with a title line
+    (:code:`Title: ...`). Phase tables are within the section in which the first
+    line starts with a lowercase phase ID (e.g. :code:`liquid_0 thermodynamic data
+    and composition:`), and are separated by blank lines.
+    """
+    if isinstance(lines, str):
+        lines = lines.splitlines()
+    columns, nrows = {}, 0
+    section, sections = None, 0
+    phaseID = headers = None
+    for line in lines:
+        tokens = line.split()
+        if not tokens or tokens[0] == "Title:":
+            section = "title" if tokens else section
+            phaseID = headers = None  # end of any phase table
+            for values in columns.values():  # fill in columns missing for the table
+                values.extend([np.nan] * (nrows - len(values)))
+            continue
+        if section == "title":  # first line of the section
+            section = "phase" if line[0].islower() else "other"
+            sections += section == "phase"
+        if section != "phase":
+            continue
+        if phaseID is None:
+            phaseID, phase = tokens[0], phasename(tokens[0])
+            ragged = False
+        elif headers is None:
+            headers = tokens
+            rowlen = None
+        else:
+            if rowlen is None:  # first row; the headers can now be checked
+                rowlen = len(tokens)
+                headers = _dedupe_headers(
+                    _phase_table_headers(phaseID, headers, rowlen)
+                )
+                for h in headers + ["phaseID", "phase"]:
+                    if h not in columns:
+                        columns[h] = [np.nan] * nrows
+            if len(tokens) != len(headers) and not ragged:
+                ragged = True
+                logger.warning(
+                    "Inconsistent line lengths for {} table: {} {}".format(
+                        phaseID, len(headers), len(tokens)
+                    )
+                )
+            for h, v in zip(headers, tokens):
+                columns[h].append(v)
+            for h in headers[len(tokens) :]:
+                columns[h].append(np.nan)
+            columns["phaseID"].append(phaseID)
+            columns["phase"].append(phase)
+            nrows += 1
+    for values in columns.values():
+        values.extend([np.nan] * (nrows - len(values)))
+    if sections != 1:
+        logger.warning("Imported alphaMELTS_tbl.txt incorrectly formatted.")
+    df = pd.DataFrame(columns)
+    for c in df.columns:
+        if c not in NON_NUMERIC:
+            df[c] = pd.to_numeric(df[c], errors="coerce")
+    return df
+
+
+def _dedupe_headers(headers):
+    """
+    Silence duplicate headers by appending a suffix (e.g. 'logfO2(absolute).1').
+
+    Parameters
+    -----------
+    headers : :class:`list`
+        List of headers.
+
+    Returns
+    -------
+    :class:`list`
+        List of headers without duplicates.
+    """
+    headers = [*headers]
+    for ix, h in enumerate(headers):
+        if headers[: ix + 1].count(h) > 1:  # logfO2(absolute) is sometimes duplicated
+            headers[ix] = h + ".1"  # silence duplicate
+    return headers
+
+
+def _read_numeric_block(block, headers):
+    """
+    Read a block of whitespace-separated numeric values to a dataframe in a single
+    pass.
+
+    Parameters
+    -----------
+    block : :class:`str`
+        Text of the table, excluding headers.
+    headers : :class:`list`
+        Column names for the table.
+
+    Returns
+    -------
+    :class:`pandas.DataFrame`
+        DataFrame of the table values.
+
+    Raises
+    -------
+    :class:`ValueError`
+        Where the block isn't a complete, rectangular numeric table (e.g. ragged or
+        non-numeric lines).
+    """
+    block = block.strip()
+    lines = block.split("\n")
+    ncols = len(headers)
+    if not lines[0] or any(len(line.split()) != ncols for line in lines):
+        raise ValueError("Table rows don't each have {} values.".format(ncols))
+    with warnings.catch_warnings():  # incomplete parsing is checked below
+        warnings.simplefilter("ignore", DeprecationWarning)
+        values = np.fromstring(block, sep=" ")
+    if values.size != len(lines) * ncols:
+        raise ValueError("Table contains non-numeric values.")
+    return pd.DataFrame(values.reshape(len(lines), ncols), columns=headers)
+
+
+def _read_delimited_block(block, headers, **kwargs):
+    """
+    Read a block of space-separated values to a dataframe using
+    :func:`pandas.read_csv`, which accommodates ragged lines and non-numeric values.
+
+    Parameters
+    -----------
+    block : :class:`str`
+        Text of the table, excluding headers.
+    headers : :class:`list`
+        Column names for the table.
+
+    Returns
+    -------
+    :class:`pandas.DataFrame`
+        DataFrame of the table values.
+    """
+    lines = [i.strip() for i in block.splitlines(keepends=False)]
+    linelen = [len(headers)] + [len(l.split()) for l in lines if l]
+    if not all([l == linelen[0] for l in linelen]):
+        logger.debug(  # debug here because these tables are often left-empty
+            "Inconsistent line lengths for table: {}".format(
+                "-".join([str(i) for i in linelen])
+            )
+        )
+    buff = io.BytesIO("\n".join(lines).encode("UTF-8"))
+    return pd.read_csv(buff, sep=" ", names=headers, **kwargs)
+
+
+def read_melts_tablefile(filepath, kelvin=False, skiprows=3, fast=True, **kwargs):
     """
     Read a melts table (a space-separated value file).
 
     Parameters
     -----------
     filepath : :class:`str` | :class:`pathlib.Path`
-        Filepath to the melts table.
+        Filepath to the melts table, which may be within an archive (see
+        :mod:`pyrolite_meltsutil.tables.archive`).
     kelvin : :class:`bool`
         Whether the imported table has temperature listed in kelvin.
     skiprows : :class:`int`
         Number of rows above the table headers.
+    fast : :class:`bool`
+        Whether to attempt to read numeric tables directly to an array, falling back
+        to :func:`pandas.read_csv` where lines are ragged or contain non-numeric
+        values. This is ignored where further keyword arguments are given.
 
     Returns
     -------
@@ -129,25 +362,19 @@ def read_melts_tablefile(filepath, kelvin=False, skiprows=3, **kwargs):
         DataFrame with table information.
     """
     path = Path(filepath)
-    with open(path) as tab:
-        lines = [i for i in tab.readlines()[skiprows:] if i]
-        headers = lines[0].strip().split()
-        for ix, h in enumerate(headers):
-            if (
-                headers[: ix + 1].count(h) > 1
-            ):  # logfO2(absolute) is sometimes duplicated
-                headers[ix] = h + ".1"  # silence duplicate
-        linelen = [len(l.strip().split()) for l in lines]
-        if not all([l == linelen[0] for l in linelen]):
-            logger.debug(  # debug here because these tables are often left-empty
-                "Inconsistent line lengths for table: {}".format(
-                    "-".join([str(i) for i in linelen])
-                )
-            )
-    buff = io.BytesIO("".join(lines[1:]).encode("UTF-8"))
-    df = pd.read_csv(buff, sep=" ", names=headers, **kwargs)
+    df = None
+    text = read_text(path)
+    *_, header, block = text.split("\n", skiprows + 1)
+    headers = _dedupe_headers(header.strip().split())
+    if fast and not kwargs:
+        try:
+            df = _read_numeric_block(block, headers)
+        except ValueError:  # e.g. ragged lines, read below
+            pass
+    if df is None:
+        df = _read_delimited_block(block, headers, **kwargs)
     df = df.loc[
-        :, ~df.columns.str.replace("(\.\d+)$", "").duplicated()
+        :, ~df.columns.str.replace(r"(\.\d+)$", "", regex=True).duplicated()
     ]  # remove duplicate columns
     df = df.dropna(how="all", axis=1)
 
@@ -163,7 +390,33 @@ def read_melts_tablefile(filepath, kelvin=False, skiprows=3, **kwargs):
     return df
 
 
-def phasetable_from_alphameltstxt(filepath, kelvin=False):
+def parse_formulae(df):
+    """
+    Parse the melts composition strings in the formula column of a phase table to
+    :class:`~periodictable.formulas.Formula` objects (e.g. for tables imported with
+    :code:`formulae=False`). Each unique composition is parsed once, and formulae
+    which have already been parsed are kept.
+
+    Parameters
+    ------------
+    df : :class:`pandas.DataFrame`
+        Phase table.
+
+    Returns
+    -------
+    :class:`pandas.DataFrame`
+        Phase table with parsed formulae.
+    """
+    if "formula" in df.columns:
+        values = df["formula"].values.copy()
+        raw = np.array([isinstance(v, str) for v in values], dtype=bool)
+        if raw.any():
+            values[raw] = from_melts_cstrs(values[raw]).values
+            df["formula"] = values
+    return df
+
+
+def phasetable_from_alphameltstxt(filepath, kelvin=False, formulae=True):
     """
     Read the phasemain file into a single table. Note that the alphaMELTS table
     includes all other tables also (except for traces).
@@ -171,9 +424,14 @@ def phasetable_from_alphameltstxt(filepath, kelvin=False):
     Parameters
     ------------
     filepath : :class:`str` | :class:`pathlib.Path`
-        Filepath to the melts table.
+        Filepath to the melts table, which may be within an archive (see
+        :mod:`pyrolite_meltsutil.tables.archive`).
     kelvin : :class:`bool`
         Whether the exported table has temperature listed in kelvin.
+    formulae : :class:`bool`
+        Whether to parse phase formulae to :class:`~periodictable.formulas.Formula`
+        objects. Otherwise, these are kept as melts composition strings, which can
+        be parsed later with :func:`parse_formulae`.
 
     Returns
     -------
@@ -188,29 +446,14 @@ def phasetable_from_alphameltstxt(filepath, kelvin=False):
     """
 
     filepath = Path(filepath)
-    assert filepath.exists()
-    with open(str(filepath), "r") as f:
-        df = pd.DataFrame()
-        data = f.read().strip()
-        tables = re.split("Title: ", data)
-        tables = [t for t in re.split(r"Title: .*[\n\r][\n\r]+", data, re.DOTALL) if t]
-        phasetbl = [t for t in tables if t[0] == t[0].lower()]
-        if len(phasetbl) != 1:
-            logger.warning("Imported alphaMELTS_tbl.txt incorrectly formatted.")
-        else:
-            phasetbl = phasetbl[0]
-            phasettlbs = re.split(r"[\n\r][\n\r]+", phasetbl.strip())
-            for tab in phasettlbs:
-                tabdf = read_phase_table(tab)
-                df = df.append(tabdf, sort=False)
-
+    assert exists(filepath)
+    df = read_phase_tables(read_text(filepath))
     df = convert_thermo_names(df)
-    non_num = ["step", "structure", "phaseID", "phase", "formula"]
-    num = [i for i in df.columns if i not in non_num]
-    df[num] = df[num].apply(pd.to_numeric, errors="coerce")
+    if "formula" in df.columns:  # phases without a composition (e.g. liquid)
+        df["formula"] = df["formula"].fillna("")
 
-    if "formula" in df.columns:
-        df.loc[:, "formula"] = df.loc[:, "formula"].apply(from_melts_cstr)
+    if formulae:
+        df = parse_formulae(df)
 
     if ("temperature" in df.columns) and not kelvin:
         df["temperature"] -= 273.15
@@ -224,7 +467,7 @@ def phasetable_from_alphameltstxt(filepath, kelvin=False):
     return df
 
 
-def phasetable_from_phasemain(filepath, kelvin=False):
+def phasetable_from_phasemain(filepath, kelvin=False, formulae=True):
     """
     Read the phasemain file into a single table.
 
@@ -234,25 +477,27 @@ def phasetable_from_phasemain(filepath, kelvin=False):
         Filepath to the melts table.
     kelvin : :class:`bool`
         Whether the exported table has temperature listed in kelvin.
+    formulae : :class:`bool`
+        Whether to parse phase formulae to :class:`~periodictable.formulas.Formula`
+        objects. Otherwise, these are kept as melts composition strings, which can
+        be parsed later with :func:`parse_formulae`.
 
     Returns
     -------
     :class:`pandas.DataFrame`
         DataFrame with table information.
     """
-    df = pd.DataFrame()
-    with open(str(filepath)) as f:
-        data = re.split(r"[\n\r][\n\r]+", f.read())[1:]  # double line sep
-        for tab in data:
-            df = df.append(read_phase_table(tab), sort=False)
+    data = re.split(r"[\n\r][\n\r]+", read_text(filepath))[1:]  # double line sep
+    df = concat_tables([read_phase_table(tab) for tab in data])
 
     df = convert_thermo_names(df)
-    non_num = ["step", "structure", "phaseID", "phase", "formula"]
-    num = [i for i in df.columns if i not in non_num]
+    num = [i for i in df.columns if i not in NON_NUMERIC]
     df[num] = df[num].apply(pd.to_numeric, errors="coerce")
+    if "formula" in df.columns:  # phases without a composition (e.g. liquid)
+        df["formula"] = df["formula"].fillna("")
 
-    if "formula" in df.columns:
-        df.loc[:, "formula"] = df.loc[:, "formula"].apply(from_melts_cstr)
+    if formulae:
+        df = parse_formulae(df)
 
     if ("temperature" in df.columns) and not kelvin:
         df["temperature"] -= 273.15
@@ -266,14 +511,28 @@ def phasetable_from_phasemain(filepath, kelvin=False):
     return df
 
 
-def import_tables(pth, kelvin=False):
+def import_tables(pth, kelvin=False, cache=None, formulae=True):
     """
     Import tables from a directory.
 
     Parameters
     -----------
+    pth : :class:`str` | :class:`pathlib.Path`
+        Path to the experiment folder, which may be an archive or a folder within
+        an archive (see :mod:`pyrolite_meltsutil.tables.archive`).
     kelvin : :class:`bool`
         Whether to keep temperatures in kelvin.
+    cache : :class:`bool`
+        Whether to use the table cache for the directory (see
+        :mod:`pyrolite_meltsutil.tables.cache`). By default a valid cache is used
+        where present. Where :code:`True`, the cache is also written (or updated)
+        after parsing the tables, and where :code:`False` it is ignored. The cache
+        isn't used for archives.
+    formulae : :class:`bool`
+        Whether to parse phase formulae to :class:`~periodictable.formulas.Formula`
+        objects (see :func:`phasetable_from_alphameltstxt`). Where many
+        experiments are imported and the formulae aren't needed, keeping these as
+        composition strings avoids parsing them.
 
     Returns
     --------
@@ -281,6 +540,14 @@ def import_tables(pth, kelvin=False):
 
     phases : :class:`pandas.DataFrame`
     """
+    pth = Path(pth)
+    if not pth.is_dir():  # e.g. an archive, which is read without extracting it
+        cache = False
+    if cache is not False:
+        cached = read_table_cache(pth, kelvin=kelvin)
+        if cached is not None:
+            system, phase = cached
+            return system, parse_formulae(phase) if formulae else phase
     sysfile, bulkfile, solidfile, alphafile = [
         pth / t
         for t in [
@@ -292,11 +559,9 @@ def import_tables(pth, kelvin=False):
     ]
     try:
         for f in [sysfile, bulkfile, solidfile, alphafile]:
-            assert f.exists()
+            assert exists(f)
     except AssertionError as err:
-        msg = "File missing from {}: {}".format(
-            pth, ", ".join([i.name for i in pth.iterdir()])
-        )
+        msg = "File missing from {}: {}".format(pth, ", ".join(listdir(pth)))
         raise FileNotFoundError(msg) from err
     # system table
     system = read_melts_tablefile(sysfile, skiprows=3, kelvin=kelvin)
@@ -307,7 +572,9 @@ def import_tables(pth, kelvin=False):
         columns=["step"] + [i for i in system.columns if i != "step"]
     )
 
-    phase = phasetable_from_alphameltstxt(pth / "alphaMELTS_tbl.txt", kelvin=kelvin)
+    phase = phasetable_from_alphameltstxt(  # formulae are cached unparsed
+        pth / "alphaMELTS_tbl.txt", kelvin=kelvin, formulae=False
+    )
     bulk = read_melts_tablefile(pth / "Bulk_comp_tbl.txt", skiprows=3, kelvin=kelvin)
     solid = read_melts_tablefile(pth / "Solid_comp_tbl.txt", skiprows=3, kelvin=kelvin)
 
@@ -321,18 +588,15 @@ def import_tables(pth, kelvin=False):
     solid = solid.loc[solid["mass"] > 0.0, :]  # drop where no solids present
     # traces could be imported here
 
-    for tb in [bulk, solid]:
-        phase = phase.append(tb, sort=False)
+    phase = concat_tables([phase, bulk, solid])
     # integrated solids for fractionation - if the system mass changes significantly
     # could add this threshold as a parameter
     frac = system.mass.max() / system.mass.min() > 1.05
     cumulate_comp = integrate_solid_composition(phase, frac=frac)
     cumulate_comp["phase"] = "cumulate"
-    phase = phase.append(cumulate_comp, sort=False)
-
-    cumulate_phases = integrate_solid_proportions(phase, frac=frac)
-    cumulate_comp["phase"] = "cumulate"
-    # TODO: Integrate these?
+    phase = concat_tables([phase, cumulate_comp])
+    # integrated solid proportions aren't incorporated here; these can be found
+    # for single or aggregated tables with integrate_solid_proportions
 
     phase["step"] = system.loc[phase.index, "step"]
     phase = phase.reindex(columns=["step"] + [i for i in phase.columns if i != "step"])
@@ -347,6 +611,13 @@ def import_tables(pth, kelvin=False):
     phase[numeric_columns] = phase[numeric_columns].apply(
         pd.to_numeric, errors="coerce"
     )
+    if cache:
+        try:
+            write_table_cache(pth, system, phase, kelvin=kelvin)
+        except OSError as e:
+            logger.warning("Table cache not written for {}: {}".format(pth, e))
+    if formulae:
+        phase = parse_formulae(phase)
     return system, phase
 
 
@@ -376,8 +647,55 @@ def import_batch_config(filepath):
     return cfg
 
 
+def _import_experiment(pth, kelvin=False, pickleable=False, cache=None, formulae=True):
+    """
+    Import the tables for a single experiment folder, capturing any errors.
+
+    Parameters
+    -----------
+    pth : :class:`pathlib.Path`
+        Path to the experiment folder or archive.
+    kelvin : :class:`bool`
+        Whether to keep temperatures in kelvin.
+    pickleable : :class:`bool`
+        Whether to convert table indexes to plain tuples, such that the tables can be
+        returned from a worker process.
+    cache : :class:`bool`
+        Whether to use the table cache for the experiment folder (see
+        :func:`import_tables`).
+    formulae : :class:`bool`
+        Whether to parse phase formulae (see :func:`import_tables`).
+
+    Returns
+    --------
+    :class:`tuple`
+        System and phase tables (or :code:`None` where the import failed) and an
+        error message (or :code:`None` where the import succeeded).
+    """
+    pth = Path(pth)
+    try:
+        S, P = import_tables(pth, kelvin=kelvin, cache=cache, formulae=formulae)
+    except Exception as e:
+        return None, None, "{}".format(e)
+    # ensure the experiment name is incorporated
+    name = strip_archive_suffix(pth).name
+    S["experiment"] = name
+    P["experiment"] = name
+    if pickleable:
+        for df in [S, P]:
+            df.index = [tuple(i) for i in df.index]
+    return S, P, None
+
+
 def aggregate_tables(
-    lst=Path("./"), kelvin=False, validate_path=lambda x: len(x.name) == 10
+    lst=Path("./"),
+    kelvin=False,
+    validate_path=lambda x: len(x.name) == 10,
+    workers=None,
+    chunksize=None,
+    return_errors=False,
+    cache=None,
+    formulae=True,
 ):
     """
     Aggregate a number of melts tables to a single dataframe.
@@ -385,41 +703,92 @@ def aggregate_tables(
     Parameters
     ------------
     lst : :class:`str` | :class:`pathlib.Path` | :class:`list`
-        Directory, list of directories or list of 2-dataframe tuples.
+        Directory, list of directories or list of 2-dataframe tuples. Experiments
+        packed in archives within a directory are included (see
+        :mod:`pyrolite_meltsutil.tables.archive`).
     kelvin : :class:`bool`
         Whether to keep temperatures in kelvin.
     validate_path :
         Function to validate path names.
+    workers : :class:`int`
+        Number of worker processes to use for importing experiment folders. Where
+        this is greater than one, folders are imported concurrently in a
+        :class:`concurrent.futures.ProcessPoolExecutor`, and results are aggregated
+        in the order of the folders.
+    chunksize : :class:`int`
+        Number of folders submitted to worker processes at a time. Defaults to
+        splitting the folders into four chunks per worker.
+    return_errors : :class:`bool`
+        Whether to also return a dictionary of errors encountered for individual
+        experiment folders, indexed by folder name.
+    cache : :class:`bool`
+        Whether to use the table caches for experiment folders (see
+        :func:`import_tables`).
+    formulae : :class:`bool`
+        Whether to parse phase formulae (see :func:`import_tables`).
 
-    Parameters
+    Returns
     ------------
     system : :class:`pandas.DataFrame`
         System aggregate table.
     phases : :class:`pandas.DataFrame`
         Phases aggregate table.
+    errors : :class:`dict`
+        Errors for individual experiment folders, where :code:`return_errors=True`.
     """
     if isinstance(lst, (str, Path)):
         # if the input is a directory, aggregate subfolders
-        lst = [x for x in Path(lst).rglob("*") if (x.is_dir() and validate_path(x))]
+        paths, lst = Path(lst).rglob("*"), []
+        for x in paths:
+            if x.is_dir() and validate_path(x):
+                lst.append(x)
+            elif is_archive(x) and x.is_file():  # experiments packed in archives
+                lst += [
+                    e
+                    for e in iter_experiments(x)
+                    if validate_path(strip_archive_suffix(e))
+                ]
 
-    system, phases = pd.DataFrame(), pd.DataFrame()
+    systems, phases, errors = [], [], {}
     if isinstance(lst[0], (str, Path)):
         # if the list is of filenames, aggregate the tables one by one
-        for d in lst:
-            try:
-                S, P = import_tables(d, kelvin=kelvin)
-                # ensure the experiment name is incorporated
-                S["experiment"] = d.name
-                P["experiment"] = d.name
-
-                system = system.append(S, sort=False)
-                phases = phases.append(P, sort=False)
-            except Exception as e:
-                logger.warning("{} at {}.".format(e, d.name))  # record the error
+        lst = [Path(d) for d in lst]
+        if (workers or 1) > 1:
+            chunksize = chunksize or max(1, len(lst) // (4 * workers))
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as ex:
+                results = list(
+                    ex.map(
+                        _import_experiment,
+                        lst,
+                        [kelvin] * len(lst),
+                        [True] * len(lst),
+                        [cache] * len(lst),
+                        [formulae] * len(lst),
+                        chunksize=chunksize,
+                    )
+                )
+            for S, P, _ in results:  # restore tuple indexes
+                if S is not None:
+                    for df in [S, P]:
+                        df.index = pd.DataFrame(
+                            df.index.tolist(), columns=["pressure", "temperature"]
+                        ).itertuples(index=False)
+        else:
+            results = [
+                _import_experiment(d, kelvin=kelvin, cache=cache, formulae=formulae)
+                for d in lst
+            ]
+
+        for d, (S, P, err) in zip(lst, results):
+            if err is not None:
+                logger.warning("{} at {}.".format(err, d.name))  # record the error
+                errors[d.name] = err
+            else:
+                systems.append(S)
+                phases.append(P)
     elif isinstance(lst[0], (list, tuple)) and isinstance(lst[0][0], (pd.DataFrame)):
         # if the list is of tuples of dataframes,
         # aggregate them to a single table
-        Sagg, Pagg = pd.DataFrame(), pd.DataFrame()
         for ix, d in enumerate(lst):
 
             S, P = d
@@ -427,15 +796,18 @@ def aggregate_tables(
             S["experiment"] = ix
             P["experiment"] = ix
 
-            system = system.append(S, sort=False)
-            phases = phases.append(P, sort=False)
+            systems.append(S)
+            phases.append(P)
     else:
         raise NotImplementedError
 
+    system, phases = concat_tables(systems), concat_tables(phases)
     system = system.reindex(
         columns=["experiment"] + [i for i in system.columns if i != "experiment"]
     )
     phases = phases.reindex(
         columns=["experiment"] + [i for i in phases.columns if i != "experiment"]
     )
+    if return_errors:
+        return system, phases, errors
     return system, phases
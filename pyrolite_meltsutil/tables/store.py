@@ -0,0 +1,379 @@
+"""
+Consolidated storage of experiment tables, such that batches can be stored in a
+single file rather than a folder of tables per experiment.
+"""
+import json
+import shutil
+import sqlite3
+import datetime
+import contextlib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from .load import import_tables, import_batch_config
+from .cache import _encode_formula, _decode_formula
+from ..util.log import Handle
+
+logger = Handle(__name__)
+
+STORE_NAME = "meltsBatchStore.sqlite"
+OBJECT_COLUMNS = ["phaseID", "phase", "formula", "structure"]
+
+
+def _quote(name):
+    """
+    Quote an identifier (e.g. a column name) for use in SQL statements.
+    """
+    return '"{}"'.format(str(name).replace('"', '""'))
+
+
+class BatchStore(object):
+    """
+    Store for the system and phase tables of a number of experiments, indexed by
+    experiment hash, within a single SQLite database. The configuration and
+    environment of each experiment are stored alongside the tables, such that
+    experiments can be queried by their configuration.
+
+    Parameters
+    -----------
+    path : :class:`str` | :class:`pathlib.Path`
+        Path to the store. If this is a directory, the store will be
+        :code:`meltsBatchStore.sqlite` within it.
+    """
+
+    def __init__(self, path):
+        path = Path(path)
+        if path.is_dir():
+            path = path / STORE_NAME
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as con:
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS experiments "
+                "(hash TEXT PRIMARY KEY, title TEXT, config TEXT, env TEXT, time TEXT)"
+            )
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """
+        Connect to the store, committing changes on exit.
+        """
+        con = sqlite3.connect(str(self.path))
+        try:
+            with con:  # commit, or roll back on error
+                yield con
+        finally:
+            con.close()
+
+    @property
+    def hashes(self):
+        """Hashes of the experiments in the store."""
+        with self._connect() as con:
+            return [r[0] for r in con.execute("SELECT hash FROM experiments")]
+
+    def __contains__(self, hsh):
+        with self._connect() as con:
+            query = "SELECT 1 FROM experiments WHERE hash = ?"
+            return con.execute(query, (hsh,)).fetchone() is not None
+
+    def __len__(self):
+        with self._connect() as con:
+            return con.execute("SELECT COUNT(*) FROM experiments").fetchone()[0]
+
+    def _columns(self, con, table):
+        """
+        Get the columns of a table within the store.
+        """
+        return [r[1] for r in con.execute("PRAGMA table_info({})".format(_quote(table)))]
+
+    def _insert(self, con, table, df):
+        """
+        Insert rows into a table, adding any new columns to the table.
+        """
+        columns = self._columns(con, table)
+        if not columns:
+            df.head(0).to_sql(table, con, index=False)
+            con.execute(
+                "CREATE INDEX {} ON {} (experiment)".format(
+                    _quote("ix_{}_experiment".format(table)), _quote(table)
+                )
+            )
+        else:
+            for c in [c for c in df.columns if c not in columns]:
+                con.execute(
+                    "ALTER TABLE {} ADD COLUMN {}".format(_quote(table), _quote(c))
+                )
+        df.to_sql(table, con, index=False, if_exists="append")
+
+    def add(self, hsh, system, phases, title=None, config=None, env=None):
+        """
+        Add the tables for an experiment to the store, replacing any which have
+        previously been stored for the experiment.
+
+        Parameters
+        -----------
+        hsh : :class:`str`
+            Experiment hash.
+        system : :class:`pandas.DataFrame`
+            System table.
+        phases : :class:`pandas.DataFrame`
+            Phase table.
+        title : :class:`str`
+            Experiment title.
+        config : :class:`dict`
+            Experiment configuration.
+        env : :class:`dict`
+            Experiment environment.
+        """
+        with self._connect() as con:
+            self._remove(con, hsh)
+            for table, df in [("system", system), ("phases", phases)]:
+                self._insert(con, table, _to_records(df, hsh))
+            con.execute(
+                "INSERT INTO experiments VALUES (?, ?, ?, ?, ?)",
+                (
+                    hsh,
+                    title,
+                    json.dumps(config, ensure_ascii=False),
+                    json.dumps(env, ensure_ascii=False),
+                    datetime.datetime.now().isoformat(),
+                ),
+            )
+
+    def _remove(self, con, hsh):
+        """
+        Remove the records for an experiment.
+        """
+        for table in ["system", "phases"]:
+            if self._columns(con, table):
+                con.execute(
+                    "DELETE FROM {} WHERE experiment = ?".format(_quote(table)), (hsh,)
+                )
+        con.execute("DELETE FROM experiments WHERE hash = ?", (hsh,))
+
+    def remove(self, hsh):
+        """
+        Remove an experiment from the store.
+
+        Parameters
+        -----------
+        hsh : :class:`str`
+            Experiment hash.
+        """
+        with self._connect() as con:
+            self._remove(con, hsh)
+
+    def ingest(
+        self, folder, name=None, title=None, config=None, env=None, remove=False
+    ):
+        """
+        Import the tables from an experiment folder and add them to the store.
+
+        Parameters
+        -----------
+        folder : :class:`str` | :class:`pathlib.Path`
+            Experiment folder.
+        name : :class:`str`
+            Experiment hash, which defaults to the name of the folder.
+        title : :class:`str`
+            Experiment title.
+        config : :class:`dict`
+            Experiment configuration.
+        env : :class:`dict`
+            Experiment environment.
+        remove : :class:`bool`
+            Whether to remove the experiment folder once it has been stored.
+        """
+        folder = Path(folder)
+        system, phases = import_tables(folder)
+        self.add(
+            name or folder.name, system, phases, title=title, config=config, env=env
+        )
+        if remove:
+            shutil.rmtree(str(folder))
+
+    def ingest_batch(
+        self,
+        fromdir,
+        overwrite=False,
+        remove=False,
+        validate_path=lambda x: len(x.name) == 10,
+    ):
+        """
+        Add the experiments from a batch directory to the store, including their
+        configuration where a batch configuration file is present.
+
+        Parameters
+        -----------
+        fromdir : :class:`str` | :class:`pathlib.Path`
+            Batch directory.
+        overwrite : :class:`bool`
+            Whether to replace experiments which are already in the store.
+        remove : :class:`bool`
+            Whether to remove experiment folders once they have been stored.
+        validate_path :
+            Function to validate experiment folder names.
+
+        Returns
+        --------
+        :class:`dict`
+            Errors for individual experiment folders, indexed by folder name.
+        """
+        fromdir = Path(fromdir)
+        cfg = {}
+        if (fromdir / "meltsBatchConfig.json").exists():
+            cfg = import_batch_config(fromdir)
+        stored = set(self.hashes)
+        errors = {}
+        for folder in sorted(fromdir.iterdir()):
+            if not (folder.is_dir() and validate_path(folder)):
+                continue
+            if folder.name in stored and not overwrite:
+                continue
+            title, config, env = cfg.get(folder.name, (None, None, None))
+            try:
+                self.ingest(
+                    folder, title=title, config=config, env=env, remove=remove
+                )
+            except Exception as e:
+                logger.warning("{} at {}.".format(e, folder.name))
+                errors[folder.name] = "{}".format(e)
+        return errors
+
+    def find(self, config=None, title=None):
+        """
+        Find experiments by their configuration.
+
+        Parameters
+        -----------
+        config : :class:`dict`
+            Configuration values to match (e.g. :code:`{'Initial Pressure': 5000}`).
+        title : :class:`str`
+            Experiment title to match.
+
+        Returns
+        --------
+        :class:`list`
+            Hashes of matching experiments.
+        """
+        config = config or {}
+        matches = []
+        with self._connect() as con:
+            for hsh, _title, cfg in con.execute(
+                "SELECT hash, title, config FROM experiments"
+            ):
+                cfg = json.loads(cfg) or {}
+                if title is not None and _title != title:
+                    continue
+                if all((k in cfg) and (cfg[k] == v) for k, v in config.items()):
+                    matches.append(hsh)
+        return matches
+
+    def load(self, hashes=None, config=None):
+        """
+        Load tables from the store, in the same format as
+        :func:`~pyrolite_meltsutil.tables.load.aggregate_tables`.
+
+        Parameters
+        -----------
+        hashes : :class:`list`
+            Hashes of the experiments to load. By default all experiments are
+            loaded.
+        config : :class:`dict`
+            Configuration values to match, as for :meth:`find`.
+
+        Returns
+        --------
+        system : :class:`pandas.DataFrame`
+            System aggregate table.
+        phases : :class:`pandas.DataFrame`
+            Phases aggregate table.
+        """
+        if config is not None:
+            found = self.find(config=config)
+            hashes = found if hashes is None else [h for h in hashes if h in found]
+        tables = []
+        with self._connect() as con:
+            for table in ["system", "phases"]:
+                if not self._columns(con, table):
+                    tables.append(pd.DataFrame())
+                    continue
+                query = "SELECT * FROM {}".format(_quote(table))
+                if hashes is None:
+                    dfs = [pd.read_sql_query(query, con)]
+                else:
+                    hashes = list(hashes)
+                    dfs = []
+                    for ix in range(0, max(len(hashes), 1), 500):
+                        chunk = hashes[ix : ix + 500]
+                        dfs.append(
+                            pd.read_sql_query(
+                                query
+                                + " WHERE experiment IN ({})".format(
+                                    ", ".join(["?"] * len(chunk))
+                                ),
+                                con,
+                                params=chunk,
+                            )
+                        )
+                tables.append(_from_records(pd.concat(dfs, ignore_index=True)))
+        return tuple(tables)
+
+    def to_frame(self):
+        """
+        Get a summary of the experiments in the store, including their
+        configuration.
+
+        Returns
+        --------
+        :class:`pandas.DataFrame`
+            Table of experiment titles and configurations, indexed by experiment
+            hash.
+        """
+        with self._connect() as con:
+            records = {
+                hsh: {"title": title, **(json.loads(cfg) or {})}
+                for hsh, title, cfg in con.execute(
+                    "SELECT hash, title, config FROM experiments"
+                )
+            }
+        return pd.DataFrame.from_dict(records, orient="index")
+
+
+def _to_records(df, hsh):
+    """
+    Convert a table to records for the store, with the experiment hash and index
+    stored as columns.
+    """
+    df = df.copy()
+    if "experiment" in df.columns:
+        df = df.drop(columns="experiment")
+    if "formula" in df.columns:
+        df["formula"] = [
+            _encode_formula(f) if not pd.isnull(f) else None for f in df["formula"]
+        ]
+    index = np.array([tuple(i) for i in df.index], dtype=int).reshape(-1, 2)
+    df.insert(0, "index_temperature", index[:, 1])
+    df.insert(0, "index_pressure", index[:, 0])
+    df.insert(0, "experiment", hsh)
+    return df.reset_index(drop=True)
+
+
+def _from_records(df):
+    """
+    Convert records from the store to a table, restoring the index and column
+    types.
+    """
+    index = df[["index_pressure", "index_temperature"]].astype(int)
+    index.columns = ["pressure", "temperature"]
+    df = df.drop(columns=["index_pressure", "index_temperature"])
+    numeric = [c for c in df.columns if c not in OBJECT_COLUMNS + ["experiment"]]
+    df[numeric] = df[numeric].apply(pd.to_numeric, errors="coerce")
+    for c in [c for c in OBJECT_COLUMNS if c in df.columns]:
+        df[c] = df[c].where(df[c].notnull(), np.nan).astype(object)
+    if "formula" in df.columns:
+        df["formula"] = [
+            _decode_formula(f) if not pd.isnull(f) else np.nan for f in df["formula"]
+        ]
+    df.index = index.itertuples(index=False)
+    return df
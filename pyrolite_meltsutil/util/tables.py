@@ -47,6 +47,65 @@ def tuple_reindex(df, columns=["pressure", "temperature"]):
     return df
 
 
+def _experiment_steps(df):
+    """
+    Get the unique steps of the experiments within a table, sorted by step within
+    each experiment and indexed as the table.
+
+    Parameters
+    -----------
+    df : :class:`pandas.DataFrame`
+        Phase table, optionally for a number of experiments.
+
+    Returns
+    -------
+    keys : :class:`list`
+        Columns identifying individual steps (i.e. :code:`['experiment', 'step']`
+        for aggregate tables, and otherwise :code:`['step']`).
+    idx : :class:`pandas.DataFrame`
+        Table of the experiment steps, with pressures and temperatures.
+    """
+    keys = ["experiment", "step"] if "experiment" in df.columns else ["step"]
+    idx = df.loc[:, ["pressure", "temperature"] + keys].dropna()
+    idx = idx.drop_duplicates(subset=keys)
+    idx = idx.iloc[np.lexsort([idx[k].values for k in keys[::-1]]), :]
+    return keys, idx
+
+
+def _integrate_steps(values, frac, keys, idx):
+    """
+    Accumulate values over the steps of each experiment, for the steps of
+    fractional crystallisation experiments.
+
+    Parameters
+    -----------
+    values : :class:`numpy.ndarray`
+        Values for each step, without null values.
+    frac : :class:`bool` | :class:`dict` | :class:`pandas.Series`
+        Whether the experiments are fractional crystallisation experiments, either
+        for all experiments or indexed by experiment.
+    keys : :class:`list`
+        Columns identifying individual steps (see :func:`_experiment_steps`).
+    idx : :class:`pandas.DataFrame`
+        Table of the experiment steps (see :func:`_experiment_steps`).
+
+    Returns
+    -------
+    values : :class:`numpy.ndarray`
+        Integrated values.
+    frac : :class:`numpy.ndarray`
+        Boolean array indicating the steps which were integrated.
+    """
+    if isinstance(frac, (dict, pd.Series)):
+        frac = pd.Series(frac).loc[idx["experiment"].values].values
+    frac = np.broadcast_to(np.asarray(frac, dtype=bool), (idx.index.size,))
+    if frac.any():
+        groups = idx["experiment"].values if len(keys) > 1 else np.zeros(len(idx))
+        totals = pd.DataFrame(values).groupby(groups, sort=False).cumsum().values
+        values = np.where(frac[:, np.newaxis], totals, values)
+    return values, frac
+
+
 def integrate_solid_composition(df, frac=True):
     """
     Integrate solid compositions to return a 'cumulate' like
@@ -56,45 +115,49 @@ def integrate_solid_composition(df, frac=True):
     Parameters
     -----------
     df : :class:`pandas.DataFrame`
-        DataFrame to integrate.
-    frac : :class:`bool`
-        Whether the experiment is a fractional crystallisation experiment.
+        DataFrame to integrate. Aggregated tables (i.e. with an :code:`experiment`
+        column, see :func:`~pyrolite_meltsutil.tables.load.aggregate_tables`) are
+        integrated for each experiment.
+    frac : :class:`bool` | :class:`dict` | :class:`pandas.Series`
+        Whether the experiment is a fractional crystallisation experiment. For
+        aggregated tables, this can also be given for each experiment.
 
     Returns
     -----------
     df : :class:`pandas.DataFrame`
         DataFrame containing an integrated solid composition.
     """
-    assert not "experiment" in df.columns, "Designed for single tables."
+    keys, idx = _experiment_steps(df)
     slds = df.loc[df.phase == "solid", :]
-    idx = (
-        df.loc[:, ["pressure", "temperature", "step"]]
-        .dropna()
-        .drop_duplicates()
-        .sort_values("step")
+    # solids typically don't exist for part of the history, so they're merged onto
+    # the steps rather than selected with .loc[<index list>, :]
+    cumulate = idx.loc[:, keys].merge(
+        slds.drop(columns=["pressure", "temperature"]).drop_duplicates(subset=keys),
+        on=keys,
+        how="left",
     )
-    if frac:
-        cumulate = pd.DataFrame(columns=slds.columns, index=idx.index)
-        # solids typically don't exist for part of the history, so we need reindex here
-        # rather than .loc[<index list>, :]
-        cumulate["mass"] = np.nancumsum(slds["mass"].reindex(index=idx.index).values)
-
-        chem = slds.reindex(
-            index=idx.index,
-            columns=[
-                i for i in slds.pyrochem.list_compositional if i not in ["S", "H", "V"]
-            ],
-        )
-        chem = chem.apply(pd.to_numeric, errors="coerce")
-        increments = (
-            slds["mass"].reindex(index=idx.index).values[:, np.newaxis] * chem.values
-        )
-        cumulate[chem.columns] = np.nancumsum(increments, axis=1)
-        cumulate[["pressure", "temperature", "step"]] = slds.loc[
-            :, ["pressure", "temperature", "step"]
+    cumulate.index = idx.index
+    cumulate[["pressure", "temperature"]] = idx[["pressure", "temperature"]].values
+    cumulate = cumulate.reindex(columns=slds.columns)
+
+    chem = [i for i in cumulate.pyrochem.list_compositional if i not in ["S", "H", "V"]]
+    mass = pd.to_numeric(cumulate["mass"], errors="coerce").fillna(0).values
+    chem_values = cumulate[chem].apply(pd.to_numeric, errors="coerce").values
+    # integrate the mass of each component and the total mass, and normalise
+    increments = np.nan_to_num(mass[:, np.newaxis] * chem_values)
+    increments = np.hstack([increments, mass[:, np.newaxis]])
+    totals, frac = _integrate_steps(increments, frac, keys, idx)
+    if frac.any():
+        other = [
+            c
+            for c in cumulate.columns
+            if c not in ["pressure", "temperature", "mass"] + keys + chem
         ]
-    else:
-        cumulate = slds.reindex(index=idx.index)
+        cumulate.loc[frac, other] = np.nan  # e.g. thermodynamic variables
+        with np.errstate(invalid="ignore", divide="ignore"):
+            composition = totals[:, :-1] / totals[:, -1:]
+        cumulate.loc[frac, chem] = composition[frac]
+        cumulate.loc[frac, "mass"] = totals[frac, -1]
     cumulate.pyrochem.add_MgNo()
     return cumulate
 
@@ -108,46 +171,43 @@ def integrate_solid_proportions(df, frac=True):
     Parameters
     -----------
     df : :class:`pandas.DataFrame`
-        DataFrame to integrate.
-    frac : :class:`bool`
-        Whether the experiment is a fractional crystallisation experiment.
+        DataFrame to integrate. Aggregated tables (i.e. with an :code:`experiment`
+        column, see :func:`~pyrolite_meltsutil.tables.load.aggregate_tables`) are
+        integrated for each experiment.
+    frac : :class:`bool` | :class:`dict` | :class:`pandas.Series`
+        Whether the experiment is a fractional crystallisation experiment. For
+        aggregated tables, this can also be given for each experiment.
 
     Returns
     -----------
     df : :class:`pandas.DataFrame`
         DataFrame containing integrated solid phase proportions.
     """
-    assert not "experiment" in df.columns, "Designed for single tables."
-    # another dataframe for integrated minerals
-    phaseIDs = sorted(
-        [
-            pID
-            for pID in df.phaseID.unique()
-            if (not pd.isnull(pID)) and ("liquid" not in pID)
-        ]
-    )
-    idx = (
-        df.loc[:, ["pressure", "temperature", "step"]]
-        .dropna()
-        .drop_duplicates()
-        .sort_values("step")
-    )
-    # empty dataframe
-    mindf = pd.DataFrame(
-        columns=["pressure", "temperature", "step"] + phaseIDs, index=idx.index
+    keys, idx = _experiment_steps(df)
+    minerals = df.loc[
+        df.phaseID.notnull() & ~df.phaseID.astype(str).str.contains("liquid"),
+        keys + ["phaseID", "mass"],
+    ]
+    phaseIDs = sorted(minerals.phaseID.unique())
+    # table of phase masses for each step
+    masses = (
+        minerals.assign(mass=pd.to_numeric(minerals["mass"], errors="coerce"))
+        .groupby(keys + ["phaseID"])["mass"]
+        .sum(min_count=1)
+        .unstack("phaseID")
+        .reindex(columns=phaseIDs)
+        .reset_index()
     )
-    for p in phaseIDs:  # integrate cumulate mass per phase
-        # mindf should have all of the mineral index values
-        mindf.loc[df.loc[df.phaseID == p, "mass"].index.values, p] = df.loc[
-            df.phaseID == p, "mass"
-        ].values
-    mindf = mindf.loc[idx.index, :]  # sort index
-    if frac:
-        mindf = mindf.apply(np.nancumsum, axis=0)  # accumulate minerals
-    # fractioal mass of total cumulate
-    mindf = mindf.div(mindf.sum(axis=1).replace(0, np.nan), axis=0) * 100.0
-    PTS = idx
-    mindf.loc[idx.index, ["pressure", "temperature", "step"]] = PTS
-
-    mindf = mindf.fillna(0)
+    masses = idx.loc[:, keys].merge(masses, on=keys, how="left")
+    values = np.nan_to_num(masses[phaseIDs].values.astype(float))
+    values, _ = _integrate_steps(values, frac, keys, idx)  # accumulate minerals
+    # fractional mass of total cumulate
+    totals = values.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        values = np.where(totals[:, np.newaxis] > 0, values / totals[:, None], 0) * 100
+
+    columns = ["experiment"] if len(keys) > 1 else []
+    columns += ["pressure", "temperature", "step"]
+    mindf = pd.DataFrame(values, columns=phaseIDs, index=idx.index)
+    mindf = pd.concat([idx.loc[:, columns], mindf], axis=1)
     return mindf
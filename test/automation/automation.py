@@ -1,13 +1,33 @@
 import io
+import os
+import asyncio
+import time
+import stat
+import shutil
+import psutil
 import unittest
+import unittest.mock
+import concurrent.futures
 import pandas as pd
 from pyrolite.util.pd import to_numeric
 from pyrolite.util.general import temp_path, remove_tempdir
 from pyrolite.geochem.norm import get_reference_composition
 
 from pyrolite_meltsutil.env import MELTS_Env
-from pyrolite_meltsutil.automation import MeltsProcess, MeltsExperiment, MeltsBatch
+from pyrolite.util.multip import combine_choices
+from pyrolite_meltsutil.automation import (
+    MeltsProcess,
+    MeltsExperiment,
+    MeltsBatch,
+    iter_choices,
+    run_experiment,
+)
+from pyrolite_meltsutil.automation import session
 from pyrolite_meltsutil.automation.org import make_meltsfolder
+from pyrolite_meltsutil.automation.results import ResultStore
+from pyrolite_meltsutil.automation.telemetry import METRICS
+from pyrolite_meltsutil.tables.load import aggregate_tables
+from pyrolite_meltsutil.tables.archive import pack_batch, close_archives
 from pyrolite_meltsutil.util.general import get_local_example, check_perl
 import logging
 
@@ -27,6 +47,19 @@ with open(str(get_local_example("Morb.melts"))) as f:
     MELTSFILE = f.read()
 
 
+class TestIterChoices(unittest.TestCase):
+    def test_default(self):
+        for choices in [
+            {},
+            {"A": [1, 2]},
+            {"A": [1, 2, 1], "B": [None, "x"]},
+            {"A": [1, 2], "B": ["x", "y", None], "C": [[0], [1]], "D": [None, 3]},
+            {"A": [5000, 5000.0], "B": [[1], [1.0], True, 1, "x"]},  # equal values
+        ]:
+            with self.subTest(choices=choices):
+                self.assertEqual(list(iter_choices(choices)), combine_choices(choices))
+
+
 @unittest.skipIf(not check_perl(), "Perl is not installed.")
 class TestMeltsProcess(unittest.TestCase):
     def setUp(self):
@@ -54,6 +87,50 @@ class TestMeltsProcess(unittest.TestCase):
         process.write([3, 1, 4], wait=True, log=False)
         process.terminate()
 
+    def test_metrics(self):
+        title = "TestMeltsProcess"
+        folder = make_meltsfolder(
+            name=title,
+            meltsfile=self.meltsfile,
+            title=title,
+            env=self.env,
+            indir=self.fromdir,
+        )
+        process = MeltsProcess(
+            meltsfile="{}.melts".format(title),
+            env="environment.txt",
+            fromdir=str(folder),
+        )
+        process.write([3, 1, 4], wait=True, log=False)
+        process.terminate()
+        metrics = process.metrics
+        self.assertEqual(set(metrics.keys()), set(METRICS))
+        self.assertGreater(metrics["stdout_bytes"], 0)
+        self.assertGreater(metrics["peak_rss"], 0)
+        self.assertGreater(metrics["compute_time"], 0)
+        self.assertEqual(metrics["exit_reason"], "completed")
+
+    def test_wait_modes(self):
+        for mode in ["prompt", "poll"]:
+            with self.subTest(mode=mode):
+                title = "TestMeltsProcess" + mode
+                folder = make_meltsfolder(
+                    name=title,
+                    meltsfile=self.meltsfile,
+                    title=title,
+                    env=self.env,
+                    indir=self.fromdir,
+                )
+                process = MeltsProcess(
+                    meltsfile="{}.melts".format(title),
+                    env="environment.txt",
+                    fromdir=str(folder),
+                    wait_mode=mode,
+                )
+                process.write([3, 1, 4], wait=True, log=False)
+                process.terminate()
+                self.assertTrue((folder / "System_main_tbl.txt").exists())
+
     def tearDown(self):
         if self.fromdir.exists():
             try:
@@ -62,6 +139,100 @@ class TestMeltsProcess(unittest.TestCase):
                 pass
 
 
+@unittest.skipIf(os.name != "posix", "Requires a POSIX shell.")
+class TestMeltsProcessWatchdog(unittest.TestCase):
+    def setUp(self):
+        self.fromdir = temp_path() / ("testmelts" + self.__class__.__name__)
+        self.fromdir.mkdir(parents=True, exist_ok=True)
+
+    def _executable(self, script):
+        # stand-in for an alphaMELTS executable which hangs
+        path = self.fromdir / "hang.command"
+        with open(str(path), "w") as f:
+            f.write("#!/bin/sh\n" + script)
+        path.chmod(path.stat().st_mode | stat.S_IEXEC)
+        return path
+
+    def test_wall_clock(self):
+        executable = self._executable("echo partial\nsleep 1000 &\nsleep 1000\n")
+        process = MeltsProcess(
+            executable=executable,
+            env=None,
+            fromdir=str(self.fromdir),
+            timeout=2.0,
+            watchdog_interval=0.1,
+        )
+        deadline = time.time() + 10
+        children = []
+        while len(children) < 2 and time.time() < deadline:  # both sleeps started
+            children = psutil.Process(process.process.pid).children(recursive=True)
+            time.sleep(0.05)
+        self.assertTrue(children)
+        while process.process.poll() is None and time.time() < deadline:
+            time.sleep(0.1)
+        self.assertEqual(process.exit_reason, "timed-out")
+        self.assertEqual(process.timeout_limit, "wall-clock")
+        self.assertFalse(
+            any(p.is_running() and p.status() != "zombie" for p in children)
+        )
+        with open(str(self.fromdir / "timeout_output.txt")) as f:
+            self.assertIn("partial", f.read())
+        process.terminate()
+
+    def test_cpu_time(self):
+        executable = self._executable("while :; do :; done\n")
+        process = MeltsProcess(
+            executable=executable,
+            env=None,
+            fromdir=str(self.fromdir),
+            timeout=30.0,
+            cpu_timeout=0.5,
+            watchdog_interval=0.1,
+        )
+        process.wait(step=0.1, idle_timeout=10.0)
+        self.assertEqual(process.exit_reason, "timed-out")
+        self.assertEqual(process.timeout_limit, "cpu-time")
+        process.terminate()
+
+    def test_timeout_while_writing(self):
+        executable = self._executable("sleep 1000\n")
+
+        class PendingStdin(object):
+            def __init__(self, process):
+                self.process, self.stdin = process, process.stdin
+
+            def write(self, msg):  # the watchdog kills the process while pending
+                self.process.wait(timeout=10)
+                return self.stdin.write(msg)
+
+            def __getattr__(self, name):
+                return getattr(self.stdin, name)
+
+        class PendingWrite(MeltsProcess):
+            def __init__(self, **kwargs):
+                kwargs.update(
+                    executable=executable, wait_mode="sleep", watchdog_interval=0.1
+                )
+                super().__init__(**kwargs)
+
+            def start(self):
+                super().start()
+                self.process.stdin = PendingStdin(self.process)
+                return self.process
+
+        with unittest.mock.patch(
+            "pyrolite_meltsutil.automation.MeltsProcess", PendingWrite
+        ):
+            result = run_experiment(
+                "0123456789", "test", MELTSFILE, str(ENV), self.fromdir, timeout=1.0
+            )
+        self.assertEqual(result["status"], "timed-out")
+        self.assertIn("wall-clock", result["message"])
+
+    def tearDown(self):
+        remove_tempdir(self.fromdir)
+
+
 @unittest.skipIf(not check_perl(), "Perl is not installed.")
 class TestMeltsExperiment(unittest.TestCase):
     def setUp(self):
@@ -141,6 +312,418 @@ class TestMeltsBatch(unittest.TestCase):
         )
         batch.run()
 
+    def test_workers(self):
+        batch = MeltsBatch(
+            self.df,
+            default_config={
+                "Initial Pressure": 7000,
+                "Initial Temperature": 1400,
+                "Final Temperature": 800,
+                "modes": ["isobaric"],
+            },
+            config_grid={"Initial Pressure": [5000, 7000]},
+            env=self.env,
+            fromdir=self.fromdir,
+            logger=logger,
+        )
+        batch.run(workers=2)
+        self.assertEqual(set(batch.results.keys()), set(batch.experiments.keys()))
+        for h in batch.experiments:
+            self.assertTrue((self.fromdir / h).exists())
+
+    def test_arun(self):
+        batch = MeltsBatch(
+            self.df,
+            default_config={
+                "Initial Pressure": 7000,
+                "Initial Temperature": 1400,
+                "Final Temperature": 800,
+                "modes": ["isobaric"],
+            },
+            config_grid={"Initial Pressure": [5000, 7000]},
+            env=self.env,
+            fromdir=self.fromdir,
+            logger=logger,
+        )
+        asyncio.run(batch.arun(concurrency=2))
+        self.assertEqual(set(batch.results.keys()), set(batch.experiments.keys()))
+        for h in batch.experiments:
+            self.assertTrue((self.fromdir / h / "System_main_tbl.txt").exists())
+        self.assertTrue(
+            all(r["state"] == "done" for r in batch.ledger.records.values())
+        )
+
+    def test_staging(self):
+        batch = MeltsBatch(
+            self.df,
+            default_config={
+                "Initial Pressure": 7000,
+                "Initial Temperature": 1400,
+                "Final Temperature": 800,
+                "modes": ["isobaric"],
+            },
+            config_grid={"Initial Pressure": [5000]},
+            env=self.env,
+            fromdir=self.fromdir,
+            logger=logger,
+        )
+        staging = self.fromdir / "scratch"
+        batch.run(staging=staging, cache_tables=True)
+        for h in batch.experiments:
+            self.assertTrue((self.fromdir / h / "System_main_tbl.txt").exists())
+        self.assertEqual(list(staging.iterdir()), [])
+
+    def test_pack(self):
+        batch = MeltsBatch(
+            self.df,
+            default_config={
+                "Initial Pressure": 7000,
+                "Initial Temperature": 1400,
+                "Final Temperature": 800,
+                "modes": ["isobaric"],
+            },
+            config_grid={"Initial Pressure": [5000]},
+            env=self.env,
+            fromdir=self.fromdir,
+            logger=logger,
+        )
+        batch.run(pack=True)
+        for h in batch.experiments:
+            self.assertFalse((self.fromdir / h).exists())
+            self.assertTrue((self.fromdir / (h + ".zip")).exists())
+        system, phases = aggregate_tables(self.fromdir)
+        self.assertEqual(
+            sorted(system.experiment.unique()), sorted(batch.experiments.keys())
+        )
+
+    def test_lazy(self):
+        kwargs = dict(
+            default_config={
+                "Initial Pressure": 7000,
+                "Initial Temperature": 1400,
+                "Final Temperature": 800,
+                "modes": ["isobaric"],
+            },
+            config_grid={"Initial Pressure": [5000, 7000, 5000]},
+            env=self.env,
+            fromdir=self.fromdir,
+            logger=logger,
+        )
+        batch = MeltsBatch(self.df, **kwargs)
+        lazy = MeltsBatch(self.df, lazy=True, **kwargs)
+        self.assertIsNone(lazy.experiments)
+        self.assertGreaterEqual(len(lazy), len(batch))  # an upper bound
+        self.assertEqual(
+            [h for h, _ in lazy.iter_experiments()], list(batch.experiments.keys())
+        )
+        lazy.run(workers=2)
+        self.assertEqual(set(lazy.results.keys()), set(batch.experiments.keys()))
+
+    def test_env_grid(self):
+        batch = MeltsBatch(
+            self.df,
+            default_config={
+                "Initial Pressure": 7000,
+                "Initial Temperature": 1400,
+                "Final Temperature": 800,
+                "modes": ["isobaric"],
+            },
+            config_grid={
+                "DELTAT": [-10, -20, -20.0],  # -10 is that of the batch env
+                "ALPHAMELTS_VERSION": ["MELTS", "pMELTS"],
+            },
+            env=self.env,
+            fromdir=self.fromdir,
+            logger=logger,
+        )
+        self.assertEqual(len(batch.experiments), 4 * len(self.df))
+        envs = {id(env): env for _, _, env in batch.experiments.values()}
+        self.assertEqual(len(envs), 4)  # one for each unique set of variables
+        self.assertIn(id(self.env), envs)
+        self.assertEqual(
+            sorted((e.dump()["DELTAT"], e.dump()["VERSION"]) for e in envs.values()),
+            [(-20.0, "MELTS"), (-20.0, "pMELTS"), (-10.0, "MELTS"), (-10.0, "pMELTS")],
+        )
+        self.assertEqual(self.env.dump()["DELTAT"], -10)
+        # experiments with the batch env retain the meltsfile-only hash
+        nogrid = MeltsBatch(
+            self.df,
+            default_config=batch.default,
+            env=self.env,
+            fromdir=self.fromdir,
+            logger=logger,
+        )
+        self.assertTrue(set(nogrid.experiments) <= set(batch.experiments))
+        batch.run(workers=2)
+        for hsh, (_, _, env) in batch.experiments.items():
+            with open(str(self.fromdir / hsh / "environment.txt")) as f:
+                self.assertEqual(f.read(), env.to_envfile(unset_variables=False))
+
+    def test_hash_decimals(self):
+        df = self.df.assign(Title="MORB")
+        df.loc[1, "SiO2"] += 1e-12  # e.g. from renormalisation
+        kwargs = dict(env=self.env, fromdir=self.fromdir, logger=logger, lazy=True)
+        batch = MeltsBatch(df, **kwargs)
+        self.assertEqual(len(list(batch.iter_experiments())), 2)
+        batch = MeltsBatch(df, hash_decimals=6, **kwargs)
+        self.assertEqual(len(list(batch.iter_experiments())), 1)
+
+    def test_equal_configs(self):
+        grid = {"Initial Pressure": [5000, 5000.0]}  # configurations compare equal
+        for lazy in [False, True]:
+            with self.subTest(lazy=lazy):
+                batch = MeltsBatch(
+                    self.df,
+                    config_grid=grid,
+                    env=self.env,
+                    fromdir=self.fromdir,
+                    logger=logger,
+                    lazy=lazy,
+                )
+                self.assertEqual(len(list(batch.iter_configs())), 1)
+
+    def test_estimate_duration(self):
+        kwargs = dict(
+            default_config={
+                "Initial Pressure": 7000,
+                "Initial Temperature": 1400,
+                "Final Temperature": 800,
+                "modes": ["isobaric"],
+            },
+            config_grid={"Log fO2 Delta": [-1, 0]},
+            env=self.env,
+            fromdir=self.fromdir,
+            logger=logger,
+        )
+        batch = MeltsBatch(self.df, **kwargs)
+        self.assertGreater(batch.estimate_duration(), 0)
+        self.assertLess(batch.estimate_duration(workers=2), batch.estimate_duration())
+        batch.run()
+        # calibrated from the ledger of the previous run
+        batch = MeltsBatch(self.df, **kwargs)
+        self.assertEqual(batch.estimator.n_records, len(batch))
+        lazy = MeltsBatch(self.df, lazy=True, **kwargs)
+        self.assertAlmostEqual(lazy.estimate_duration(), batch.estimate_duration())
+
+    def test_schedule(self):
+        batch = MeltsBatch(
+            self.df,
+            default_config={
+                "Initial Pressure": 7000,
+                "Initial Temperature": 1400,
+                "Final Temperature": 800,
+                "modes": ["isobaric"],
+            },
+            config_grid={"Log fO2 Delta": [-1, 0]},
+            env=self.env,
+            fromdir=self.fromdir,
+            logger=logger,
+        )
+        last = list(batch.experiments)[-1]
+        batch.run(schedule="interleave", priority={last: -1})
+        self.assertEqual(list(batch.results)[0], last)
+        self.assertEqual(set(batch.results), set(batch.experiments))
+
+    def test_sessions(self):
+        batch = MeltsBatch(
+            self.df,
+            default_config={
+                "Initial Pressure": 7000,
+                "Initial Temperature": 1400,
+                "Final Temperature": 800,
+                "modes": ["isobaric"],
+            },
+            config_grid={"Initial Pressure": [5000]},
+            env=self.env,
+            fromdir=self.fromdir,
+            logger=logger,
+        )
+        batch.run(sessions=True)
+        for h in batch.experiments:
+            self.assertTrue((self.fromdir / h / "System_main_tbl.txt").exists())
+        metrics = batch.metrics
+        self.assertEqual(set(metrics.index), set(batch.experiments))
+        self.assertTrue(metrics.stdout_bytes.gt(0).all())
+
+    def test_sessions_threaded(self):
+        batch = MeltsBatch(
+            self.df,
+            default_config={
+                "Initial Pressure": 7000,
+                "Initial Temperature": 1400,
+                "Final Temperature": 800,
+                "modes": ["isobaric"],
+            },
+            config_grid={"Initial Pressure": [5000, 7000]},
+            env=self.env,
+            fromdir=self.fromdir,
+            logger=logger,
+        )
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+            batch.run(executor=executor, sessions=True)
+        self.assertTrue(all(r["status"] == "done" for r in batch.results.values()))
+        for h in batch.experiments:
+            self.assertTrue((self.fromdir / h / "System_main_tbl.txt").exists())
+        self.assertFalse(session._sessions)  # closed once the batch is run
+
+    def test_metrics(self):
+        batch = MeltsBatch(
+            self.df,
+            default_config={
+                "Initial Pressure": 7000,
+                "Initial Temperature": 1400,
+                "Final Temperature": 800,
+                "modes": ["isobaric"],
+            },
+            config_grid={"Initial Pressure": [5000]},
+            env=self.env,
+            fromdir=self.fromdir,
+            logger=logger,
+        )
+        batch.run(workers=2)
+        self.assertTrue((self.fromdir / "meltsBatchMetrics.jsonl").exists())
+        metrics = batch.metrics
+        self.assertEqual(set(metrics.index), set(batch.experiments))
+        for m in METRICS:
+            self.assertIn(m, metrics.columns)
+        self.assertTrue((metrics.exit_reason == "completed").all())
+        self.assertTrue(metrics.peak_rss.gt(0).all())
+
+    def test_resume(self):
+        batch = MeltsBatch(
+            self.df,
+            default_config={
+                "Initial Pressure": 7000,
+                "Initial Temperature": 1400,
+                "Final Temperature": 800,
+                "modes": ["isobaric"],
+            },
+            config_grid={"Initial Pressure": [5000]},
+            env=self.env,
+            fromdir=self.fromdir,
+            logger=logger,
+        )
+        batch.run()
+        self.assertTrue((self.fromdir / "meltsBatchLedger.jsonl").exists())
+        h = list(batch.experiments.keys())[0]
+        batch.ledger.update(h, "running")  # e.g. interrupted
+        batch.run()
+        self.assertEqual(list(batch.results.keys()), [h])
+        self.assertEqual(batch.ledger.state(h), "done")
+
+    def test_resume_packed(self):
+        kwargs = dict(
+            default_config={
+                "Initial Pressure": 7000,
+                "Initial Temperature": 1400,
+                "Final Temperature": 800,
+                "modes": ["isobaric"],
+            },
+            config_grid={"Initial Pressure": [5000]},
+            env=self.env,
+            fromdir=self.fromdir,
+            logger=logger,
+        )
+        batch = MeltsBatch(self.df, **kwargs)
+        batch.run()
+        for shard_size in [None, 2]:
+            with self.subTest(shard_size=shard_size):
+                archives = pack_batch(self.fromdir, shard_size=shard_size)
+                self.assertTrue(archives)
+                ledger = self.fromdir / "meltsBatchLedger.jsonl"
+                if ledger.exists():  # without records (e.g. from previous versions)
+                    ledger.unlink()
+                batch = MeltsBatch(self.df, **kwargs)
+                batch.run()
+                self.assertEqual(batch.results, {})
+                close_archives()
+                for archive in archives:  # restore the folders for the next pack
+                    shutil.unpack_archive(
+                        str(archive),
+                        (
+                            str(self.fromdir / archive.name.split(".")[0])
+                            if shard_size is None
+                            else str(self.fromdir)
+                        ),
+                    )
+                    archive.unlink()
+
+    def test_result_store(self):
+        kwargs = dict(
+            default_config={
+                "Initial Pressure": 7000,
+                "Initial Temperature": 1400,
+                "Final Temperature": 800,
+                "modes": ["isobaric"],
+            },
+            env=self.env,
+            logger=logger,
+        )
+        store = ResultStore(self.fromdir / "store")
+        (self.fromdir / "a").mkdir()
+        batch = MeltsBatch(self.df, fromdir=self.fromdir / "a", **kwargs)
+        batch.run(result_store=store)
+        # the compositions differ only by title, and are run once
+        self.assertEqual(store.report()["added"], 1)
+        self.assertEqual(store.report()["hits"], len(batch.experiments) - 1)
+        # the same experiments with different titles, for another project
+        df = self.df.assign(Title=["Other{}".format(i) for i in self.df.index])
+        (self.fromdir / "b").mkdir()
+        other = MeltsBatch(df, fromdir=self.fromdir / "b", **kwargs)
+        other.run(result_store=store)
+        self.assertEqual(store.report()["added"], 1)
+        self.assertEqual(store.report()["misses"], 1)
+        self.assertTrue(all(r.get("shared") for r in other.results.values()))
+        for hsh, (title, _, _) in other.experiments.items():
+            self.assertEqual(other.ledger.state(hsh), "done")
+            self.assertTrue((self.fromdir / "b" / hsh / (title + ".melts")).exists())
+        _system, _phases = aggregate_tables(self.fromdir / "b")
+        system, phases = aggregate_tables(self.fromdir / "a")
+        self.assertEqual(len(_system), len(system))
+        self.assertEqual(len(_phases), len(phases))
+
+    def test_cache_tables(self):
+        batch = MeltsBatch(
+            self.df,
+            default_config={
+                "Initial Pressure": 7000,
+                "Initial Temperature": 1400,
+                "Final Temperature": 800,
+                "modes": ["isobaric"],
+            },
+            config_grid={"Initial Pressure": [5000]},
+            env=self.env,
+            fromdir=self.fromdir,
+            logger=logger,
+        )
+        batch.run(cache_tables=True)
+        for h in batch.experiments:
+            self.assertTrue((self.fromdir / h / "meltsTablesCache.npz").exists())
+
+    def test_store(self):
+        batch = MeltsBatch(
+            self.df,
+            default_config={
+                "Initial Pressure": 7000,
+                "Initial Temperature": 1400,
+                "Final Temperature": 800,
+                "modes": ["isobaric"],
+            },
+            config_grid={"Initial Pressure": [5000]},
+            env=self.env,
+            fromdir=self.fromdir,
+            logger=logger,
+        )
+        batch.run(store=True, keep_folders=False)
+        self.assertTrue((self.fromdir / "meltsBatchStore.sqlite").exists())
+        for h in batch.experiments:
+            self.assertIn(h, batch.store)
+            self.assertFalse((self.fromdir / h).exists())
+        system, phases = batch.store.load()
+        self.assertEqual(
+            sorted(system.experiment.unique()), sorted(batch.experiments.keys())
+        )
+
     def tearDown(self):
         if self.fromdir.exists():
             try:
@@ -0,0 +1,134 @@
+import os
+import stat
+import asyncio
+import unittest
+from pyrolite.util.general import temp_path, remove_tempdir
+from pyrolite_meltsutil.env import MELTS_Env
+from pyrolite_meltsutil.parse import read_envfile
+from pyrolite_meltsutil.automation.aio import AsyncMeltsProcess, arun_experiment
+from pyrolite_meltsutil.automation.org import make_meltsfolder
+from pyrolite_meltsutil.automation.telemetry import METRICS
+from pyrolite_meltsutil.util.general import get_local_example, check_perl
+import logging
+
+logger = logging.Logger(__name__)
+
+ENV = MELTS_Env()
+ENV.VERSION = "MELTS"
+ENV.MODE = "isobaric"
+ENV.MINP = 2000
+ENV.MAXP = 10000
+ENV.MINT = 500
+ENV.MAXT = 1500
+ENV.DELTAT = -10
+ENV.DELTAP = 0
+
+with open(str(get_local_example("Morb.melts"))) as f:
+    MELTSFILE = f.read()
+
+
+@unittest.skipIf(not check_perl(), "Perl is not installed.")
+class TestAsyncMeltsProcess(unittest.TestCase):
+    def setUp(self):
+        self.fromdir = temp_path() / ("testmelts" + self.__class__.__name__)
+        self.fromdir.mkdir(parents=True, exist_ok=True)
+
+    def test_default(self):
+        title = "TestAsyncMeltsProcess"
+        folder = make_meltsfolder(
+            name=title, meltsfile=MELTSFILE, title=title, env=ENV, indir=self.fromdir
+        )
+
+        async def run():
+            async with AsyncMeltsProcess(
+                meltsfile="{}.melts".format(title),
+                env="environment.txt",
+                fromdir=str(folder),
+            ) as process:
+                await process.write([3, 1, 4])
+            return process
+
+        process = asyncio.run(run())
+        self.assertTrue((folder / "System_main_tbl.txt").exists())
+        self.assertIsNotNone(process.process.returncode)
+        metrics = process.metrics
+        self.assertEqual(set(metrics.keys()), set(METRICS))
+        self.assertGreater(metrics["stdout_bytes"], 0)
+        self.assertEqual(metrics["exit_reason"], "completed")
+
+    def test_concurrent(self):
+        env, _ = read_envfile(ENV, unset_variables=False)
+
+        async def run():
+            return await asyncio.gather(
+                *[
+                    arun_experiment(
+                        "exp{}".format(ix),
+                        "exp{}".format(ix),
+                        MELTSFILE,
+                        env,
+                        self.fromdir,
+                    )
+                    for ix in range(3)
+                ]
+            )
+
+        results = asyncio.run(run())
+        self.assertTrue(all(r["status"] == "done" for r in results))
+        for ix in range(3):
+            self.assertTrue(
+                (self.fromdir / "exp{}".format(ix) / "System_main_tbl.txt").exists()
+            )
+
+    def tearDown(self):
+        remove_tempdir(self.fromdir)
+
+
+@unittest.skipIf(os.name != "posix", "Requires a POSIX shell.")
+class TestAsyncMeltsProcessWatchdog(unittest.TestCase):
+    def setUp(self):
+        self.fromdir = temp_path() / ("testmelts" + self.__class__.__name__)
+        self.fromdir.mkdir(parents=True, exist_ok=True)
+
+    def _executable(self, script):
+        # stand-in for an alphaMELTS executable which hangs
+        path = self.fromdir / "hang.command"
+        with open(str(path), "w") as f:
+            f.write("#!/bin/sh\n" + script)
+        path.chmod(path.stat().st_mode | stat.S_IEXEC)
+        return path
+
+    def _run(self, executable, **kwargs):
+        async def run():
+            async with AsyncMeltsProcess(
+                executable=executable,
+                env=None,
+                fromdir=str(self.fromdir),
+                watchdog_interval=0.1,
+                **kwargs
+            ) as process:
+                await process.wait_for_prompt(step=0.1, idle_timeout=10.0)
+            return process
+
+        return asyncio.run(asyncio.wait_for(run(), timeout=20.0))
+
+    def test_wall_clock(self):
+        executable = self._executable("echo partial\nsleep 1000 &\nsleep 1000\n")
+        process = self._run(executable, timeout=2.0, idle_timeout=10.0)
+        self.assertEqual(process.exit_reason, "timed-out")
+        self.assertEqual(process.timeout_limit, "wall-clock")
+        with open(str(self.fromdir / "timeout_output.txt")) as f:
+            self.assertIn("partial", f.read())
+
+    def test_cpu_time(self):
+        executable = self._executable("while :; do :; done\n")
+        process = self._run(executable, timeout=30.0, cpu_timeout=0.5)
+        self.assertEqual(process.exit_reason, "timed-out")
+        self.assertEqual(process.timeout_limit, "cpu-time")
+
+    def tearDown(self):
+        remove_tempdir(self.fromdir)
+
+
+if __name__ == "__main__":
+    unittest.main()
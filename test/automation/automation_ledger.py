@@ -0,0 +1,62 @@
+import unittest
+from pyrolite.util.general import temp_path, remove_tempdir
+from pyrolite_meltsutil.automation.ledger import RunLedger
+import logging
+
+logger = logging.Logger(__name__)
+
+
+class TestRunLedger(unittest.TestCase):
+    def setUp(self):
+        self.dir = temp_path() / ("testmelts" + self.__class__.__name__)
+        self.dir.mkdir(parents=True)
+        self.hashes = ["a", "b", "c", "d", "e"]
+
+    def test_default(self):
+        ledger = RunLedger(self.dir)
+        self.assertEqual(ledger.path, self.dir / "meltsBatchLedger.jsonl")
+        for h in self.hashes:
+            ledger.update(h, "pending", title=h.upper())
+        self.assertEqual(ledger.pending(self.hashes), self.hashes)
+
+    def test_resume(self):
+        ledger = RunLedger(self.dir)
+        for h, state in zip(
+            self.hashes, ["pending", "running", "done", "failed", "timed-out"]
+        ):
+            ledger.update(h, state, duration=1.0)
+        # reload from file
+        ledger = RunLedger(self.dir)
+        self.assertEqual(ledger.state("c"), "done")
+        self.assertEqual(ledger.attempts("b"), 0)  # interrupted, not an attempt
+        self.assertEqual(ledger.attempts("d"), 1)
+        self.assertEqual(ledger.pending(self.hashes), ["a", "b"])
+
+    def test_retry_policy(self):
+        ledger = RunLedger(self.dir)
+        ledger.update("d", "failed")
+        ledger.update("e", "timed-out")
+        self.assertEqual(ledger.pending(["d", "e"], max_attempts=2), ["d", "e"])
+        self.assertEqual(
+            ledger.pending(["d", "e"], max_attempts={"failed": 2, "timed-out": 1}),
+            ["d"],
+        )
+        ledger.update("d", "failed")
+        self.assertEqual(ledger.attempts("d"), 2)
+        self.assertEqual(ledger.pending(["d", "e"], max_attempts=2), ["e"])
+
+    def test_to_frame(self):
+        ledger = RunLedger(self.dir)
+        for h in self.hashes:
+            ledger.update(h, "done", duration=1.0, reason="completed")
+        df = ledger.to_frame()
+        self.assertEqual(list(df.index), self.hashes)
+        self.assertTrue((df.state == "done").all())
+
+    def tearDown(self):
+        if self.dir.exists():
+            remove_tempdir(self.dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
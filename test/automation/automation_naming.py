@@ -1,5 +1,12 @@
 import unittest
-from pyrolite_meltsutil.automation.naming import exp_hash, exp_name
+import numpy as np
+import pandas as pd
+from pyrolite_meltsutil.automation.naming import (
+    exp_hash,
+    exp_hashes,
+    exp_name,
+    canonical_value,
+)
 from pyrolite_meltsutil.util.general import get_data_example
 from pyrolite_meltsutil.tables.load import import_batch_config
 import logging
@@ -23,6 +30,94 @@ class TestExpHash(unittest.TestCase):
         for k, c in self.exps.items():
             self.assertTrue(k == exp_hash(c))
 
+    def test_canonical(self):
+        cfg = {"SiO2": 50.0, "Log fO2 Delta": None, "modes": ["isobaric"]}
+        self.assertEqual(exp_hash(cfg), exp_hash({**cfg, "Log fO2 Delta": pd.NA}))
+        self.assertEqual(exp_hash(cfg), exp_hash(dict(reversed(list(cfg.items())))))
+        self.assertEqual(exp_hash(cfg), exp_hash({**cfg, "SiO2": np.float64(50.0)}))
+        self.assertEqual(canonical_value({1: {"b", "a"}}), {"1": ["a", "b"]})
+
+    def test_legacy(self):
+        # NaN and negative zeros are hashed as for previous versions by default
+        legacy = [
+            ({"a": float("nan")}, "f8ab86dfca"),
+            ({"a": -0.0}, "3cc7ee299a"),
+            ({"MgO": -0.0, "SiO2": [0.0, -0.0]}, "4b8847035f"),
+        ]
+        for cfg, expect in legacy:
+            with self.subTest(cfg=cfg):
+                self.assertEqual(exp_hash(cfg), expect)
+        configs = [cfg for cfg, _ in legacy] + [{"a": 0.0}, {"a": np.nan}]
+        self.assertEqual(list(exp_hashes(configs)), [exp_hash(cfg) for cfg in configs])
+        # where rounded, these are hashed as null values and zeros respectively
+        cfg = {"MgO": 0.0, "Log fO2 Delta": None}
+        self.assertEqual(
+            exp_hash(cfg, decimals=6),
+            exp_hash({"MgO": -0.0, "Log fO2 Delta": np.nan}, decimals=6),
+        )
+
+    def test_decimals(self):
+        a, b = {"SiO2": 0.1 + 0.2}, {"SiO2": 0.3}
+        self.assertNotEqual(exp_hash(a), exp_hash(b))
+        self.assertEqual(exp_hash(a, decimals=6), exp_hash(b, decimals=6))
+        cfg = {"Initial Pressure": 5000, "Increment Temperature": -5.0, "MgO": 8.25}
+        self.assertEqual(exp_hash(cfg), exp_hash(cfg, decimals=6))  # unchanged
+
+
+class TestExpHashes(unittest.TestCase):
+    def setUp(self):
+        self.exps = {
+            k: c
+            for (k, (n, c, e)) in import_batch_config(
+                get_data_example("montecarlo")
+            ).items()
+        }
+        self.df = pd.DataFrame(
+            {
+                "Initial Pressure": [5000, 7000, 5000, 7000],
+                "SiO2": [50.0, 0.1 + 0.2, -0.0, np.nan],
+                "Title": ["a", None, "a", "\u00e9"],
+                "modes": [["isobaric"]] * 4,
+                "mixed": [1, 1.0, True, None],
+            }
+        )
+
+    def test_default(self):
+        df = pd.DataFrame(list(self.exps.values()))
+        self.assertEqual(list(exp_hashes(df)), list(self.exps.keys()))
+
+    def test_equivalent(self):
+        records = [  # null values within tables are missing keys
+            {k: v for k, v in r.items() if isinstance(v, list) or not pd.isnull(v)}
+            for r in self.df.to_dict("records")
+        ]
+        for kwargs in [{}, dict(decimals=4), dict(length=None)]:
+            with self.subTest(**kwargs):
+                expected = [exp_hash(r, **kwargs) for r in records]
+                self.assertEqual(list(exp_hashes(self.df, **kwargs)), expected)
+                self.assertEqual(list(exp_hashes(records, **kwargs)), expected)
+
+    def test_missing_keys(self):
+        configs = [
+            {"Initial Pressure": 5000, "Log fO2 Path": "FMQ"},
+            {"Initial Pressure": 7000},
+            {"Initial Pressure": 7000.0, "Log fO2 Path": None},
+        ]
+        expected = [exp_hash(c) for c in configs]
+        self.assertEqual(list(exp_hashes(configs)), expected)
+        # integers are restored for columns with missing values
+        df = pd.DataFrame(configs[:2] + [{"Log fO2 Path": "NNO"}])
+        self.assertEqual(df["Initial Pressure"].dtype.kind, "f")
+        self.assertEqual(
+            list(exp_hashes(df)),
+            expected[:2] + [exp_hash({"Log fO2 Path": "NNO"})],
+        )
+
+    def test_index(self):
+        df = self.df.set_index(pd.Index(list("wxyz")))
+        self.assertEqual(list(exp_hashes(df).index), list("wxyz"))
+        self.assertEqual(len(exp_hashes(df.iloc[:0])), 0)
+
 
 class TestExpName(unittest.TestCase):
     def setUp(self):
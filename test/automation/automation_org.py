@@ -1,9 +1,17 @@
 import io
+import os
+import time
 import unittest
+import unittest.mock
 import pandas as pd
 from pyrolite.util.general import temp_path, remove_tempdir
 from pyrolite_meltsutil.env import MELTS_Env
-from pyrolite_meltsutil.automation.org import make_meltsfolder
+from pyrolite_meltsutil.automation.org import (
+    make_meltsfolder,
+    commit_meltsfolder,
+    get_staging_dir,
+    remove_stale_scratch,
+)
 from pyrolite_meltsutil.util.general import get_local_example, check_perl
 import logging
 
@@ -35,10 +43,112 @@ class TestMakeMeltsFolder(unittest.TestCase):
             "MORB", "MORB", self.meltsfile, env=self.env, indir=self.indir
         )
 
+    def test_staging(self):
+        staging = self.indir / "scratch"
+        folder = make_meltsfolder(
+            "MORB",
+            "MORB",
+            self.meltsfile,
+            env=self.env,
+            indir=self.indir,
+            staging=staging,
+        )
+        self.assertEqual(folder.parent, staging)
+        self.assertFalse((self.indir / "MORB").exists())
+        target = commit_meltsfolder(folder, self.indir / "MORB")
+        self.assertEqual(target, self.indir / "MORB")
+        self.assertTrue((target / "MORB.melts").exists())
+        self.assertFalse(folder.exists())
+        # no partially committed folders are left behind
+        self.assertEqual(
+            sorted(p.name for p in self.indir.iterdir()), ["MORB", "scratch"]
+        )
+
+    def test_commit_replace(self):
+        (self.indir / "MORB").mkdir()
+        (self.indir / "MORB" / "stale.txt").touch()
+        folder = make_meltsfolder(
+            "MORB", "MORB", self.meltsfile, env=self.env, staging=self.indir / "tmp"
+        )
+        target = commit_meltsfolder(folder, self.indir / "MORB")
+        self.assertTrue((target / "MORB.melts").exists())
+        self.assertFalse((target / "stale.txt").exists())
+
+    def test_commit_failed(self):
+        (self.indir / "MORB").mkdir()
+        (self.indir / "MORB" / "previous.txt").touch()
+        folder = make_meltsfolder(
+            "MORB", "MORB", self.meltsfile, env=self.env, staging=self.indir / "tmp"
+        )
+        rename = os.rename
+
+        def failing_rename(src, dst):  # fail to rename the new folder into place
+            if src.endswith("staged"):
+                raise OSError("rename failed")
+            return rename(src, dst)
+
+        with unittest.mock.patch("os.rename", failing_rename):
+            with self.assertRaises(OSError):
+                commit_meltsfolder(folder, self.indir / "MORB")
+        # both the existing and new folders are kept
+        self.assertTrue((self.indir / "MORB" / "previous.txt").exists())
+        self.assertTrue((folder / "MORB.melts").exists())
+        self.assertEqual(sorted(p.name for p in self.indir.iterdir()), ["MORB", "tmp"])
+
+    def test_commit_permissions(self):
+        os.chmod(str(self.indir), 0o1777)  # e.g. a shared directory
+        folder = make_meltsfolder(
+            "MORB", "MORB", self.meltsfile, env=self.env, staging=self.indir / "tmp"
+        )
+        target = commit_meltsfolder(folder, self.indir / "MORB")
+        umask = os.umask(0o022)
+        os.umask(umask)
+        self.assertEqual(target.stat().st_mode & 0o7777, 0o777 & ~umask)
+
     def tearDown(self):
         if self.indir.exists():
             remove_tempdir(self.indir)
 
 
+class TestRemoveStaleScratch(unittest.TestCase):
+    def setUp(self):
+        self.indir = temp_path() / ("testmelts" + self.__class__.__name__)
+        self.indir.mkdir(parents=True)
+
+    def test_default(self):
+        for name in [".commitstale", ".commitrecent", ".sharedstale", "0123456789"]:
+            (self.indir / name / "staged").mkdir(parents=True)
+        old = time.time() - 2 * 86400
+        for name in [".commitstale", ".sharedstale", "0123456789"]:
+            os.utime(str(self.indir / name), (old, old))
+        removed = remove_stale_scratch(self.indir)
+        self.assertEqual(
+            sorted(p.name for p in removed), [".commitstale", ".sharedstale"]
+        )
+        self.assertEqual(
+            sorted(p.name for p in self.indir.iterdir()),
+            [".commitrecent", "0123456789"],
+        )
+
+    def test_missing(self):
+        self.assertEqual(remove_stale_scratch(self.indir / "missing"), [])
+
+    def tearDown(self):
+        if self.indir.exists():
+            remove_tempdir(self.indir)
+
+
+class TestGetStagingDir(unittest.TestCase):
+    def test_default(self):
+        staging = get_staging_dir(True)
+        self.assertTrue(staging.is_dir())
+
+    def test_path(self):
+        staging = temp_path() / "testmeltsstaging"
+        self.assertEqual(get_staging_dir(staging), staging)
+        self.assertTrue(staging.is_dir())
+        remove_tempdir(staging)
+
+
 if __name__ == "__main__":
     unittest.main()
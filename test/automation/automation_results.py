@@ -0,0 +1,131 @@
+import os
+import unittest
+from pyrolite.util.general import temp_path, remove_tempdir
+from pyrolite_meltsutil.env import MELTS_Env
+from pyrolite_meltsutil.automation.results import (
+    ResultStore,
+    result_key,
+    alphamelts_version,
+)
+from pyrolite_meltsutil.util.general import get_local_example
+import logging
+
+logger = logging.Logger(__name__)
+
+with open(str(get_local_example("Morb.melts"))) as f:
+    MELTSFILE = f.read()
+
+
+class TestResultKey(unittest.TestCase):
+    def setUp(self):
+        self.env = MELTS_Env()
+
+    def test_default(self):
+        key = result_key(MELTSFILE, self.env.to_envfile(), version="1.9")
+        self.assertEqual(len(key), 40)
+        self.assertEqual(key, result_key(MELTSFILE, self.env.to_envfile(), "1.9"))
+        self.assertNotEqual(key, result_key(MELTSFILE, self.env.to_envfile(), "2.0"))
+
+    def test_canonical(self):
+        key = result_key(MELTSFILE, self.env.to_envfile())
+        retitled = "\n".join(
+            ["Title: Other"]
+            + [l for l in MELTSFILE.splitlines() if not l.startswith("Title")]
+            + [""]
+        )
+        envfile = self.env.to_envfile(unset_variables=True)  # commented out
+        self.assertEqual(key, result_key(retitled, envfile))
+        env = self.env.copy()
+        env.DELTAT = -5
+        self.assertNotEqual(key, result_key(MELTSFILE, env.to_envfile()))
+
+    def test_options(self):
+        envfile = self.env.to_envfile()
+        self.assertNotEqual(
+            result_key(MELTSFILE, envfile, superliquidus_start=True),
+            result_key(MELTSFILE, envfile, superliquidus_start=False),
+        )
+
+
+class TestAlphameltsVersion(unittest.TestCase):
+    def test_missing(self):
+        self.assertIsNone(alphamelts_version(temp_path() / "missing.command"))
+
+
+class TestResultStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = temp_path() / ("testmelts" + self.__class__.__name__)
+        self.dir.mkdir(parents=True)
+        self.folder = self.dir / "batch" / "0123456789"
+        self.folder.mkdir(parents=True)
+        for name, content in [
+            ("Title.melts", MELTSFILE),
+            ("environment.txt", "ALPHAMELTS_DELTAT -10"),
+            ("System_main_tbl.txt", "Title: Title\n"),
+        ]:
+            with open(str(self.folder / name), "w") as f:
+                f.write(content)
+        self.store = ResultStore(self.dir / "store", version="1.9")
+        self.key = self.store.key(MELTSFILE, "ALPHAMELTS_DELTAT -10")
+
+    def test_add(self):
+        self.assertNotIn(self.key, self.store)
+        self.assertTrue(self.store.add(self.key, self.folder))
+        self.assertFalse(self.store.add(self.key, self.folder))  # already stored
+        stored = self.store.folder(self.key)
+        self.assertEqual(stored.parent.name, self.key[:2])
+        self.assertEqual(
+            sorted(p.name for p in stored.iterdir()),
+            ["System_main_tbl.txt", "environment.txt"],
+        )
+
+    def test_checkout(self):
+        target = self.dir / "other" / "9876543210"
+        self.assertFalse(self.store.checkout(self.key, target))
+        self.store.add(self.key, self.folder)
+        files = {"Other.melts": MELTSFILE, "environment.txt": "ALPHAMELTS_DELTAT -10 "}
+        self.assertTrue(self.store.checkout(self.key, target, files=files))
+        self.assertEqual(
+            sorted(p.name for p in target.iterdir()),
+            ["Other.melts", "System_main_tbl.txt", "environment.txt"],
+        )
+        # files are linked from the store, other than those written
+        stored = self.store.folder(self.key)
+        self.assertTrue(
+            os.path.samefile(
+                str(stored / "System_main_tbl.txt"), str(target / "System_main_tbl.txt")
+            )
+        )
+        with open(str(stored / "environment.txt")) as f:
+            self.assertEqual(f.read(), "ALPHAMELTS_DELTAT -10")
+        self.assertEqual(
+            [p.name for p in target.parent.iterdir()], ["9876543210"]
+        )  # no scratch folders remain
+
+    def test_copy(self):
+        store = ResultStore(self.dir / "store", version="1.9", link=False)
+        store.add(self.key, self.folder)
+        target = self.dir / "other" / "9876543210"
+        store.checkout(self.key, target)
+        self.assertFalse(
+            os.path.samefile(
+                str(store.folder(self.key) / "System_main_tbl.txt"),
+                str(target / "System_main_tbl.txt"),
+            )
+        )
+
+    def test_report(self):
+        self.assertIsNone(self.store.report()["hit_rate"])
+        self.store.checkout(self.key, self.dir / "a")
+        self.store.add(self.key, self.folder)
+        self.store.checkout(self.key, self.dir / "b")
+        self.assertEqual(
+            self.store.report(), dict(hits=1, misses=1, added=1, hit_rate=0.5)
+        )
+
+    def tearDown(self):
+        remove_tempdir(self.dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
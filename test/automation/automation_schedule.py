@@ -0,0 +1,91 @@
+import unittest
+from pyrolite_meltsutil.automation.timing import DurationEstimator, count_steps
+from pyrolite_meltsutil.automation.schedule import (
+    composition_key,
+    schedule_experiments,
+    partition_experiments,
+)
+import logging
+
+logger = logging.Logger(__name__)
+
+
+def _experiments():
+    experiments = {}
+    for comp, SiO2 in enumerate([50.0, 60.0]):
+        for T1 in [1200, 1000, 1100, 900]:
+            exp = {
+                "SiO2": SiO2,
+                "Initial Temperature": 1300,
+                "Final Temperature": T1,
+                "Increment Temperature": -10,
+                "modes": ["isobaric"],
+            }
+            experiments["{}-{}".format(comp, T1)] = ("", exp, None)
+    return experiments
+
+
+class TestScheduleExperiments(unittest.TestCase):
+    def setUp(self):
+        self.experiments = _experiments()
+        self.estimator = DurationEstimator(time_per_step=1.0, startup_time=0.0)
+
+    def _order(self, **kwargs):
+        return [
+            h
+            for h, _ in schedule_experiments(
+                self.experiments.items(), estimator=self.estimator, **kwargs
+            )
+        ]
+
+    def test_default(self):
+        order = self._order()
+        self.assertEqual(sorted(order), sorted(self.experiments))
+        steps = [count_steps(self.experiments[h][1]) for h in order]
+        self.assertEqual(steps, sorted(steps, reverse=True))
+        self.assertEqual(order[:2], ["0-900", "1-900"])  # stable
+
+    def test_strategies(self):
+        self.assertEqual(self._order(strategy="shortest")[:2], ["0-1200", "1-1200"])
+        self.assertEqual(self._order(strategy=None), list(self.experiments))
+        self.assertEqual(
+            self._order(strategy="interleave")[:4],
+            ["0-900", "1-900", "0-1000", "1-1000"],
+        )
+        with self.assertRaises(ValueError):
+            self._order(strategy="random")
+
+    def test_priority(self):
+        order = self._order(priority={"1-1200": -1})
+        self.assertEqual(order[0], "1-1200")
+        order = self._order(priority=lambda h, e: int(e[1]["SiO2"] < 55))
+        self.assertTrue(all(h.startswith("1") for h in order[:4]))
+
+    def test_window(self):
+        order = self._order(window=4)
+        self.assertEqual(order[:4], ["0-900", "0-1000", "0-1100", "0-1200"])
+
+    def test_composition_key(self):
+        keys = {composition_key(e) for e in self.experiments.values()}
+        self.assertEqual(len(keys), 2)
+
+
+class TestPartitionExperiments(unittest.TestCase):
+    def setUp(self):
+        self.experiments = _experiments()
+        self.estimator = DurationEstimator(time_per_step=1.0, startup_time=0.0)
+
+    def test_default(self):
+        groups, loads = partition_experiments(
+            self.experiments, 2, estimator=self.estimator
+        )
+        self.assertEqual(len(groups), 2)
+        self.assertEqual(sum(len(g) for g in groups), len(self.experiments))
+        self.assertAlmostEqual(loads[0], loads[1])
+        self.assertAlmostEqual(
+            sum(loads), self.estimator.total(self.experiments.values())
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
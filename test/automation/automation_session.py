@@ -0,0 +1,128 @@
+import unittest
+import threading
+from pyrolite.util.general import temp_path, remove_tempdir
+from pyrolite_meltsutil.env import MELTS_Env
+from pyrolite_meltsutil.automation.org import make_meltsfolder
+from pyrolite_meltsutil.automation.session import (
+    MeltsSession,
+    run_in_session,
+    get_session,
+    close_sessions,
+    _sessions,
+)
+from pyrolite_meltsutil.util.general import get_local_example, check_perl
+import logging
+
+logger = logging.Logger(__name__)
+
+ENV = MELTS_Env()
+ENV.VERSION = "MELTS"
+ENV.MODE = "isobaric"
+ENV.MINP = 2000
+ENV.MAXP = 10000
+ENV.MINT = 500
+ENV.MAXT = 1500
+ENV.DELTAT = -10
+ENV.DELTAP = 0
+
+with open(str(get_local_example("Morb.melts"))) as f:
+    MELTSFILE = f.read()
+
+
+@unittest.skipIf(not check_perl(), "Perl is not installed.")
+class TestMeltsSession(unittest.TestCase):
+    def setUp(self):
+        self.fromdir = temp_path() / ("testmelts" + self.__class__.__name__)
+        self.fromdir.mkdir(parents=True)
+        self.folders = [
+            make_meltsfolder(
+                name="MORB{}".format(ix),
+                title="MORB{}".format(ix),
+                meltsfile=MELTSFILE,
+                env=ENV,
+                indir=self.fromdir,
+            )
+            for ix in range(3)
+        ]
+
+    def test_default(self):
+        with MeltsSession(env=ENV) as session:
+            for folder in self.folders:
+                self.assertTrue(session.run(folder, folder.name))
+                self.assertTrue((folder / "System_main_tbl.txt").exists())
+            self.assertEqual(session.runs, len(self.folders))
+        self.assertFalse(session.workdir.exists())
+
+    def test_max_runs(self):
+        with MeltsSession(env=ENV, max_runs=2) as session:
+            for folder in self.folders:
+                session.run(folder, folder.name)
+                self.assertTrue((folder / "System_main_tbl.txt").exists())
+            self.assertEqual(session.runs, 1)  # restarted after two runs
+
+    def tearDown(self):
+        if self.fromdir.exists():
+            try:
+                remove_tempdir(self.fromdir)
+            except FileNotFoundError:
+                pass
+
+
+@unittest.skipIf(not check_perl(), "Perl is not installed.")
+class TestRunInSession(unittest.TestCase):
+    def setUp(self):
+        self.fromdir = temp_path() / ("testmelts" + self.__class__.__name__)
+        self.fromdir.mkdir(parents=True)
+
+    def test_default(self):
+        envfile = ENV.to_envfile(unset_variables=False)
+        for ix in range(2):
+            result = run_in_session(
+                "MORB{}".format(ix), "MORB", MELTSFILE, envfile, self.fromdir
+            )
+            self.assertEqual(result["status"], "done")
+        close_sessions()
+
+    def test_threads(self):
+        envfile = ENV.to_envfile(unset_variables=False)
+        results, sessions = {}, {}
+
+        def run(ix):
+            for run in range(2):
+                name = "MORB{}{}".format(ix, run)
+                results[name] = run_in_session(
+                    name, "MORB", MELTSFILE, envfile, self.fromdir
+                )
+            sessions[ix] = get_session(envfile)
+
+        threads = [threading.Thread(target=run, args=(ix,)) for ix in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertIsNot(sessions[0], sessions[1])  # one session per thread
+        self.assertEqual(sessions[0].runs + sessions[1].runs, 4)
+        for name, result in results.items():
+            self.assertEqual(result["status"], "done")
+            self.assertTrue((self.fromdir / name / "System_main_tbl.txt").exists())
+        close_sessions()  # including those of other threads
+        self.assertFalse(_sessions)
+        self.assertFalse(sessions[0].active or sessions[1].active)
+
+    def test_configure(self):
+        envfile = ENV.to_envfile(unset_variables=False)
+        session = get_session(envfile, max_runs=2, timeout=30.0)
+        self.assertIs(get_session(envfile, max_runs=5, timeout=60.0), session)
+        self.assertEqual((session.max_runs, session.timeout), (5, 60.0))
+        close_sessions()
+
+    def tearDown(self):
+        if self.fromdir.exists():
+            try:
+                remove_tempdir(self.fromdir)
+            except FileNotFoundError:
+                pass
+
+
+if __name__ == "__main__":
+    unittest.main()
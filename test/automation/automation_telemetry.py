@@ -0,0 +1,78 @@
+import unittest
+import sys
+import subprocess
+from pyrolite.util.general import temp_path, remove_tempdir
+from pyrolite_meltsutil.automation.telemetry import (
+    METRICS,
+    ProcessMonitor,
+    MetricsLog,
+)
+import logging
+
+logger = logging.Logger(__name__)
+
+
+class TestProcessMonitor(unittest.TestCase):
+    def setUp(self):
+        # a child process which uses some CPU time before exiting
+        self.process = subprocess.Popen(
+            [sys.executable, "-c", "sum(i * i for i in range(3000000))"]
+        )
+
+    def test_default(self):
+        monitor = ProcessMonitor(self.process.pid, interval=0.05).start()
+        self.process.wait()
+        monitor.stop()
+        self.assertGreater(monitor.peak_rss, 0)
+        self.assertGreater(monitor.cpu_time, 0.0)
+
+    def test_reset(self):
+        monitor = ProcessMonitor(self.process.pid, interval=0.05).start()
+        self.process.wait()
+        monitor.stop()
+        monitor.thread.join()  # such that no samples are taken after the reset
+        self.assertGreater(monitor.cpu_time, 0.0)
+        monitor.reset()
+        self.assertEqual(monitor.cpu_time, 0.0)
+        self.assertEqual(monitor.peak_rss, 0)
+
+    def test_exited(self):
+        self.process.wait()
+        monitor = ProcessMonitor(self.process.pid).start()
+        monitor.stop()
+        self.assertEqual(monitor.peak_rss, 0)
+
+    def tearDown(self):
+        if self.process.poll() is None:
+            self.process.kill()
+
+
+class TestMetricsLog(unittest.TestCase):
+    def setUp(self):
+        self.dir = temp_path() / ("testmelts" + self.__class__.__name__)
+        self.dir.mkdir(parents=True, exist_ok=True)
+
+    def test_default(self):
+        log = MetricsLog(self.dir)
+        self.assertEqual(log.path, self.dir / "meltsBatchMetrics.jsonl")
+        log.append(
+            "a", title="A", status="done", duration=1.0, metrics=dict(peak_rss=1)
+        )
+        log.append("a", title="A", status="done", duration=2.0)
+        log.append("b", title="B", status="failed", duration=3.0)
+        df = MetricsLog(self.dir).to_frame()
+        self.assertEqual(list(df.index), ["a", "a", "b"])
+        for m in METRICS:
+            self.assertIn(m, df.columns)
+        self.assertEqual(df.peak_rss.iloc[0], 1)
+
+    def test_empty(self):
+        df = MetricsLog(self.dir).to_frame()
+        self.assertTrue(df.empty)
+
+    def tearDown(self):
+        remove_tempdir(self.dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
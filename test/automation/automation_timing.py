@@ -0,0 +1,128 @@
+import unittest
+import json
+import shutil
+from pyrolite.util.general import temp_path, remove_tempdir
+from pyrolite_meltsutil.automation.ledger import RunLedger
+from pyrolite_meltsutil.automation.timing import (
+    get_T_steps,
+    get_P_steps,
+    count_steps,
+    estimate_experiment_duration,
+    DurationEstimator,
+)
+from pyrolite_meltsutil.util.general import get_data_example
+import logging
+
+logger = logging.Logger(__name__)
+
+
+class TestCountSteps(unittest.TestCase):
+    def setUp(self):
+        self.exp = {
+            "Initial Temperature": 1300,
+            "Final Temperature": 800,
+            "Increment Temperature": -5,
+            "Initial Pressure": 5000,
+            "Final Pressure": 5000,
+            "Increment Pressure": 0,
+            "modes": ["isobaric", "fractionate solids"],
+        }
+
+    def test_default(self):
+        self.assertEqual(get_T_steps(self.exp), 100)
+        self.assertEqual(get_P_steps(self.exp), 0)
+        self.assertEqual(count_steps(self.exp), 101)
+
+    def test_env(self):
+        # increments from the environment take precedence
+        self.assertEqual(count_steps(self.exp, env=dict(DELTAT=-10.0)), 51)
+        # steps are limited by the bounds of the environment
+        self.assertEqual(count_steps(self.exp, env=dict(DELTAT=-10.0, MINT=1000)), 31)
+
+    def test_modes(self):
+        exp = {**self.exp, "Final Pressure": 1000, "Increment Pressure": -500}
+        exp["modes"] = ["isothermal"]
+        self.assertEqual(count_steps(exp), 9)
+        exp["modes"] = []
+        self.assertEqual(count_steps(exp, env=dict(MODE="geothermal")), 101)
+        self.assertEqual(count_steps(exp, env=dict(MODE="ptgrid")), 101 * 9)
+
+    def test_duration(self):
+        duration = estimate_experiment_duration(
+            ("", self.exp, None), time_per_step=0.1, startup_time=2.0
+        )
+        self.assertAlmostEqual(duration, 2.0 + 0.1 * 101)
+
+
+class TestDurationEstimator(unittest.TestCase):
+    def setUp(self):
+        self.experiments = [
+            (
+                "",
+                {
+                    "Initial Temperature": 1300,
+                    "Final Temperature": T1,
+                    "Increment Temperature": -10,
+                    "modes": ["isobaric"],
+                },
+                None,
+            )
+            for T1 in [1200, 1100, 1000, 900]
+        ]
+
+    def test_fit(self):
+        durations = [3.0 + 0.2 * count_steps(e[1]) for e in self.experiments]
+        est = DurationEstimator().fit(self.experiments, durations)
+        self.assertAlmostEqual(est.time_per_step, 0.2)
+        self.assertAlmostEqual(est.startup_time, 3.0)
+        self.assertAlmostEqual(est.predict(self.experiments[0]), durations[0])
+
+    def test_too_few(self):
+        est = DurationEstimator(time_per_step=0.1)
+        est.fit(self.experiments[:1], [10.0])
+        self.assertEqual(est.time_per_step, 0.1)
+
+    def test_total(self):
+        est = DurationEstimator(time_per_step=1.0, startup_time=0.0)
+        self.assertAlmostEqual(est.total(self.experiments), 11 + 21 + 31 + 41)
+        self.assertAlmostEqual(est.total(self.experiments, workers=4), 41)
+
+
+class TestFitBatch(unittest.TestCase):
+    def setUp(self):
+        self.dir = temp_path() / ("testmelts" + self.__class__.__name__)
+        if self.dir.exists():
+            remove_tempdir(self.dir)
+        self.dir.mkdir(parents=True)
+        shutil.copy(
+            str(get_data_example("batch") / "meltsBatchConfig.json"), str(self.dir)
+        )
+        with open(str(self.dir / "meltsBatchConfig.json")) as f:
+            self.config = json.load(f)
+
+    def test_default(self):
+        title, exp, env = list(self.config.values())[0]
+        self.config["0123456789"] = (title, {**exp, "Final Temperature": 1000}, env)
+        with open(str(self.dir / "meltsBatchConfig.json"), "w") as f:
+            json.dump(self.config, f)
+        ledger = RunLedger(self.dir)
+        for hsh, experiment in self.config.items():
+            ledger.update(
+                hsh, "done", duration=2.0 + 0.5 * count_steps(*experiment[1:])
+            )
+        ledger.update("9876543210", "failed", duration=1.0)  # not included
+        est = DurationEstimator().fit_batch(self.dir)
+        self.assertEqual(est.n_records, 3)
+        self.assertAlmostEqual(est.time_per_step, 0.5)
+        self.assertAlmostEqual(est.startup_time, 2.0)
+
+    def test_empty(self):
+        est = DurationEstimator().fit_batch(self.dir)
+        self.assertEqual(est.n_records, 0)
+
+    def tearDown(self):
+        remove_tempdir(self.dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
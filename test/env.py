@@ -1,4 +1,6 @@
+import os
 import unittest
+import threading
 from pyrolite_meltsutil.data.environment import MELTS_environment_variables
 from pyrolite.util.text import remove_prefix
 from pyrolite_meltsutil.env import *
@@ -13,7 +15,8 @@ class TestMELTSEnv(unittest.TestCase):
         """Tests the environment setup with the default config."""
         menv = MELTS_Env(prefix=self.prefix, variable_model=self.env_vars)
         test_var = "ALPHAMELTS_MINP"
-        self.assertTrue(test_var in os.environ)
+        self.assertTrue(test_var in menv.to_environ())
+        self.assertTrue("MINP" in menv.dump(unset_variables=False))
 
     def test_valid_setattr(self):
         """Tests that environment variables can be set."""
@@ -24,8 +27,9 @@ class TestMELTSEnv(unittest.TestCase):
             with self.subTest(var=var):
                 for value in [1.0, 10.0, 100.0, 10.0]:
                     setattr(menv, var, value)
-                    self.assertTrue(test_var in os.environ)
-                    self.assertTrue(type(value)(os.environ[test_var]) == value)
+                    environ = menv.to_environ()
+                    self.assertTrue(test_var in environ)
+                    self.assertTrue(type(value)(environ[test_var]) == value)
 
     def test_reset(self):
         """
@@ -40,10 +44,96 @@ class TestMELTSEnv(unittest.TestCase):
                 setattr(menv, var, None)  # reset to default/remove
                 _var = remove_prefix(var, self.prefix)
                 default = self.env_vars[_var].get("default", None)
+                environ = menv.to_environ()
                 if default is not None:
-                    self.assertTrue(type(default)(os.environ[test_var]) == default)
+                    self.assertTrue(type(default)(environ[test_var]) == default)
                 else:
-                    self.assertTrue(test_var not in os.environ)
+                    self.assertTrue(test_var not in environ)
+
+    def test_force_active(self):
+        """Tests that variables can be set where their overriders are set."""
+        menv = MELTS_Env(prefix=self.prefix, variable_model=self.env_vars)
+        menv.force_active = True
+        menv.MINPHI = 0.01
+        menv.MINF = 0.02  # overridden by MINPHI
+        self.assertEqual(menv.dump()["MINF"], 0.02)
+        self.assertEqual(menv.to_environ()["ALPHAMELTS_MINF"], "0.02")
+
+    def test_cached_dump(self):
+        """Tests that serialised environments are updated where variables change."""
+        menv = MELTS_Env(prefix=self.prefix, variable_model=self.env_vars)
+        dump, envfile = menv.dump(), menv.to_envfile()
+        dump["MINP"] = -1.0  # modifying the output shouldn't modify the cache
+        self.assertNotEqual(menv.dump()["MINP"], -1.0)
+        menv.MINP = 100.0
+        self.assertEqual(menv.dump()["MINP"], 100.0)
+        self.assertIn("ALPHAMELTS_MINP 100.0", menv.to_envfile())
+        self.assertNotEqual(menv.to_envfile(), envfile)
+
+
+class TestMELTSEnvIsolation(unittest.TestCase):
+    def setUp(self):
+        self.environ = dict(os.environ)
+
+    def test_environ_unchanged(self):
+        menv = MELTS_Env()
+        menv.VERSION = "pMELTS"
+        menv.MINP = 100.0
+        self.assertEqual(dict(os.environ), self.environ)
+
+    def test_independent(self):
+        a, b = MELTS_Env(), MELTS_Env()
+        a.MODE, b.MODE = "isobaric", "isothermal"
+        self.assertEqual(a.dump()["MODE"], "isobaric")
+        self.assertEqual(b.dump()["MODE"], "isothermal")
+        self.assertIn("ALPHAMELTS_MODE isobaric", a.to_envfile())
+
+    def test_threads(self):
+        results = {}
+
+        def configure(mode):
+            env = MELTS_Env()
+            for _ in range(20):
+                env.MODE = mode
+                results.setdefault(mode, []).append(env.dump()["MODE"])
+
+        modes = ["isobaric", "isothermal", "isentropic", "isenthalpic"]
+        threads = [threading.Thread(target=configure, args=(m,)) for m in modes]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for mode in modes:
+            self.assertTrue(all(m == mode for m in results[mode]))
+
+    def test_environ_ignored(self):
+        os.environ["ALPHAMELTS_OLD_GARNET"] = "true"
+        menv = MELTS_Env()
+        self.assertIsNone(menv.dump()["OLD_GARNET"])
+        self.assertNotIn("ALPHAMELTS_OLD_GARNET", menv.to_environ())
+
+    def test_process_environ(self):
+        menv = MELTS_Env()
+        menv.MODE = "isobaric"
+        base = {"PATH": "/bin", "ALPHAMELTS_MODE": "isothermal"}
+        self.assertEqual(process_environ(base=base), {"PATH": "/bin"})
+        environ = process_environ(menv, base=base)
+        self.assertEqual(environ["PATH"], "/bin")
+        self.assertEqual(environ["ALPHAMELTS_MODE"], "isobaric")
+
+    def test_copy(self):
+        menv = MELTS_Env()
+        menv.MODE = "isobaric"
+        other = menv.copy()
+        other.MODE = "isothermal"
+        self.assertEqual(menv.dump()["MODE"], "isobaric")
+        self.assertEqual(other.dump()["MODE"], "isothermal")
+        self.assertEqual(MELTS_Env().dump(), MELTS_Env().copy().dump())
+
+    def tearDown(self):
+        for k in set(os.environ) - set(self.environ):
+            del os.environ[k]
+        os.environ.update(self.environ)
 
 
 if __name__ == "__main__":
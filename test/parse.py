@@ -38,6 +38,35 @@ class TestParseMELTSComposition(unittest.TestCase):
         ret = from_melts_cstr(self.cstring, formula=True)
         self.assertTrue(isinstance(ret, pt.formulas.Formula))
 
+    def test_parse_formula_cached(self):
+        a = from_melts_cstr(self.cstring, formula=True)
+        b = from_melts_cstr(self.cstring, formula=True)
+        self.assertIs(a, b)
+
+
+class TestParseMELTSCompositions(unittest.TestCase):
+    def setUp(self):
+        self.cstrings = [
+            """Fe''0.18Mg0.83Fe'''0.04Al1.43Cr0.52Ti0.01O4""",
+            np.nan,
+            """K0.00Na0.32Ca0.68Al1.68Si2.32O8""",
+            """Fe''0.18Mg0.83Fe'''0.04Al1.43Cr0.52Ti0.01O4""",
+        ]
+
+    def test_parse_formula(self):
+        ret = from_melts_cstrs(self.cstrings)
+        self.assertEqual(len(ret), len(self.cstrings))
+        self.assertEqual(ret[1], pt.formula(""))  # as for from_melts_cstr(nan)
+        for ix in [0, 2, 3]:
+            self.assertTrue(isinstance(ret[ix], pt.formulas.Formula))
+            expect = from_melts_cstr(self.cstrings[ix])
+            self.assertEqual(ret[ix].structure, expect.structure)
+
+    def test_parse_dict(self):
+        ret = from_melts_cstrs(self.cstrings, formula=False)
+        self.assertTrue(isinstance(ret[0], dict))
+        self.assertTrue(np.isclose(ret[0]["Fe{2+}"], 0.18))
+
 
 if __name__ == "__main__":
     unittest.main()
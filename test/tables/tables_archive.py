@@ -0,0 +1,111 @@
+import shutil
+import unittest
+import pandas as pd
+from pyrolite.util.general import temp_path, remove_tempdir
+from pyrolite_meltsutil.tables.load import (
+    import_tables,
+    read_melts_tablefile,
+    phasetable_from_alphameltstxt,
+    aggregate_tables,
+)
+from pyrolite_meltsutil.tables.archive import (
+    pack_folder,
+    pack_batch,
+    exists,
+    listdir,
+    read_text,
+    iter_experiments,
+    strip_archive_suffix,
+    close_archives,
+    packed_experiments,
+)
+from pyrolite_meltsutil.util.general import get_data_example
+import logging
+
+logger = logging.Logger(__name__)
+
+
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        self.fromdir = temp_path() / ("testmelts" + self.__class__.__name__)
+        if self.fromdir.exists():
+            remove_tempdir(self.fromdir)
+        shutil.copytree(str(get_data_example("batch")), str(self.fromdir))
+        self.folders = sorted(
+            p.name for p in self.fromdir.iterdir() if p.is_dir() and len(p.name) == 10
+        )
+        self.system, self.phases = aggregate_tables(self.fromdir, cache=False)
+
+    def test_pack_folder(self):
+        for fmt, suffix in [("zip", ".zip"), ("gztar", ".tar.gz")]:
+            with self.subTest(fmt=fmt):
+                folder = self.fromdir / self.folders[0]
+                expected = import_tables(folder, cache=False)
+                archive = pack_folder(folder, fmt=fmt, remove=False)
+                self.assertEqual(archive.name, self.folders[0] + suffix)
+                self.assertEqual(strip_archive_suffix(archive), folder)
+                self.assertTrue(exists(archive / "System_main_tbl.txt"))
+                self.assertFalse(exists(archive / "missing.txt"))
+                self.assertIn("alphaMELTS_tbl.txt", listdir(archive))
+                with open(str(folder / "System_main_tbl.txt")) as f:
+                    self.assertEqual(
+                        read_text(archive / "System_main_tbl.txt"), f.read()
+                    )
+                for a, b in zip(import_tables(archive), expected):
+                    pd.testing.assert_frame_equal(a, b)
+                archive.unlink()
+        with self.assertRaises(ValueError):
+            pack_folder(self.fromdir / self.folders[0], fmt="rar", remove=False)
+        self.assertTrue((self.fromdir / self.folders[0]).is_dir())
+
+    def test_readers(self):
+        folder = self.fromdir / self.folders[0]
+        expected_system = read_melts_tablefile(folder / "System_main_tbl.txt")
+        expected_phases = phasetable_from_alphameltstxt(folder / "alphaMELTS_tbl.txt")
+        archive = pack_folder(folder)
+        self.assertFalse(folder.exists())
+        pd.testing.assert_frame_equal(
+            read_melts_tablefile(archive / "System_main_tbl.txt"), expected_system
+        )
+        pd.testing.assert_frame_equal(
+            phasetable_from_alphameltstxt(archive / "alphaMELTS_tbl.txt"),
+            expected_phases,
+        )
+
+    def test_pack_batch(self):
+        for shard_size in [None, 1, 2]:
+            with self.subTest(shard_size=shard_size):
+                archives = pack_batch(self.fromdir, shard_size=shard_size)
+                self.assertEqual(len(archives), len(self.folders) // (shard_size or 1))
+                experiments = [e for a in archives for e in iter_experiments(a)]
+                self.assertEqual(
+                    sorted(strip_archive_suffix(e).name for e in experiments),
+                    self.folders,
+                )
+                self.assertEqual(packed_experiments(self.fromdir), set(self.folders))
+                system, phases = aggregate_tables(self.fromdir)
+                for a, b in [(system, self.system), (phases, self.phases)]:
+                    pd.testing.assert_frame_equal(
+                        a.sort_values(["experiment", "step"]).reset_index(drop=True),
+                        b.sort_values(["experiment", "step"]).reset_index(drop=True),
+                    )
+                # restore the folders for the next pack
+                close_archives()
+                for archive in archives:
+                    shutil.unpack_archive(
+                        str(archive),
+                        (
+                            str(self.fromdir / strip_archive_suffix(archive).name)
+                            if shard_size is None
+                            else str(self.fromdir)
+                        ),
+                    )
+                    archive.unlink()
+
+    def tearDown(self):
+        close_archives()
+        remove_tempdir(self.fromdir)
+
+
+if __name__ == "__main__":
+    unittest.main()
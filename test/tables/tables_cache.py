@@ -0,0 +1,76 @@
+import unittest
+import shutil
+import pandas as pd
+from pyrolite.util.general import temp_path, remove_tempdir
+from pyrolite_meltsutil.tables.load import import_tables, aggregate_tables
+from pyrolite_meltsutil.tables.cache import (
+    CACHE_NAME,
+    read_table_cache,
+    write_table_cache,
+    clear_table_cache,
+)
+from pyrolite_meltsutil.util.general import get_data_example
+
+
+class TestTableCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = temp_path() / "test_table_cache"
+        if self.dir.exists():
+            remove_tempdir(self.dir)
+        shutil.copytree(str(get_data_example("batch")), str(self.dir))
+        self.folder = self.dir / "363f3d0a0b"
+
+    def test_default(self):
+        self.assertIsNone(read_table_cache(self.folder))
+        system, phases = import_tables(self.folder, cache=True)
+        self.assertTrue((self.folder / CACHE_NAME).exists())
+        out = read_table_cache(self.folder)
+        self.assertIsNotNone(out)
+        # formulae are cached as composition strings
+        raw = import_tables(self.folder, cache=False, formulae=False)
+        for table, cached in zip(raw, out):
+            self.assertEqual(list(table.index), list(cached.index))
+            pd.testing.assert_frame_equal(
+                table.reset_index(drop=True), cached.reset_index(drop=True)
+            )
+        _, _phases = import_tables(self.folder)  # parsed from the cache
+        formulae = phases.formula.dropna()
+        self.assertTrue(
+            all(
+                a.structure == b.structure
+                for a, b in zip(formulae, _phases.formula.dropna())
+            )
+        )
+
+    def test_invalidated(self):
+        system, phases = import_tables(self.folder, cache=False)
+        write_table_cache(self.folder, system, phases)
+        self.assertIsNotNone(read_table_cache(self.folder))
+        self.assertIsNone(read_table_cache(self.folder, kelvin=True))
+        with open(str(self.folder / "System_main_tbl.txt"), "a") as f:
+            f.write("\n")  # modify a source table
+        self.assertIsNone(read_table_cache(self.folder))
+
+    def test_corrupt(self):
+        with open(str(self.folder / CACHE_NAME), "w") as f:
+            f.write("not a cache")
+        self.assertIsNone(read_table_cache(self.folder))
+        system, phases = import_tables(self.folder)  # falls back to parsing
+        clear_table_cache(self.folder)
+        self.assertFalse((self.folder / CACHE_NAME).exists())
+
+    def test_aggregate(self):
+        system, phases = aggregate_tables(self.dir, cache=False)
+        aggregate_tables(self.dir, cache=True)
+        _system, _phases = aggregate_tables(self.dir)
+        for a, b in [(system, _system), (phases, _phases)]:
+            pd.testing.assert_frame_equal(
+                a.reset_index(drop=True), b.reset_index(drop=True)
+            )
+
+    def tearDown(self):
+        remove_tempdir(self.dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
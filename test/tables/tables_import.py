@@ -1,13 +1,19 @@
+import re
 import unittest
+import pandas as pd
+import periodictable as pt
 from pyrolite.util.general import temp_path, remove_tempdir
 from pyrolite_meltsutil.tables.load import (
     import_tables,
     read_phase_table,
+    read_phase_tables,
     read_melts_tablefile,
     phasetable_from_phasemain,
     phasetable_from_alphameltstxt,
+    parse_formulae,
     aggregate_tables,
     import_batch_config,
+    _read_numeric_block,
 )
 from pyrolite_meltsutil.util.general import get_data_example
 import logging
@@ -15,6 +21,42 @@ import logging
 logger = logging.Logger(__name__)
 
 
+class TestReadMeltsTablefile(unittest.TestCase):
+    def setUp(self):
+        self.fromdir = get_data_example("batch/363f3d0a0b/")
+        self.tables = [
+            "System_main_tbl.txt",
+            "Bulk_comp_tbl.txt",
+            "Liquid_comp_tbl.txt",  # ragged
+            "Solid_comp_tbl.txt",  # non-numeric
+            "Phase_mass_tbl.txt",  # trailing whitespace
+        ]
+
+    def test_default(self):
+        for table in self.tables:
+            with self.subTest(table=table):
+                out = read_melts_tablefile(self.fromdir / table)
+                self.assertIn("pressure", out.columns)
+                self.assertTrue((out["pressure"] == 5000.0).all())
+
+    def test_fast_equivalent(self):
+        for table in self.tables:
+            with self.subTest(table=table):
+                fast = read_melts_tablefile(self.fromdir / table, fast=True)
+                slow = read_melts_tablefile(self.fromdir / table, fast=False)
+                pd.testing.assert_frame_equal(fast, slow, check_dtype=False)
+
+    def test_ragged(self):
+        headers = ["Pressure", "Temperature", "mass"]
+        out = _read_numeric_block("5000.0 1273.15 1.0\n5000.0 1263.15 2.0\n", headers)
+        self.assertEqual(out.shape, (2, 3))
+        # the number of values is that of a complete table, but not for each row
+        for block in ["5000.0 1273.15 1.0 2.0\n5000.0 1263.15", "5000.0 1273.15 x"]:
+            with self.subTest(block=block):
+                with self.assertRaises(ValueError):
+                    _read_numeric_block(block, headers)
+
+
 class TestPhasetableFromalphaMELTS(unittest.TestCase):
     def setUp(self):
         self.file = get_data_example("batch/363f3d0a0b/alphaMELTS_tbl.txt")
@@ -23,6 +65,74 @@ class TestPhasetableFromalphaMELTS(unittest.TestCase):
         src = self.file
         out = phasetable_from_alphameltstxt(src)
 
+    def test_raw_formulae(self):
+        out = phasetable_from_alphameltstxt(self.file)
+        raw = phasetable_from_alphameltstxt(self.file, formulae=False)
+        self.assertTrue(raw.formula.dropna().map(lambda x: isinstance(x, str)).all())
+        parsed = parse_formulae(raw.copy())
+        for a, b in zip(out.formula.dropna(), parsed.formula.dropna()):
+            self.assertEqual(a.structure, b.structure)
+
+    def test_empty_formulae(self):
+        # phases without a composition (e.g. liquid) have empty formulae
+        file = get_data_example("montecarlo/650b119b52/alphaMELTS_tbl.txt")
+        out = phasetable_from_alphameltstxt(file)
+        self.assertFalse(out.formula.isnull().any())
+        empty = out.formula.map(lambda f: f == pt.formula(""))
+        self.assertEqual(empty.sum(), 71)
+        self.assertIn("liquid", set(out.loc[empty, "phase"].str.split("_").str[0]))
+
+
+class TestReadPhaseTables(unittest.TestCase):
+    def setUp(self):
+        with open(str(get_data_example("batch/363f3d0a0b/alphaMELTS_tbl.txt"))) as f:
+            self.text = f.read()
+
+    def test_default(self):
+        out = read_phase_tables(self.text)
+        self.assertIn("liquid_0", out["phaseID"].unique())
+        self.assertTrue((out["phase"] == out["phaseID"].str.split("_").str[0]).all())
+        self.assertTrue(pd.api.types.is_numeric_dtype(out["Temperature"]))
+
+    def test_equivalent(self):
+        # compare with parsing the phase tables individually
+        sections = re.split(r"Title: .*\n\n+", self.text.strip())
+        section = [s for s in sections if s and s[0].islower()][0]
+        expect = pd.concat(
+            [read_phase_table(t) for t in re.split(r"\n\n+", section.strip())],
+            ignore_index=True,
+        )
+        pd.testing.assert_frame_equal(
+            read_phase_tables(self.text), expect, check_dtype=False
+        )
+
+    def test_lines(self):
+        out = read_phase_tables(self.text.splitlines(keepends=True))
+        pd.testing.assert_frame_equal(out, read_phase_tables(self.text))
+
+    def test_header_quirks(self):
+        text = "\n".join(
+            [
+                "Title: test",
+                "",
+                "nepheline_0 thermodynamic data and composition:",
+                "Pressure Temperature mass S H V Cp formula SiO2 Na2O",
+                "5000.00 1273.15 1.0 2.0 -3.0 4.0 5.0 neph Na4Al4Si4O16 41.0 21.0",
+                "",
+                "liquid_0 thermodynamic data and composition:",
+                "Pressure Temperature mass S H V Cp SiO2",
+                "5000.00 1273.15 10.0 20.0 -30.0 40.0 50.0 50.0",
+                "5000.00 1263.15 9.0 18.0 -27.0 36.0 45.0",  # ragged
+            ]
+        )
+        out = read_phase_tables(text)
+        self.assertEqual(list(out["phaseID"]), ["nepheline_0"] + ["liquid_0"] * 2)
+        self.assertEqual(out.loc[0, "structure"], "neph")
+        self.assertEqual(out.loc[0, "formula"], "Na4Al4Si4O16")
+        self.assertEqual(out.loc[0, "SiO2"], 41.0)
+        self.assertTrue(pd.isnull(out.loc[1:, "Na2O"]).all())
+        self.assertTrue(pd.isnull(out.loc[2, "SiO2"]))
+
 
 class TestPhasetableFromPhasemain(unittest.TestCase):
     def setUp(self):
@@ -31,6 +141,7 @@ class TestPhasetableFromPhasemain(unittest.TestCase):
     def test_default(self):
         src = self.file
         out = phasetable_from_phasemain(src)
+        self.assertFalse(out.formula.isnull().any())
 
 
 class TestImportTables(unittest.TestCase):
@@ -41,6 +152,13 @@ class TestImportTables(unittest.TestCase):
         src = self.fromdir
         out = import_tables(src)
 
+    def test_empty_formulae(self):
+        system, phases = import_tables(self.fromdir, cache=False)
+        # formulae are those of the phase table, and not of aggregate phases
+        aggregate = phases.phase.isin(["bulk", "solid", "cumulate"])
+        self.assertTrue(phases.loc[aggregate, "formula"].isnull().all())
+        self.assertFalse(phases.loc[~aggregate, "formula"].isnull().any())
+
 
 class TestAggregateTables(unittest.TestCase):
     def setUp(self):
@@ -50,6 +168,29 @@ class TestAggregateTables(unittest.TestCase):
         src = self.fromdir
         out = aggregate_tables(src)
 
+    def test_workers(self):
+        src = self.fromdir
+        system, phases = aggregate_tables(src)
+        _system, _phases = aggregate_tables(src, workers=2, chunksize=1)
+        for a, b in [(system, _system), (phases, _phases)]:
+            self.assertEqual(list(a.index), list(b.index))
+            pd.testing.assert_frame_equal(
+                a.reset_index(drop=True), b.reset_index(drop=True)
+            )
+
+    def test_return_errors(self):
+        tmp = temp_path() / "aggregate"
+        tmp.mkdir(parents=True, exist_ok=True)
+        try:
+            (tmp / "0123456789").mkdir(exist_ok=True)  # empty experiment folder
+            folders = sorted([*self.fromdir.iterdir(), tmp / "0123456789"])
+            folders = [f for f in folders if f.is_dir()]
+            system, phases, errors = aggregate_tables(folders, return_errors=True)
+            self.assertEqual(list(errors.keys()), ["0123456789"])
+            self.assertNotIn("0123456789", system.experiment.unique())
+        finally:
+            remove_tempdir(tmp)
+
 
 class TestImportBatchConfig(unittest.TestCase):
     def setUp(self):
@@ -0,0 +1,89 @@
+import unittest
+import shutil
+import pandas as pd
+from pyrolite.util.general import temp_path, remove_tempdir
+from pyrolite_meltsutil.tables.load import aggregate_tables, import_tables
+from pyrolite_meltsutil.tables.store import BatchStore, STORE_NAME
+from pyrolite_meltsutil.util.general import get_data_example
+
+
+class TestBatchStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = temp_path() / "test_batch_store"
+        if self.dir.exists():
+            remove_tempdir(self.dir)
+        shutil.copytree(str(get_data_example("batch")), str(self.dir))
+        self.hashes = sorted(
+            [p.name for p in self.dir.iterdir() if p.is_dir() and len(p.name) == 10]
+        )
+
+    def test_default(self):
+        store = BatchStore(self.dir)
+        self.assertTrue(str(store.path).endswith(STORE_NAME))
+        self.assertEqual(len(store), 0)
+        errors = store.ingest_batch(self.dir)
+        self.assertEqual(errors, {})
+        self.assertEqual(sorted(store.hashes), self.hashes)
+        self.assertIn(self.hashes[0], store)
+
+    def test_load(self):
+        system, phases = aggregate_tables(self.dir)
+        store = BatchStore(self.dir)
+        store.ingest_batch(self.dir)
+        _system, _phases = store.load()
+        for a, b in [(system, _system), (phases, _phases)]:
+            a = a.iloc[a.experiment.argsort(kind="stable")]
+            b = b.iloc[b.experiment.argsort(kind="stable")]
+            self.assertEqual(list(a.index), list(b.index))
+            pd.testing.assert_frame_equal(
+                a.reset_index(drop=True), b.reset_index(drop=True)
+            )
+
+    def test_query(self):
+        store = BatchStore(self.dir)
+        store.ingest_batch(self.dir)
+        system, phases = store.load(hashes=self.hashes[:1])
+        self.assertEqual(list(system.experiment.unique()), self.hashes[:1])
+        config = store.to_frame()
+        self.assertIn("title", config.columns)
+        pressure = config.loc[self.hashes[0], "Initial Pressure"]
+        found = store.find({"Initial Pressure": pressure})
+        self.assertIn(self.hashes[0], found)
+        system, phases = store.load(config={"Initial Pressure": pressure})
+        self.assertEqual(sorted(system.experiment.unique()), sorted(found))
+
+    def test_replace(self):
+        store = BatchStore(self.dir)
+        store.ingest(self.dir / self.hashes[0])
+        system, phases = store.load()
+        store.ingest(self.dir / self.hashes[0])  # records are replaced
+        _system, _phases = store.load()
+        self.assertEqual(system.shape, _system.shape)
+        store.remove(self.hashes[0])
+        self.assertNotIn(self.hashes[0], store)
+
+    def test_unparsed(self):
+        store = BatchStore(self.dir)
+        system, phases = import_tables(self.dir / self.hashes[0], formulae=False)
+        self.assertTrue(phases.formula.dropna().map(type).eq(str).all())
+        store.add(self.hashes[0], system, phases)
+        _, parsed = import_tables(self.dir / self.hashes[0])
+        _, _phases = store.load()  # formulae are parsed on adding to the store
+        self.assertEqual(
+            [str(f) for f in parsed.formula.dropna()],
+            [str(f) for f in _phases.formula.dropna()],
+        )
+
+    def test_remove_folders(self):
+        store = BatchStore(self.dir)
+        store.ingest_batch(self.dir, remove=True)
+        for h in self.hashes:
+            self.assertFalse((self.dir / h).exists())
+            self.assertIn(h, store)
+
+    def tearDown(self):
+        remove_tempdir(self.dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
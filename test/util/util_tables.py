@@ -1,7 +1,8 @@
 import unittest
 import numpy as np
+import pandas as pd
 from pyrolite_meltsutil.util.general import get_data_example
-from pyrolite_meltsutil.tables.load import import_tables
+from pyrolite_meltsutil.tables.load import import_tables, aggregate_tables
 from pyrolite_meltsutil.util.tables import (
     phasename,
     tuple_reindex,
@@ -35,6 +36,12 @@ class TestIntegrateSolids(unittest.TestCase):
         # should have an index equivalent to the system index
         self.assertTrue(cumulate.index.size == self.fracsystem.index.size)
         self.assertTrue((cumulate.index == self.fracsystem.index).all())
+        # compositions of the cumulate are normalised to its integrated mass
+        present = cumulate["mass"] > 0
+        oxides = ["SiO2", "Al2O3", "FeO", "MgO", "CaO", "Na2O"]
+        totals = cumulate.loc[present, oxides].sum(axis=1)
+        self.assertTrue(((totals > 90) & (totals < 101)).all())
+        self.assertTrue((np.diff(cumulate["mass"].values) >= 0).all())
 
     def test_non_frac_compositions(self):
         cumulate = integrate_solid_composition(self.nofracphases, frac=False)
@@ -73,5 +80,43 @@ class TestIntegrateSolids(unittest.TestCase):
         )
 
 
+class TestIntegrateSolidsAggregate(unittest.TestCase):
+    def setUp(self):
+        self.fromdir = get_data_example("batch/")
+        self.system, self.phases = aggregate_tables(self.fromdir)
+        self.experiments = sorted(self.phases.experiment.unique())
+        # alternate fractional and equilibrium integration between experiments
+        self.frac = {e: bool(ix % 2) for ix, e in enumerate(self.experiments)}
+
+    def _compare(self, func):
+        grouped = func(self.phases, frac=self.frac)
+        for experiment in self.experiments:
+            with self.subTest(experiment=experiment):
+                phases = self.phases.loc[self.phases.experiment == experiment, :]
+                expect = func(
+                    phases.drop(columns=["experiment"]), frac=self.frac[experiment]
+                )
+                out = grouped.loc[grouped.experiment == experiment, expect.columns]
+                self.assertEqual(list(out.index), list(expect.index))
+                pd.testing.assert_frame_equal(
+                    out.reset_index(drop=True).dropna(how="all", axis=1),
+                    expect.reset_index(drop=True).dropna(how="all", axis=1),
+                    check_dtype=False,
+                )
+
+    def test_compositions(self):
+        self._compare(integrate_solid_composition)
+
+    def test_proportions(self):
+        self._compare(integrate_solid_proportions)
+
+    def test_frac_for_all(self):
+        cumulate = integrate_solid_composition(self.phases, frac=True)
+        self.assertEqual(
+            cumulate.index.size,
+            self.system.drop_duplicates(["experiment", "step"]).index.size,
+        )
+
+
 if __name__ == "__main__":
     unittest.main()